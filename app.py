@@ -1,16 +1,30 @@
-from flask import Flask, render_template,jsonify,request, session
+from flask import Flask, render_template,jsonify,request, session, Response, stream_with_context
 from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
 from dotenv import load_dotenv
 from langchain_pinecone import PineconeVectorStore
 from src.helper import download_hugging_face_embeddings
+from src.embedding_cache import load_cached_embeddings
 from src.prompt import *
 from src.mcp_client import get_mcp_client
 from src.exa_web_search import search_medical_web, get_medical_searcher
+from src.retrieval import fan_out, get_retrieval_planner, PendingRetrieval, ADAPTIVE_WEB_SEARCH, WEB_SEARCH_GRACE_SECONDS
+from src.context_packer import Passage, get_context_packer
+from src.medical_vocabulary import is_medical_query, is_location_query, is_non_medical_topic
+from src.llm import get_llm
+from src.session_store import get_session_store
+from src.semantic_cache import get_answer_cache, bump_index_version
+from src.vector_store import get_vector_index, get_vector_backend
+from src.retriever import DirectPineconeRetriever
+from src.indexing import build_index
+from src.ingestion_jobs import get_ingestion_queue
 import os
+import json
 import uuid
+import atexit
 import re
+from pathlib import Path
 from typing import Optional, Dict
 
 app= Flask(__name__)
@@ -24,72 +38,77 @@ project_id = os.getenv("OPENAI_PROJECT")
 PINECONE_API_KEY = os.environ.get('PINECONE_API_KEY')
 # OPENAI_API_KEY=os.environ.get('OPENAI_API_KEY')
 
-os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
+if PINECONE_API_KEY:
+    os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
 # os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 
 ## Setup retriever
-embeddings=download_hugging_face_embeddings()
+embeddings=load_cached_embeddings()
+atexit.register(embeddings.persist)
 index_name="medicalbot"
 
-from pinecone import Pinecone
-from langchain_core.documents import Document
-from langchain_core.retrievers import BaseRetriever
-from langchain_core.callbacks import CallbackManagerForRetrieverRun
-from typing import List
+# Vector index: Pinecone or the local on-disk store (VECTOR_BACKEND)
+vector_index = get_vector_index(index_name)
 
-pc_client = Pinecone(api_key=PINECONE_API_KEY)
-pc_index = pc_client.Index(index_name)
+# RAG_NAMESPACES (comma-separated) are queried in parallel and merged by score
+retriever = DirectPineconeRetriever(
+    index=vector_index,
+    embeddings=embeddings,
+    k=int(os.getenv("RAG_TOP_K", "3")),
+    namespaces=[ns.strip() for ns in os.getenv("RAG_NAMESPACES", "default").split(",") if ns.strip()]
+)
 
-class DirectPineconeRetriever(BaseRetriever):
-    index: any
-    embeddings: any
-    k: int = 3
-    
-    def _get_relevant_documents(
-        self, query: str, *, run_manager: CallbackManagerForRetrieverRun = None
-    ) -> List[Document]:
-        """Get documents relevant to a query using direct Pinecone query."""
-        # Get query embedding
-        query_vector = self.embeddings.embed_query(query)
-        
-        # Query Pinecone directly
-        results = self.index.query(
-            vector=query_vector,
-            top_k=self.k,
-            namespace='default',
-            include_metadata=True
-        )
-        
-        # Convert to LangChain documents
-        documents = []
-        for match in results['matches']:
-            metadata = match.get('metadata', {})
-            content = metadata.get('text', '')
-            documents.append(Document(
-                page_content=content,
-                metadata=metadata
-            ))
-        
-        return documents
+# Also keep the vector store for potential other uses
+docsearch = None
+if get_vector_backend() == "pinecone":
+    docsearch=PineconeVectorStore.from_existing_index(
+        index_name=index_name,
+        embedding=embeddings,
+        namespace="default",
+        text_key="text"
+    )
 
-retriever = DirectPineconeRetriever(index=pc_index, embeddings=embeddings, k=3)
+# Per-source deadlines (seconds) for the concurrent retrieval stage
+RETRIEVAL_TIMEOUTS = {
+    "rag": float(os.getenv("RAG_TIMEOUT_SECONDS", "5")),
+    "mcp": float(os.getenv("MCP_TIMEOUT_SECONDS", "5")),
+    "web": float(os.getenv("WEB_TIMEOUT_SECONDS", "10")),
+}
 
-# Also keep the vector store for potential other uses
-docsearch=PineconeVectorStore.from_existing_index(
-    index_name=index_name,
-    embedding=embeddings,
-    namespace="default",
-    text_key="text"
-)
+# Semantic cache of final answers (None when disabled)
+answer_cache = get_answer_cache(embeddings)
+
+# Exa result cache (None when disabled); saved on exit if WEB_CACHE_PATH is set
+web_cache = get_medical_searcher().cache
+if web_cache is not None:
+    atexit.register(web_cache.persist)
+
+# Bounded (LRU + idle TTL) chain storage for conversational memory
+session_store = get_session_store(lambda: build_conversational_rag_chain(retriever))
+
+def update_vector_index(progress=None):
+    """Incrementally index Data/ (what `python store_index.py` does)."""
+    stats = build_index(vector_index, embeddings, data_dir='Data/', namespace='default',
+                        index_name=index_name, progress=progress)
+    if stats['chunks_added'] or stats['chunks_deleted']:
+        bump_index_version()
+    return stats
 
-# Global chain storage for conversational memory
-chains = {}
+# Chat-triggered ingestion runs in the background; INGEST_UPDATE_INDEX=true
+# also refreshes the vector index when a job finishes
+INGEST_UPDATE_INDEX = os.getenv("INGEST_UPDATE_INDEX", "false").lower() in ("1", "true", "yes")
+ingestion_queue = get_ingestion_queue(
+    lambda file_path, format_type, progress=None: get_mcp_client().ingest_dataset(
+        file_path, format_type, progress=progress),
+    index_updater=update_vector_index
+)
 
 def get_or_create_chain(session_id):
-    """Get or create a conversational chain for the session."""
-    if session_id not in chains:
-        chains[session_id] = build_conversational_rag_chain(retriever)
-    return chains[session_id]
+    """
+    Get or create a conversational chain for the session.
+    Each turn is persisted to the session backend as the chain records it.
+    """
+    return session_store.get(session_id)
 
 # === Small talk handler ===
 def handle_small_talk(msg: str):
@@ -154,251 +173,278 @@ def detect_ingestion_intent(msg: str) -> Optional[Dict[str, str]]:
     
     return None
 
-@app.route("/")
-def index():
-    return render_template('index.html')
-
-@app.route("/ask", methods=["POST"])
-def ask():
-    msg = request.json.get("query")  # expecting JSON {"query": "..."}
-
-    # Ensure session ID
-    if 'session_id' not in session:
-        session['session_id'] = str(uuid.uuid4())
-
-    session_id = session['session_id']
-
-    smalltalk_reply = handle_small_talk(msg)
-    if smalltalk_reply:
-        return jsonify({"answer": smalltalk_reply, "sources": []})
+NON_MEDICAL_REPLY = "Sorry, I can only answer medical-related questions. Please ask about diseases, symptoms, treatments, medications, health conditions, or other medical topics."
 
-    ingestion_info = detect_ingestion_intent(msg)
-    if ingestion_info:
-        try:
-            mcp_client = get_mcp_client()
-            
-            if ingestion_info.get("action") == "list":
-                result = mcp_client.list_datasets()
-                if result.get("success"):
-                    datasets = result.get("datasets", [])
-                    if datasets:
-                        answer = f"📊 Found {len(datasets)} ingested dataset(s):\n\n"
-                        for ds in datasets:
-                            answer += f"• **{ds['name']}** ({ds['format']}, {ds['record_count']} records)\n"
-                        answer += "\nNote: These datasets are tracked by MCP. To make them searchable, run 'python store_index.py'."
-                    else:
-                        answer = "No datasets have been ingested yet. Use 'ingest dataset <filename>' to add one."
-                    return jsonify({
-                        "answer": answer,
-                        "sources": [],
-                        "ingestion_result": result
-                    })
+# === Ingestion commands ===
+def handle_ingestion_request(ingestion_info: Dict[str, str]) -> Dict:
+    """Run a chat-triggered MCP ingestion command and build the reply payload."""
+    try:
+        mcp_client = get_mcp_client()
+        
+        if ingestion_info.get("action") == "list":
+            result = mcp_client.list_datasets()
+            if result.get("success"):
+                datasets = result.get("datasets", [])
+                if datasets:
+                    answer = f"📊 Found {len(datasets)} ingested dataset(s):\n\n"
+                    for ds in datasets:
+                        answer += f"• **{ds['name']}** ({ds['format']}, {ds['record_count']} records)\n"
+                    answer += "\nNote: These datasets are tracked by MCP. To make them searchable, run 'python store_index.py'."
                 else:
-                    return jsonify({
-                        "answer": f"❌ Error listing datasets: {result.get('error', 'Unknown error')}",
-                        "sources": []
-                    })
+                    answer = "No datasets have been ingested yet. Use 'ingest dataset <filename>' to add one."
+                return {
+                    "answer": answer,
+                    "sources": [],
+                    "ingestion_result": result
+                }
+            else:
+                return {
+                    "answer": f"❌ Error listing datasets: {result.get('error', 'Unknown error')}",
+                    "sources": []
+                }
+        
+        elif ingestion_info.get("action") == "ingest":
+            file_path = ingestion_info.get("file_path")
+            format_type = ingestion_info.get("format_type", "auto")
             
-            elif ingestion_info.get("action") == "ingest":
-                file_path = ingestion_info.get("file_path")
-                format_type = ingestion_info.get("format_type", "auto")
-                
-                result = mcp_client.ingest_dataset(file_path, format_type)
-                
-                if result.get("success"):
-                    metadata = result.get("metadata", {})
-                    answer = (
-                        f"✅ Successfully ingested dataset '{metadata.get('name', 'unknown')}'!\n\n"
-                        f"📊 Details:\n"
-                        f"- Format: {metadata.get('format', 'unknown')}\n"
-                        f"- Records: {metadata.get('record_count', 0)}\n"
-                        f"- Total documents: {result.get('documents', 0)}\n\n"
-                        f"⚠️ **Note:** To make this data searchable, the vector index needs to be updated. "
-                        f"Run 'python store_index.py' in the terminal to update the index."
-                    )
-                    return jsonify({
-                        "answer": answer,
-                        "sources": [],
-                        "ingestion_result": result
-                    })
+            resolved_path = mcp_client.resolve_dataset_path(file_path)
+            
+            if resolved_path is not None:
+                # Runs in the background; the reply only carries the job id.
+                # The index update only diffs Data/, so files elsewhere need store_index.py
+                in_data_dir = Path(resolved_path).resolve().is_relative_to(Path('Data').resolve())
+                job = ingestion_queue.submit(str(resolved_path), format_type,
+                                             update_index=INGEST_UPDATE_INDEX and in_data_dir)
+                if job.update_index:
+                    index_note = "The vector index will be updated automatically when ingestion finishes."
                 else:
-                    error_msg = result.get("error", "Unknown error occurred")
-                    answer = (
-                        f"❌ Failed to ingest dataset: {error_msg}\n\n"
-                        f"**Please check:**\n"
-                        f"- File path is correct\n"
-                        f"- File exists in the Data/ directory\n"
-                        f"- Format is supported (JSON, CSV, or PDF)\n\n"
-                        f"Example: 'ingest dataset medical_conditions.json'"
-                    )
-                    return jsonify({
-                        "answer": answer,
-                        "sources": [],
-                        "ingestion_result": result
-                    })
+                    index_note = ("To make this data searchable, the vector index needs to be updated. "
+                                  "Run 'python store_index.py' in the terminal to update the index.")
+                answer = (
+                    f"⏳ Ingesting dataset '{file_path}' in the background.\n\n"
+                    f"📊 Job ID: {job.job_id}\n"
+                    f"- Progress: /ingest/jobs/{job.job_id}\n\n"
+                    f"⚠️ **Note:** {index_note}"
+                )
+                return {
+                    "answer": answer,
+                    "sources": [],
+                    "ingestion_job": job.to_dict()
+                }
             else:
-                return jsonify({
-                    "answer": f"Unknown ingestion action: {ingestion_info.get('action')}",
-                    "sources": []
-                })
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            return jsonify({
-                "answer": f"❌ Error with MCP server: {str(e)}",
+                result = {
+                    "success": False,
+                    "error": f"File not found: {file_path}. Please provide a valid file path."
+                }
+                error_msg = result.get("error", "Unknown error occurred")
+                answer = (
+                    f"❌ Failed to ingest dataset: {error_msg}\n\n"
+                    f"**Please check:**\n"
+                    f"- File path is correct\n"
+                    f"- File exists in the Data/ directory\n"
+                    f"- Format is supported (JSON, CSV, or PDF)\n\n"
+                    f"Example: 'ingest dataset medical_conditions.json'"
+                )
+                return {
+                    "answer": answer,
+                    "sources": [],
+                    "ingestion_result": result
+                }
+        else:
+            return {
+                "answer": f"Unknown ingestion action: {ingestion_info.get('action')}",
                 "sources": []
-            })
+            }
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return {
+            "answer": f"❌ Error with MCP server: {str(e)}",
+            "sources": []
+        }
 
-    # Early medical query check - reject non-medical queries before RAG retrieval
-    medical_searcher = get_medical_searcher()
-    msg_lower = msg.lower()
-    
-    # Check for clearly non-medical geographic/location queries
-    location_patterns = [
-        r"where\s+(is|are)\s+",
-        r"what\s+(is|are)\s+the\s+(capital|location)\s+of",
-        r"where\s+(is|are)\s+(new\s+york|paris|london|france|england|america|usa)",
-    ]
-    location_keywords = ["new york city", "newyork", "capital of", "location of", 
-                        "where is", "geography", "geographic"]
-    
+# === Non-medical query rejection ===
+def reject_non_medical_query(msg: str) -> Optional[Dict]:
+    """Return a rejection payload for clearly non-medical queries, None otherwise."""
     # If it's a location query, reject immediately
-    if any(re.search(pattern, msg_lower) for pattern in location_patterns) or \
-       any(keyword in msg_lower for keyword in location_keywords):
-        return jsonify({
-            "answer": "Sorry, I can only answer medical-related questions. Please ask about diseases, symptoms, treatments, medications, health conditions, or other medical topics.",
+    if is_location_query(msg):
+        return {
+            "answer": NON_MEDICAL_REPLY,
             "sources": [],
             "source_breakdown": {}
-        })
+        }
     
-    # Use the medical query checker for other cases
-    if not medical_searcher.is_medical_query(msg):
-        # Additional non-medical keywords that should be rejected
-        non_medical_keywords = ["recipe", "cook", "how to make", "programming", 
-                               "python code", "sport", "game", "movie", "weather"]
-        if any(keyword in msg_lower for keyword in non_medical_keywords):
-            return jsonify({
-                "answer": "Sorry, I can only answer medical-related questions. Please ask about diseases, symptoms, treatments, medications, health conditions, or other medical topics.",
+    # Use the medical query checker for other cases; reject only queries
+    # that also mention a clearly non-medical topic
+    if not is_medical_query(msg):
+        if is_non_medical_topic(msg):
+            return {
+                "answer": NON_MEDICAL_REPLY,
                 "sources": [],
                 "source_breakdown": {}
-            })
+            }
+    
+    return None
 
-    try:
-        # Get RAG documents from Pinecone
-        retrieved_docs = retriever.get_relevant_documents(msg)
-        
-        sources = []
-        rag_sources = []
-        seen_sources = set()
-        
-        # Collect RAG/Pinecone sources and content
-        rag_context = []
-        for doc in retrieved_docs:
-            source = doc.metadata.get('source', 'unknown')
-            source_type = doc.metadata.get('type', 'pdf')
-            
-            if source != 'unknown':
-                filename = os.path.basename(source)
-                if filename not in seen_sources:
-                    sources.append({
-                        "filename": filename,
-                        "type": source_type,
-                        "path": source,
-                        "category": "RAG"
-                    })
-                    rag_sources.append(filename)
-                    seen_sources.add(filename)
-                    rag_context.append(f"[From {filename}]: {doc.page_content}")
-        
-        # Search MCP documents (local datasets) as additional source
-        mcp_client = get_mcp_client()
-        mcp_results = mcp_client.search_mcp_documents(msg)
-        mcp_sources = []
-        mcp_context = []
-        
-        if mcp_results.get("found"):
-            for result in mcp_results.get("results", []):
-                mcp_filename = result.get('source', 'unknown')
-                if mcp_filename not in seen_sources:
-                    sources.append({
-                        "filename": os.path.basename(mcp_filename),
-                        "type": "mcp",
-                        "path": mcp_filename,
-                        "relevance": result.get('relevance', 0),
-                        "category": "MCP"
-                    })
-                    mcp_sources.append(os.path.basename(mcp_filename))
-                    seen_sources.add(mcp_filename)
-                    content = result.get('content', '')
-                    if content:
-                        mcp_context.append(f"[From {os.path.basename(mcp_filename)}]: {content}")
-        
-        # Search the web using Exa AI for medical information WITH CONTENT
-        medical_searcher = get_medical_searcher()
-        print(f"🔍 DEBUG: Searching Exa AI for: {msg}")
-        web_results = medical_searcher.search_with_content(msg, num_results=5)
-        print(f"🔍 DEBUG: Exa results: {web_results}")
-        web_sources = []
-        web_context = []
-        
-        if web_results.get("found"):
-            print(f"✅ DEBUG: Found {len(web_results.get('results', []))} web results")
-            for result in web_results.get("results", []):
-                web_url = result.get('url', 'unknown')
-                if web_url not in seen_sources:
-                    title = result.get('title', 'Web Result')
-                    domain = result.get('source', 'unknown')
-                    content = result.get('content', '')
-                    
-                    print(f"📄 DEBUG: Web result - {title} from {domain}, content length: {len(content)}")
-                    
-                    sources.append({
-                        "filename": title,
-                        "type": "web",
-                        "url": web_url,
-                        "source": domain,
-                        "summary": content[:200] if content else '',
-                        "category": "Web"
-                    })
-                    web_sources.append(domain)
-                    seen_sources.add(web_url)
-                    
-                    # Add web content to context for LLM
-                    if content:
-                        web_context.append(f"[From {domain} - {title}]: {content}")
+# === Retrieval and prompt assembly ===
+def prepare_medical_answer(msg: str) -> Dict:
+    """
+    Retrieve context for a medical query and build the LLM prompt.
+    
+    Returns:
+        Either {"response": payload} when the query can be answered without
+        the LLM, or a dict with "prompt", "sources", "source_breakdown" and
+        "attribution" for the generation step.
+    """
+    medical_searcher = get_medical_searcher()
+    
+    # Query Pinecone, MCP datasets and Exa concurrently; each source has its
+    # own deadline and late or failed sources are simply left out
+    mcp_client = get_mcp_client()
+    tasks = {
+        "rag": lambda: retriever.get_relevant_documents(msg),
+        "mcp": lambda: mcp_client.search_mcp_documents(msg),
+    }
+    if ADAPTIVE_WEB_SEARCH:
+        # Local sources get a short head start; when they answer within it the
+        # planner decides whether the web search runs at all and how large
+        planner = get_retrieval_planner()
+        print(f"🔍 DEBUG: Searching RAG and MCP (adaptive web search) for: {msg}")
+
+        def web_search(num_results: int, max_characters: int):
+            return lambda: medical_searcher.search_with_content(
+                msg, num_results=num_results, max_characters=max_characters)
+
+        pending = PendingRetrieval(tasks, timeouts=RETRIEVAL_TIMEOUTS)
+        if pending.wait(["rag", "mcp"], timeout=WEB_SEARCH_GRACE_SECONDS):
+            retrieval_results = pending.collect(["rag", "mcp"])
+            plan = planner.plan(retrieval_results.get("rag"), retrieval_results.get("mcp"))
+            if not plan.skip:
+                pending.submit("web", web_search(plan.num_results, plan.max_characters))
         else:
-            print(f"❌ DEBUG: No web results found. Response: {web_results}")
+            # Local sources are slow: don't serialize the web search behind them
+            pending.submit("web", web_search(planner.full_results, planner.full_max_characters))
+            retrieval_results = pending.collect(["rag", "mcp"])
+            plan = planner.plan(retrieval_results.get("rag"), retrieval_results.get("mcp"))
+            if plan.skip:
+                pending.discard("web")
+        print(f"🔍 DEBUG: Web search plan: {plan.action} (rag={plan.rag_score}, "
+              f"mcp={plan.mcp_score}, confident hits={plan.confident_hits})")
+        retrieval_results["web"] = plan.apply(None if plan.skip else pending.collect(["web"])["web"])
+    else:
+        print(f"🔍 DEBUG: Searching RAG, MCP and Exa AI for: {msg}")
+        tasks["web"] = lambda: medical_searcher.search_with_content(msg, num_results=5)
+        retrieval_results = fan_out(tasks, timeouts=RETRIEVAL_TIMEOUTS)
+    retrieved_docs = retrieval_results.get("rag") or []
+    mcp_results = retrieval_results.get("mcp") or {}
+    web_results = retrieval_results.get("web") or {}
+    
+    sources = []
+    rag_sources = []
+    seen_sources = set()
+    
+    # Collect RAG/Pinecone sources and content
+    passages = []
+    for rank, doc in enumerate(retrieved_docs):
+        source = doc.metadata.get('source', 'unknown')
+        source_type = doc.metadata.get('type', 'pdf')
         
-        if web_results.get("medical_query") == False:
-            # Only reject if it's clearly not medical AND we have no RAG/MCP sources
-            if not rag_sources and not mcp_sources:
-                return jsonify({
-                    "answer": "Sorry, I can only answer medical-related questions.",
-                    "sources": [],
-                    "source_breakdown": {}
+        if source != 'unknown':
+            filename = os.path.basename(source)
+            if filename not in seen_sources:
+                sources.append({
+                    "filename": filename,
+                    "type": source_type,
+                    "path": source,
+                    "category": "RAG"
                 })
-        
-        # Combine all context sources
-        all_context = rag_context + mcp_context + web_context
-        
-        if not all_context:
-            # No context found anywhere
-            return jsonify({
-                "answer": "I couldn't find relevant information to answer your question. Please try rephrasing or ask a different medical question.",
+                rag_sources.append(filename)
+                seen_sources.add(filename)
+                passages.append(Passage("rag", f"From {filename}", doc.page_content,
+                                        score=doc.metadata.get('score'), rank=rank))
+    
+    # Collect MCP documents (local datasets) as additional source
+    mcp_sources = []
+    
+    if mcp_results.get("found"):
+        for rank, result in enumerate(mcp_results.get("results", [])):
+            mcp_filename = result.get('source', 'unknown')
+            if mcp_filename not in seen_sources:
+                sources.append({
+                    "filename": os.path.basename(mcp_filename),
+                    "type": "mcp",
+                    "path": mcp_filename,
+                    "relevance": result.get('relevance', 0),
+                    "category": "MCP"
+                })
+                mcp_sources.append(os.path.basename(mcp_filename))
+                seen_sources.add(mcp_filename)
+                content = result.get('content', '')
+                if content:
+                    passages.append(Passage("mcp", f"From {os.path.basename(mcp_filename)}", content,
+                                            score=result.get('relevance'), rank=rank))
+    
+    # Collect web results from Exa AI (medical information WITH CONTENT)
+    print(f"🔍 DEBUG: Exa results: {web_results}")
+    web_sources = []
+    
+    if web_results.get("found"):
+        print(f"✅ DEBUG: Found {len(web_results.get('results', []))} web results")
+        for rank, result in enumerate(web_results.get("results", [])):
+            web_url = result.get('url', 'unknown')
+            if web_url not in seen_sources:
+                title = result.get('title', 'Web Result')
+                domain = result.get('source', 'unknown')
+                content = result.get('content', '')
+                
+                print(f"📄 DEBUG: Web result - {title} from {domain}, content length: {len(content)}")
+                
+                sources.append({
+                    "filename": title,
+                    "type": "web",
+                    "url": web_url,
+                    "source": domain,
+                    "summary": content[:200] if content else '',
+                    "category": "Web"
+                })
+                web_sources.append(domain)
+                seen_sources.add(web_url)
+                
+                # Add web content to context for LLM
+                if content:
+                    passages.append(Passage("web", f"From {domain} - {title}", content, rank=rank))
+    else:
+        print(f"❌ DEBUG: No web results found. Response: {web_results}")
+    
+    if web_results.get("medical_query") == False:
+        # Only reject if it's clearly not medical AND we have no RAG/MCP sources
+        if not rag_sources and not mcp_sources:
+            return {"response": {
+                "answer": "Sorry, I can only answer medical-related questions.",
                 "sources": [],
-                "source_breakdown": {
-                    "rag_count": 0,
-                    "mcp_count": 0,
-                    "web_count": 0,
-                    "total": 0
-                }
-            })
-        
-        # Build enhanced prompt with all context
-        from langchain_openai import ChatOpenAI
-        llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.4, max_tokens=1500)
-        
-        enhanced_prompt = f"""You are a knowledgeable medical assistant. Answer the following medical question using the provided context from multiple sources.
+                "source_breakdown": {}
+            }}
+    
+    # Dedupe, rank and fit all context sources into the token budget
+    all_context, context_stats = get_context_packer().pack(passages)
+    print(f"🔍 DEBUG: Context packed: {context_stats['tokens']}/{context_stats['budget']} tokens "
+          f"from {context_stats['passages']} passages")
+    
+    if not all_context:
+        # No context found anywhere
+        return {"response": {
+            "answer": "I couldn't find relevant information to answer your question. Please try rephrasing or ask a different medical question.",
+            "sources": [],
+            "source_breakdown": {
+                "rag_count": 0,
+                "mcp_count": 0,
+                "web_count": 0,
+                "total": 0
+            }
+        }}
+    
+    # Build enhanced prompt with all context
+    enhanced_prompt = f"""You are a knowledgeable medical assistant. Answer the following medical question using the provided context from multiple sources.
 
 CONTEXT FROM MULTIPLE SOURCES:
 {chr(10).join(all_context)}
@@ -414,44 +460,141 @@ INSTRUCTIONS:
 6. Keep your answer clear and well-organized
 
 ANSWER:"""
+    
+    # Build source attribution footer
+    attribution = []
+    if rag_sources:
+        attribution.append(f"📚 **RAG Sources**: {', '.join(rag_sources[:3])}")
+    if mcp_sources:
+        attribution.append(f"📊 **MCP (Local Data)**: {', '.join(mcp_sources[:3])}")
+    if web_sources:
+        # Get unique web source titles for attribution
+        web_titles = []
+        for source in sources:
+            if source.get('category') == 'Web' and source.get('filename'):
+                if source['filename'] not in web_titles:
+                    web_titles.append(source['filename'])
+        if web_titles:
+            attribution.append(f"🌐 **Web Search (Exa AI)**: {', '.join(web_titles[:3])}")
+        else:
+            attribution.append(f"🌐 **Web Search (Exa AI)**: {', '.join(list(dict.fromkeys(web_sources))[:3])}")
+    
+    return {
+        "prompt": enhanced_prompt,
+        "sources": sources,
+        "source_breakdown": {
+            "rag_count": len(rag_sources),
+            "mcp_count": len(mcp_sources),
+            "web_count": len(web_sources),
+            "total": len(sources)
+        },
+        "context_stats": context_stats,
+        "attribution": attribution
+    }
+
+def route_query(msg: str) -> Dict:
+    """
+    Run every step of /ask that happens before generation.
+    
+    Returns:
+        {"response": payload} for small talk, ingestion commands and rejected
+        queries, otherwise the prepared prompt from prepare_medical_answer().
+    """
+    smalltalk_reply = handle_small_talk(msg)
+    if smalltalk_reply:
+        return {"response": {"answer": smalltalk_reply, "sources": []}}
+
+    ingestion_info = detect_ingestion_intent(msg)
+    if ingestion_info:
+        return {"response": handle_ingestion_request(ingestion_info)}
+
+    # Early medical query check - reject non-medical queries before RAG retrieval
+    rejection = reject_non_medical_query(msg)
+    if rejection:
+        return {"response": rejection}
+
+    # Serve near-identical questions from the semantic answer cache
+    if answer_cache is not None:
+        cached = answer_cache.lookup(msg)
+        if cached is not None:
+            return {"response": dict(cached, cached=True)}
+
+    return prepare_medical_answer(msg)
+
+def build_answer_payload(prepared: Dict, answer_text: str) -> Dict:
+    """Attach the source attribution footer and breakdown to a generated answer."""
+    final_answer = answer_text
+    if prepared["attribution"]:
+        final_answer += "\n\n---\n**Sources Used**:\n" + "\n".join(prepared["attribution"])
+    
+    return {
+        "answer": final_answer,
+        "sources": prepared["sources"],
+        "source_breakdown": prepared["source_breakdown"],
+        "context_stats": prepared["context_stats"]
+    }
+
+def get_answer_llm():
+    """LLM used to generate /ask answers."""
+    return get_llm(max_tokens=1500)
+
+def ensure_session_id() -> str:
+    """Ensure the browser session has an id and return it."""
+    if 'session_id' not in session:
+        session['session_id'] = str(uuid.uuid4())
+    return session['session_id']
+
+def sse_event(event: str, data: Dict) -> str:
+    """Format one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route("/")
+def index():
+    return render_template('index.html')
+
+@app.route("/metrics")
+def metrics():
+    """Runtime cache and eviction metrics."""
+    return jsonify({
+        "sessions": session_store.stats(),
+        "embeddings": embeddings.stats(),
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+        "web_cache": web_cache.stats() if web_cache is not None else None,
+        "web_search": get_medical_searcher().stats(),
+        "retrieval_planner": get_retrieval_planner().stats()
+    })
+
+@app.route("/ingest/jobs")
+def ingest_jobs():
+    """Status of recent background ingestion jobs."""
+    return jsonify({"jobs": [job.to_dict() for job in ingestion_queue.list()]})
+
+@app.route("/ingest/jobs/<job_id>")
+def ingest_job_status(job_id):
+    """Status and progress of one background ingestion job."""
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown ingestion job: {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/ask", methods=["POST"])
+def ask():
+    msg = request.json.get("query")  # expecting JSON {"query": "..."}
+    session_id = ensure_session_id()
+
+    try:
+        prepared = route_query(msg)
+        if "response" in prepared:
+            return jsonify(prepared["response"])
         
         # Generate answer using LLM with all context
-        response = llm.invoke(enhanced_prompt)
-        answer_text = response.content
-        
-        # Build source attribution footer
-        attribution = []
-        if rag_sources:
-            attribution.append(f"📚 **RAG Sources**: {', '.join(rag_sources[:3])}")
-        if mcp_sources:
-            attribution.append(f"📊 **MCP (Local Data)**: {', '.join(mcp_sources[:3])}")
-        if web_sources:
-            # Get unique web source titles for attribution
-            web_titles = []
-            for source in sources:
-                if source.get('category') == 'Web' and source.get('filename'):
-                    if source['filename'] not in web_titles:
-                        web_titles.append(source['filename'])
-            if web_titles:
-                attribution.append(f"🌐 **Web Search (Exa AI)**: {', '.join(web_titles[:3])}")
-            else:
-                attribution.append(f"🌐 **Web Search (Exa AI)**: {', '.join(set(web_sources)[:3])}")
+        llm = get_answer_llm()
+        response = llm.invoke(prepared["prompt"])
         
-        # Build final answer with attribution
-        final_answer = answer_text
-        if attribution:
-            final_answer += "\n\n---\n**Sources Used**:\n" + "\n".join(attribution)
-        
-        return jsonify({
-            "answer": final_answer,
-            "sources": sources,
-            "source_breakdown": {
-                "rag_count": len(rag_sources),
-                "mcp_count": len(mcp_sources),
-                "web_count": len(web_sources),
-                "total": len(sources)
-            }
-        })
+        payload = build_answer_payload(prepared, response.content)
+        if answer_cache is not None:
+            answer_cache.store(msg, payload)
+        return jsonify(payload)
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -460,5 +603,56 @@ ANSWER:"""
             "sources": []
         }), 500
 
+@app.route("/ask/stream", methods=["POST"])
+def ask_stream():
+    """
+    Streaming variant of /ask using Server-Sent Events.
+    
+    Emits a "sources" event once retrieval is done, a "token" event per LLM
+    chunk, and a final "done" event carrying the same payload /ask returns.
+    Answers that need no generation (small talk, ingestion, rejections) are
+    sent as a single "done" event; failures are sent as an "error" event.
+    """
+    msg = request.json.get("query")  # expecting JSON {"query": "..."}
+    session_id = ensure_session_id()
+
+    def generate():
+        try:
+            prepared = route_query(msg)
+            if "response" in prepared:
+                yield sse_event("done", prepared["response"])
+                return
+            
+            yield sse_event("sources", {
+                "sources": prepared["sources"],
+                "source_breakdown": prepared["source_breakdown"],
+                "context_stats": prepared["context_stats"]
+            })
+            
+            llm = get_answer_llm()
+            answer_parts = []
+            for chunk in llm.stream(prepared["prompt"]):
+                if chunk.content:
+                    answer_parts.append(chunk.content)
+                    yield sse_event("token", {"text": chunk.content})
+            
+            payload = build_answer_payload(prepared, "".join(answer_parts))
+            if answer_cache is not None:
+                answer_cache.store(msg, payload)
+            yield sse_event("done", payload)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            yield sse_event("error", {
+                "answer": f"❌ Error processing your question: {str(e)}",
+                "sources": []
+            })
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8080, debug=True)
@@ -26,18 +26,21 @@ from ragas.metrics import (
     context_recall,
 )
 from datasets import Dataset
-from langchain_openai import ChatOpenAI
 from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
 from src.helper import download_hugging_face_embeddings
+from src.llm import get_llm
+from src.vector_store import get_vector_backend, get_vector_index
+from src.retriever import DirectPineconeRetriever
 from langchain_pinecone import PineconeVectorStore
 
 
 load_dotenv()
 PINECONE_API_KEY = os.environ.get('PINECONE_API_KEY')
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
+if PINECONE_API_KEY:
+    os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 # Load QA dataset - try expanded version first, fallback to original
@@ -50,7 +53,7 @@ with open(qa_dataset_path, 'r') as f:
 
 def build_rag_chain_for_eval(retriever):
     """Build RAG chain for evaluation (modified to return contexts)."""
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.4, max_tokens=500)
+    llm = get_llm(max_tokens=500)
 
     system_prompt = """You are a MEDICAL chatbot.
     Use ONLY the provided medical context to answer.
@@ -81,15 +84,23 @@ def prepare_evaluation_data():
     # Setup retriever
     embeddings = download_hugging_face_embeddings()
     index_name = "medicalbot"
-    docsearch = PineconeVectorStore.from_existing_index(
-        index_name=index_name,
-        embedding=embeddings,
-        namespace="default"
-    )
-    retriever = docsearch.as_retriever(
-        search_type="mmr",
-        search_kwargs={"k": 8, "fetch_k": 20, "lambda_mult": 0.5}
-    )
+    if get_vector_backend() == "local":
+        # Local on-disk vectors: plain top-k similarity search
+        retriever = DirectPineconeRetriever(
+            index=get_vector_index(index_name),
+            embeddings=embeddings,
+            k=8
+        )
+    else:
+        docsearch = PineconeVectorStore.from_existing_index(
+            index_name=index_name,
+            embedding=embeddings,
+            namespace="default"
+        )
+        retriever = docsearch.as_retriever(
+            search_type="mmr",
+            search_kwargs={"k": 8, "fetch_k": 20, "lambda_mult": 0.5}
+        )
 
     rag_chain = build_rag_chain_for_eval(retriever)
 
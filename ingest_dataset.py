@@ -9,6 +9,7 @@ Usage:
 Examples:
     python ingest_dataset.py Data/medical_conditions.json json
     python ingest_dataset.py Data/medical_data.csv csv
+    python ingest_dataset.py Data/Medical_book.pdf pdf --pages 0-50
 """
 
 import sys
@@ -31,6 +32,8 @@ def main():
                        help='Start MCP server (requires MCP SDK)')
     parser.add_argument('--list', action='store_true',
                        help='List all ingested datasets')
+    parser.add_argument('--pages', metavar='START-END',
+                       help='PDF only: 0-based page range to ingest (end exclusive)')
     
     args = parser.parse_args()
     
@@ -88,8 +91,17 @@ def main():
     print(f"Ingesting dataset: {file_path}")
     print(f"Format: {args.format_type}")
     
+    page_range = None
+    if args.pages:
+        try:
+            start, end = args.pages.split('-', 1)
+            page_range = (int(start), int(end))
+        except ValueError:
+            print(f"Error: --pages must look like START-END, got {args.pages}")
+            sys.exit(1)
+    
     try:
-        result = ingest_third_party_dataset(str(file_path), args.format_type)
+        result = ingest_third_party_dataset(str(file_path), args.format_type, page_range=page_range)
         
         if result['success']:
             print("\n✓ Dataset ingested successfully!")
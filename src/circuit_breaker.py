@@ -0,0 +1,158 @@
+"""
+Circuit breaker and latency histogram for external dependencies.
+
+When a dependency (Exa web search) keeps failing or answering slowly, the
+breaker opens and callers skip it for a cool-down window instead of every
+request waiting for its timeout. After the window one trial call is let
+through (half-open): success closes the breaker, failure opens it again.
+"""
+
+import bisect
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is skipped because the breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker; slow calls count as failures."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        slow_call_seconds: Optional[float] = None,
+        reset_timeout: float = 30.0
+    ):
+        """
+        Args:
+            failure_threshold: Consecutive failed or slow calls that open the breaker
+            slow_call_seconds: Calls slower than this count as failures
+            reset_timeout: Seconds the breaker stays open before a trial call
+        """
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now."""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, latency: float):
+        """Record a completed call (too slow a call still counts as a failure)."""
+        if self.slow_call_seconds is not None and latency > self.slow_call_seconds:
+            self.record_failure()
+            return
+        with self._lock:
+            self._failures = 0
+            self._state = self.CLOSED
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "slow_call_seconds": self.slow_call_seconds,
+                "reset_timeout_seconds": self.reset_timeout,
+                "retry_in_seconds": max(0.0, self.reset_timeout - (now - self._opened_at))
+                                    if state == self.OPEN else 0.0,
+                "times_opened": self.times_opened,
+                "rejected_calls": self.rejected,
+            }
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with per-outcome counts."""
+
+    DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0)
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        Args:
+            buckets: Upper bounds in seconds; a final +Inf bucket is implied
+        """
+        self.buckets = sorted(buckets)
+        self._lock = threading.Lock()
+        self._counts: List[int] = [0] * (len(self.buckets) + 1)
+        self._outcomes: Dict[str, int] = {}
+        self._total = 0.0
+
+    def record(self, seconds: float, outcome: str = "ok"):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self._outcomes[outcome] = self._outcomes.get(outcome, 0) + 1
+            self._total += seconds
+
+    def _quantile(self, q: float, count: int) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None if above all buckets)."""
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets + [None], self._counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count = sum(self._counts)
+            labels = [f"le_{bound:g}" for bound in self.buckets] + ["le_inf"]
+            return {
+                "count": count,
+                "mean_seconds": self._total / count if count else None,
+                "p50_seconds": self._quantile(0.5, count),
+                "p95_seconds": self._quantile(0.95, count),
+                "p99_seconds": self._quantile(0.99, count),
+                "buckets": dict(zip(labels, self._counts)),
+                "outcomes": dict(self._outcomes),
+            }
@@ -0,0 +1,213 @@
+"""
+Token-budgeted context assembly for the /ask prompt.
+
+RAG chunks, MCP records and web pages used to be concatenated into the prompt
+without any size control, so prompt tokens (and with them prefill latency and
+cost) varied from a few hundred to several thousand per question. The packer
+counts tokens with tiktoken (a chars/4 estimate when it is not installed),
+drops passages that are near-duplicates of a better-ranked one (Jaccard
+similarity of their word sets), orders the rest by relevance and fills
+CONTEXT_TOKEN_BUDGET, truncating the last passage that only partly fits.
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_DEDUPE_THRESHOLD = float(os.getenv("CONTEXT_DEDUPE_THRESHOLD", "0.8"))
+CONTEXT_MIN_PASSAGE_TOKENS = int(os.getenv("CONTEXT_MIN_PASSAGE_TOKENS", "64"))
+
+# Tie-break between sources whose passages rank equally
+SOURCE_PRIORITY = ("rag", "mcp", "web")
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+class TokenCounter:
+    """Counts and truncates text in model tokens."""
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        self._encoding = None
+        if TIKTOKEN_AVAILABLE:
+            try:
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.model)
+                except KeyError:
+                    self._encoding = tiktoken.get_encoding("o200k_base")
+            except Exception as e:
+                # Encodings are downloaded on first use; stay usable offline
+                print(f"Warning: Could not load tiktoken encoding, estimating tokens: {e}")
+
+    @property
+    def name(self) -> str:
+        return self._encoding.name if self._encoding is not None else "chars/4"
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of text that fits in max_tokens."""
+        if max_tokens <= 0:
+            return ""
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            return text if len(tokens) <= max_tokens else self._encoding.decode(tokens[:max_tokens])
+        return text[:max_tokens * 4]
+
+
+@dataclass
+class Passage:
+    """One piece of retrieved context."""
+    source: str  # "rag", "mcp" or "web"
+    label: str  # Shown before the text, e.g. "From guidelines.pdf"
+    text: str
+    score: Optional[float] = None  # Source-specific relevance; higher is better
+    rank: int = 0  # Position within its source's results
+
+    def render(self, text: Optional[str] = None) -> str:
+        return f"[{self.label}]: {self.text if text is None else text}"
+
+
+def _word_set(text: str) -> frozenset:
+    return frozenset(_WORD_PATTERN.findall(text.lower()))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _relevance(passages: Sequence[Passage]) -> List[float]:
+    """
+    Comparable relevance in [0, 1] for passages from different sources.
+
+    Scores are on different scales (cosine similarity, BM25, web rank), so
+    each source is normalized by its own best score; passages without a score
+    use their rank within the source.
+    """
+    best: Dict[str, float] = {}
+    for passage in passages:
+        if passage.score is not None and passage.score > 0:
+            best[passage.source] = max(best.get(passage.source, 0.0), passage.score)
+
+    relevance = []
+    for passage in passages:
+        top = best.get(passage.source)
+        if passage.score is not None and top:
+            relevance.append(max(passage.score, 0.0) / top)
+        else:
+            relevance.append(1.0 / (1 + passage.rank))
+    return relevance
+
+
+class ContextPacker:
+    """Selects, dedupes and truncates passages to fit a token budget."""
+
+    def __init__(
+        self,
+        budget: int = CONTEXT_TOKEN_BUDGET,
+        dedupe_threshold: float = CONTEXT_DEDUPE_THRESHOLD,
+        min_passage_tokens: int = CONTEXT_MIN_PASSAGE_TOKENS,
+        counter: Optional[TokenCounter] = None
+    ):
+        """
+        Args:
+            budget: Maximum context tokens (the question and instructions are extra)
+            dedupe_threshold: Jaccard similarity above which a passage is a duplicate
+            min_passage_tokens: Smallest truncated passage worth including
+            counter: Token counter (tiktoken for OPENAI_MODEL by default)
+        """
+        self.budget = budget
+        self.dedupe_threshold = dedupe_threshold
+        self.min_passage_tokens = min_passage_tokens
+        self.counter = counter or TokenCounter()
+
+    def pack(self, passages: Sequence[Passage]) -> Tuple[List[str], Dict[str, Any]]:
+        """
+        Returns:
+            (context blocks in relevance order, stats with tokens per source)
+        """
+        relevance = _relevance(passages)
+        order = sorted(
+            range(len(passages)),
+            key=lambda i: (-relevance[i],
+                           SOURCE_PRIORITY.index(passages[i].source)
+                           if passages[i].source in SOURCE_PRIORITY else len(SOURCE_PRIORITY),
+                           passages[i].rank)
+        )
+
+        per_source: Dict[str, Dict[str, int]] = {}
+        for passage in passages:
+            per_source.setdefault(passage.source, {
+                "candidates": 0, "included": 0, "tokens": 0,
+                "duplicates": 0, "dropped": 0, "truncated": 0
+            })["candidates"] += 1
+
+        blocks: List[str] = []
+        kept_words: List[frozenset] = []
+        used = 0
+        candidate_tokens = 0
+        for i in order:
+            passage = passages[i]
+            source_stats = per_source[passage.source]
+            if not passage.text.strip():
+                source_stats["dropped"] += 1
+                continue
+
+            words = _word_set(passage.text)
+            if any(jaccard(words, kept) >= self.dedupe_threshold for kept in kept_words):
+                source_stats["duplicates"] += 1
+                continue
+
+            block = passage.render()
+            tokens = self.counter.count(block)
+            candidate_tokens += tokens
+            remaining = self.budget - used
+            if tokens > remaining:
+                header_tokens = self.counter.count(passage.render(""))
+                if remaining - header_tokens < self.min_passage_tokens:
+                    source_stats["dropped"] += 1
+                    continue
+                block = passage.render(self.counter.truncate(passage.text, remaining - header_tokens))
+                tokens = self.counter.count(block)
+                source_stats["truncated"] += 1
+
+            blocks.append(block)
+            kept_words.append(words)
+            used += tokens
+            source_stats["included"] += 1
+            source_stats["tokens"] += tokens
+
+        stats = {
+            "tokenizer": self.counter.name,
+            "budget": self.budget,
+            "tokens": used,
+            "candidate_tokens": candidate_tokens,
+            "passages": len(blocks),
+            "sources": per_source,
+        }
+        return blocks, stats
+
+
+# Global packer instance
+_packer = None
+
+def get_context_packer() -> ContextPacker:
+    """Get or create the context packer configured from the environment."""
+    global _packer
+    if _packer is None:
+        _packer = ContextPacker()
+    return _packer
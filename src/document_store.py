@@ -0,0 +1,286 @@
+"""
+On-disk document store for MCP-ingested datasets.
+
+Documents are appended to a JSONL segment file (one {"page_content",
+"metadata"} object per line) and their byte offsets to a fixed-width index
+file, so a worker restart only reads the offset index (8 bytes per document)
+instead of re-parsing every source file. Documents are decoded lazily with
+os.pread when search results reference them.
+
+Ids are positions and never reused. Documents of an evicted or re-ingested
+dataset are tombstoned (their ids are appended to a .dead file) rather than
+rewritten in place.
+
+Several processes (the app's workers, the ingest_dataset.py CLI) may write
+the same store: every append takes an exclusive fcntl lock, catches up with
+the offsets other processes wrote and records its own before releasing it,
+so ids are never handed out twice. Readers pick up other processes'
+documents with refresh().
+"""
+
+import json
+import os
+import threading
+from array import array
+from contextlib import contextmanager
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Iterable, Iterator, Tuple
+
+from langchain_core.documents import Document
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # Windows: fall back to in-process locking only
+    FCNTL_AVAILABLE = False
+
+
+DOCUMENT_STORE_PATH = Path("Data/.mcp_documents.jsonl")
+
+
+class DocumentStore(Sequence):
+    """Append-only, list-like store of Documents addressed by position."""
+
+    def __init__(self, path: Path = DOCUMENT_STORE_PATH):
+        """
+        Args:
+            path: JSONL segment file; the offset index (.idx), tombstones
+                  (.dead) and lock file (.lock) are kept next to it
+        """
+        self.path = Path(path)
+        self.index_path = self.path.with_suffix('.idx')
+        self.tombstone_path = self.path.with_suffix('.dead')
+        self.lock_path = self.path.with_suffix('.lock')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._offsets = array('Q')          # start offset of every indexed document
+        self._unflushed = []                 # ids appended since the last flush()
+        self._end = 0                        # end of the segment as last seen
+        self._flushed = 0                    # offsets already written to the .idx file
+        self._deleted = frozenset()          # tombstoned ids (replaced on write)
+        self._tombstone_bytes = 0            # .dead bytes already read
+        self._segment_inode = None
+        self._reader_fd = None
+        self._writer_fd = None
+
+        self.path.touch(exist_ok=True)
+        with self._lock, self._file_lock():
+            self._sync(recover=True)
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock against writers in other processes."""
+        if not FCNTL_AVAILABLE:
+            yield
+            return
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def refresh(self):
+        """Pick up documents and tombstones other processes have written."""
+        with self._lock:
+            self._sync(recover=False)
+
+    def _sync(self, recover: bool):
+        """
+        Catch up with the segment, offset index and tombstones on disk.
+
+        With recover (file lock held) a document whose offset never reached
+        the index (a writer crashed in between) is indexed and a torn final
+        line is cut off; readers only take documents the index lists.
+        """
+        stat = os.stat(self.path)
+        if stat.st_ino != self._segment_inode:
+            # First load, or clear() swapped in new files
+            for fd in (self._reader_fd, self._writer_fd):
+                if fd is not None:
+                    os.close(fd)
+            self._writer_fd = None
+            self._reader_fd = os.open(self.path, os.O_RDONLY)
+            self._segment_inode = os.fstat(self._reader_fd).st_ino
+            self._offsets = array('Q')
+            self._flushed = 0
+            self._deleted = frozenset()
+            self._tombstone_bytes = 0
+
+        offsets = self._offsets
+        new = array('Q')
+        try:
+            index_size = os.path.getsize(self.index_path)
+        except FileNotFoundError:
+            index_size = 0
+        if index_size > self._flushed * offsets.itemsize:
+            with open(self.index_path, 'rb') as f:
+                f.seek(self._flushed * offsets.itemsize)
+                raw = f.read()
+            new.frombytes(raw[:len(raw) - len(raw) % new.itemsize])
+        size = os.fstat(self._reader_fd).st_size
+
+        if not recover:
+            offsets.extend(new)
+            self._flushed = len(offsets)
+        elif (new and new[-1] >= size) or (size and not offsets and not new):
+            self._offsets = self._scan_offsets()
+            self._write_index(full=True)
+            size = os.fstat(self._reader_fd).st_size
+        else:
+            offsets.extend(new)
+            self._flushed = len(offsets)
+            if offsets:
+                with open(self.path, 'rb') as f:
+                    f.seek(offsets[-1])
+                    f.readline()
+                    while True:
+                        position = f.tell()
+                        line = f.readline()
+                        if not line.endswith(b"\n"):
+                            break
+                        offsets.append(position)
+                if position < size:
+                    os.truncate(self.path, position)
+                    size = position
+                if len(offsets) > self._flushed:
+                    self._write_index()
+
+        self._end = size
+        self._load_tombstones()
+
+    def _load_tombstones(self):
+        if not self.tombstone_path.exists():
+            return
+        with open(self.tombstone_path, 'rb') as f:
+            f.seek(self._tombstone_bytes)
+            raw = f.read()
+        dead = array('Q')
+        dead.frombytes(raw[:len(raw) - len(raw) % dead.itemsize])
+        self._tombstone_bytes += len(dead) * dead.itemsize
+        if dead:
+            self._deleted = self._deleted | frozenset(dead)
+
+    def _scan_offsets(self) -> array:
+        print(f"Rebuilding document offsets for {self.path}...")
+        offsets = array('Q')
+        with open(self.path, 'rb') as f:
+            position = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                if line.strip():
+                    offsets.append(position)
+                position += len(line)
+        if position < os.path.getsize(self.path):
+            os.truncate(self.path, position)
+        return offsets
+
+    def _write_index(self, full: bool = False):
+        if full:
+            tmp_path = self.index_path.with_suffix('.idx.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(self._offsets.tobytes())
+            os.replace(tmp_path, self.index_path)
+        else:
+            with open(self.index_path, 'ab') as f:
+                f.write(self._offsets[self._flushed:].tobytes())
+        self._flushed = len(self._offsets)
+
+    # === Reads ===
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, doc_id):
+        if isinstance(doc_id, slice):
+            return [self[i] for i in range(*doc_id.indices(len(self)))]
+        offsets = self._offsets
+        if doc_id < 0:
+            doc_id += len(offsets)
+        if not 0 <= doc_id < len(offsets):
+            raise IndexError("document id out of range")
+        start = offsets[doc_id]
+        end = offsets[doc_id + 1] if doc_id + 1 < len(offsets) else self._end
+        # Only the first line is ours even if the end moved since
+        line = os.pread(self._reader_fd, end - start, start).split(b"\n", 1)[0]
+        record = json.loads(line)
+        return Document(page_content=record["page_content"], metadata=record["metadata"])
+
+    def is_deleted(self, doc_id: int) -> bool:
+        return doc_id in self._deleted
+
+    @property
+    def live_count(self) -> int:
+        """Number of documents that are not tombstoned."""
+        return len(self._offsets) - len(self._deleted)
+
+    def iter_live(self) -> Iterator[Tuple[int, Document]]:
+        """(doc_id, document) pairs for every document that is not tombstoned."""
+        deleted = self._deleted
+        for doc_id in range(len(self._offsets)):
+            if doc_id not in deleted:
+                yield doc_id, self[doc_id]
+
+    # === Writes ===
+    def append(self, doc: Document) -> int:
+        """Append a document and return its id; flush() makes it durable."""
+        line = (json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}) + "\n").encode('utf-8')
+        with self._lock, self._file_lock():
+            # Another process may have appended since we last looked
+            self._sync(recover=True)
+            if self._writer_fd is None:
+                self._writer_fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+            os.write(self._writer_fd, line)
+            doc_id = len(self._offsets)
+            self._offsets.append(self._end)
+            self._end += len(line)
+            self._write_index()
+            self._unflushed.append(doc_id)
+            return doc_id
+
+    def extend(self, docs: Iterable[Document]):
+        try:
+            for doc in docs:
+                self.append(doc)
+        except BaseException:
+            self.rollback()
+            raise
+        self.flush()
+
+    def flush(self):
+        """Make appended documents durable."""
+        with self._lock:
+            if self._writer_fd is not None:
+                os.fsync(self._writer_fd)
+            self._unflushed = []
+
+    def rollback(self):
+        """Discard (tombstone) documents appended since the last flush()."""
+        with self._lock:
+            unflushed, self._unflushed = self._unflushed, []
+            self.delete(unflushed)
+
+    def delete(self, doc_ids: Iterable[int]):
+        """Tombstone documents; their ids are never reused."""
+        with self._lock, self._file_lock():
+            self._load_tombstones()
+            new = sorted(set(doc_ids) - self._deleted)
+            if not new:
+                return
+            with open(self.tombstone_path, 'ab') as f:
+                f.write(array('Q', new).tobytes())
+            self._tombstone_bytes += len(new) * 8
+            self._deleted = self._deleted | frozenset(new)
+
+    def clear(self):
+        """Remove every document (new empty files, so other processes notice)."""
+        with self._lock, self._file_lock():
+            # Segment last: its new inode is what readers check
+            for path in (self.index_path, self.tombstone_path, self.path):
+                tmp_path = path.with_name(path.name + '.tmp')
+                open(tmp_path, 'wb').close()
+                os.replace(tmp_path, path)
+            self._unflushed = []
+            self._sync(recover=True)
@@ -0,0 +1,226 @@
+"""
+Memoizing wrapper around the HuggingFace embeddings model.
+
+The MiniLM forward pass runs on CPU, so repeated and retried queries (and
+unchanged chunks during reindexing) are served from a bounded LRU cache keyed
+on the SHA-256 of the whitespace-normalized text. The cache can optionally be
+saved to an .npz file and reloaded on the next start; each worker merges its
+entries into the file under an fcntl lock when it saves.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.helper import download_hugging_face_embeddings
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # Windows: fall back to in-process locking only
+    FCNTL_AVAILABLE = False
+
+# Persisted key layout; files written with text keys are ignored
+KEY_FORMAT = "sha256"
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different strings share a cache entry."""
+    return " ".join(text.split())
+
+
+class CachedEmbeddings(Embeddings):
+    """LRU-cached embeddings; drop-in replacement for the wrapped model."""
+
+    def __init__(
+        self,
+        base: Embeddings,
+        max_entries: int = 10000,
+        cache_path: Optional[str] = None,
+        model_name: str = ""
+    ):
+        """
+        Args:
+            base: Embeddings model to wrap
+            max_entries: Maximum number of cached vectors
+            cache_path: Optional .npz file for persistence between restarts
+            model_name: Stored with the persisted cache so a model change
+                        does not reuse stale vectors
+        """
+        self.base = base
+        self.max_entries = max_entries
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.model_name = model_name
+
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[bytes, List[float]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+        if self.cache_path and self.cache_path.exists():
+            self._load()
+
+    # Queries and documents are kept apart in case the model embeds them differently;
+    # a fixed 32-byte digest keeps long chunks from bloating memory and the .npz
+    def _key(self, kind: str, text: str) -> bytes:
+        return hashlib.sha256(f"{kind}:{normalize_text(text)}".encode("utf-8")).digest()
+
+    def _get(self, key: bytes) -> Optional[List[float]]:
+        vector = self._cache.get(key)
+        if vector is not None:
+            self._cache.move_to_end(key)
+            # Callers may mutate what they get back
+            return list(vector)
+        return None
+
+    def _put(self, key: bytes, vector: List[float]):
+        self._cache[key] = vector
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key("q", text)
+        with self._lock:
+            vector = self._get(key)
+            if vector is not None:
+                self.hits += 1
+                return vector
+            self.misses += 1
+
+        vector = self.base.embed_query(text)
+        with self._lock:
+            self._put(key, list(vector))
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key("d", text) for text in texts]
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vectors[i] = self._get(key)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            # Embed all misses in one batched call
+            computed = self.base.embed_documents([texts[i] for i in missing])
+            with self._lock:
+                for i, vector in zip(missing, computed):
+                    vectors[i] = vector
+                    self._put(keys[i], list(vector))
+
+        return vectors
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit-rate counters and occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._cache),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "persistent": self.cache_path is not None,
+            }
+
+    def persist(self):
+        """
+        Merge the cache into cache_path (no-op without one).
+
+        Entries other processes saved are kept unless this cache has newer
+        ones or the merged cache would exceed max_entries.
+        """
+        if not self.cache_path:
+            return
+        with self._lock:
+            entries = list(self._cache.items())
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with self._file_lock():
+                merged: "OrderedDict[bytes, List[float]]" = OrderedDict(self._read_file())
+                for key, vector in entries:
+                    merged[key] = vector
+                    merged.move_to_end(key)
+                while len(merged) > self.max_entries:
+                    merged.popitem(last=False)
+
+                keys = np.frombuffer(b"".join(merged.keys()), dtype=np.uint8).reshape(-1, 32)
+                vectors = np.asarray(list(merged.values()), dtype=np.float32)
+                # Unique temp file per writer, swapped in atomically
+                fd, tmp_name = tempfile.mkstemp(dir=self.cache_path.parent,
+                                                prefix=self.cache_path.name, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        np.savez(f, keys=keys, vectors=vectors,
+                                 model_name=np.asarray(self.model_name),
+                                 key_format=np.asarray(KEY_FORMAT))
+                    os.replace(tmp_name, self.cache_path)
+                except BaseException:
+                    os.unlink(tmp_name)
+                    raise
+        except Exception as e:
+            print(f"Warning: Could not save embedding cache: {e}")
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock against other processes saving the same cache."""
+        if not FCNTL_AVAILABLE:
+            yield
+            return
+        with open(self.cache_path.with_name(self.cache_path.name + ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_file(self) -> List:
+        """(key, vector) pairs persisted for this model, oldest first."""
+        if not self.cache_path.exists():
+            return []
+        with np.load(self.cache_path, allow_pickle=False) as data:
+            if (str(data["model_name"]) != self.model_name
+                    or "key_format" not in data.files or str(data["key_format"]) != KEY_FORMAT):
+                return []
+            return [(key.tobytes(), vector.tolist())
+                    for key, vector in zip(data["keys"], data["vectors"])]
+
+    def _load(self):
+        """Load a cache persisted by persist()."""
+        try:
+            for key, vector in self._read_file():
+                self._put(key, vector)
+        except Exception as e:
+            print(f"Warning: Could not load embedding cache: {e}")
+
+
+def load_cached_embeddings(
+    model_name: str = 'sentence-transformers/all-MiniLM-L6-v2'
+) -> CachedEmbeddings:
+    """
+    Load the HuggingFace embeddings model wrapped in an LRU cache.
+
+    EMBEDDING_CACHE_SIZE sets the number of cached vectors and
+    EMBEDDING_CACHE_PATH enables persistence to an .npz file.
+    """
+    return CachedEmbeddings(
+        download_hugging_face_embeddings(model_name),
+        max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "10000")),
+        cache_path=os.getenv("EMBEDDING_CACHE_PATH") or None,
+        model_name=model_name
+    )
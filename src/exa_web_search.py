@@ -3,20 +3,98 @@ Exa AI Web Search Integration for Medical Chatbot
 
 Uses Exa API to search the web for medical information.
 Only returns results for medical queries.
+
+Results are cached and identical in-flight searches are coalesced (see
+src/web_search_cache.py). EXA_BACKEND=stub swaps Exa for a local stub that
+returns canned results, so the search path can be exercised offline.
+
+Exa calls run on a small dedicated thread pool with a hard timeout
+(EXA_TIMEOUT_SECONDS) behind a circuit breaker: after EXA_BREAKER_FAILURES
+consecutive failed or slow (> EXA_BREAKER_SLOW_SECONDS) calls, web search is
+skipped for EXA_BREAKER_COOLDOWN_SECONDS and answers come from RAG + MCP only.
 """
 
+import hashlib
 import os
-import re
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from types import SimpleNamespace
 from typing import Dict, List, Any, Optional
-from exa_py import Exa
+
+try:
+    from exa_py import Exa
+    EXA_AVAILABLE = True
+except ImportError:
+    EXA_AVAILABLE = False
+
+from src import medical_vocabulary
+from src.circuit_breaker import CircuitBreaker, CircuitOpenError, LatencyHistogram
+from src.web_search_cache import WebSearchCache, load_web_search_cache
+
+
+EXA_TIMEOUT_SECONDS = float(os.getenv("EXA_TIMEOUT_SECONDS", "6"))
+EXA_MAX_CONCURRENCY = int(os.getenv("EXA_MAX_CONCURRENCY", "8"))
+
+
+class StubExa:
+    """Offline stand-in for the Exa client with deterministic results."""
+    
+    def __init__(self, latency: float = 0.0):
+        """
+        Args:
+            latency: Seconds each call sleeps, to mimic network time
+        """
+        self.latency = latency
+        self.calls = 0
+    
+    def search(self, query: str, num_results: int = 5, **kwargs):
+        return self.search_and_contents(query, num_results=num_results, **kwargs)
+    
+    def search_and_contents(self, query: str, num_results: int = 5, text=None, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        max_characters = (text or {}).get("max_characters", 2000) if isinstance(text, dict) else 2000
+        digest = hashlib.sha1(query.encode('utf-8')).hexdigest()[:8]
+        results = [
+            SimpleNamespace(
+                title=f"Stub result {rank} for {query}",
+                url=f"https://stub.example.org/{digest}/{rank}",
+                text=(f"Stub medical content {rank} about {query}. " * 50)[:max_characters]
+            )
+            for rank in range(1, num_results + 1)
+        ]
+        return SimpleNamespace(results=results)
+
 
 class MedicalWebSearcher:
     """Search the web for medical information using Exa AI."""
     
-    def __init__(self):
-        """Initialize Exa client with API key."""
+    def __init__(self, cache: Optional[WebSearchCache] = None):
+        """
+        Initialize Exa client with API key.
+        
+        Args:
+            cache: Result cache (defaults to load_web_search_cache())
+        """
+        self.cache = cache if cache is not None else load_web_search_cache()
+        self.timeout = EXA_TIMEOUT_SECONDS
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("EXA_BREAKER_FAILURES", "5")),
+            slow_call_seconds=float(os.getenv("EXA_BREAKER_SLOW_SECONDS", "4")),
+            reset_timeout=float(os.getenv("EXA_BREAKER_COOLDOWN_SECONDS", "30"))
+        )
+        self.latency = LatencyHistogram()
+        # Calls that hit the timeout keep their thread until Exa answers;
+        # the bounded pool caps how many can pile up
+        self._executor = ThreadPoolExecutor(max_workers=EXA_MAX_CONCURRENCY, thread_name_prefix="exa")
         self.api_key = os.getenv("EXA_API_KEY")
-        if not self.api_key:
+        if os.getenv("EXA_BACKEND", "exa").lower() == "stub":
+            self.exa = StubExa(latency=float(os.getenv("EXA_STUB_LATENCY_SECONDS", "0")))
+        elif not EXA_AVAILABLE:
+            print("⚠️  Warning: exa_py not installed. Web search will be disabled. Install with: pip install exa_py")
+            self.exa = None
+        elif not self.api_key:
             print("⚠️  Warning: EXA_API_KEY not set. Web search will be disabled.")
             self.exa = None
         else:
@@ -36,62 +114,8 @@ class MedicalWebSearcher:
         Returns:
             True if medical query, False otherwise
         """
-        medical_keywords = [
-            # General medical terms
-            "disease", "symptom", "treatment", "medication", "drug",
-            "condition", "illness", "health", "medical", "diagnosis",
-            "doctor", "hospital", "surgery", "pain", "fever",
-            "diabetes", "heart", "cancer", "pneumonia", "virus",
-            "infection", "vaccine", "therapy", "cure", "medicine",
-            "patient", "clinical", "healthcare", "disorder", "syndrome",
-            "hypertension", "asthma", "arthritis", "depression",
-            "anxiety", "nutrition", "vitamin", "supplement", "exercise",
-            "wellness", "epidemic", "pandemic",
-            # Common symptoms and conditions
-            "diarrhea", "diarrhoea", "nausea", "vomiting", "headache",
-            "cough", "sneeze", "rash", "itch", "swelling", "bleeding",
-            "dizziness", "fatigue", "weakness", "numbness", "tingling",
-            "shortness of breath", "chest pain", "abdominal pain",
-            "stomach ache", "back pain", "joint pain", "muscle pain",
-            # Common diseases and conditions
-            "flu", "cold", "allergy", "asthma", "bronchitis",
-            "pneumonia", "tuberculosis", "malaria", "dengue",
-            "hepatitis", "kidney", "liver", "lung", "brain",
-            "stroke", "heart attack", "hypertension", "diabetes",
-            "obesity", "anemia", "osteoporosis", "migraine",
-            "epilepsy", "parkinson", "alzheimer", "dementia",
-            # Body parts and systems
-            "blood", "bone", "muscle", "nerve", "skin", "eye",
-            "ear", "nose", "throat", "teeth", "gum", "tongue",
-            "stomach", "intestine", "colon", "bladder", "kidney",
-            "liver", "pancreas", "thyroid", "adrenal", "pituitary",
-            # Medical procedures and tests
-            "x-ray", "mri", "ct scan", "ultrasound", "biopsy",
-            "surgery", "operation", "procedure", "test", "scan",
-            # Medications and treatments
-            "antibiotic", "antiviral", "antifungal", "antidepressant",
-            "painkiller", "analgesic", "anti-inflammatory", "steroid",
-            "chemotherapy", "radiation", "physiotherapy", "rehabilitation"
-        ]
-        
-        query_lower = query.lower()
-        
-        # Check if any medical keyword is in the query
-        if any(keyword in query_lower for keyword in medical_keywords):
-            return True
-        
-        # Also check for "what is" queries - these are often medical questions
-        # when asking about a specific term
-        if re.search(r'what\s+is\s+(\w+)', query_lower):
-            # If it's asking "what is X", be more permissive
-            # Assume it's medical unless it's clearly not
-            non_medical_words = ["weather", "time", "date", "color", "food",
-                                "restaurant", "movie", "song", "book", "game",
-                                "sport", "team", "player", "city", "country"]
-            if not any(word in query_lower for word in non_medical_words):
-                return True
-        
-        return False
+        # Precompiled matcher shared with the app's query filters
+        return medical_vocabulary.is_medical_query(query)
     
     def search_medical_web(self, query: str, num_results: int = 5) -> Dict[str, Any]:
         """
@@ -118,11 +142,63 @@ class MedicalWebSearcher:
                 "error": "Query does not appear to be medical-related. Only medical queries are supported."
             }
         
+        return self._cached(
+            WebSearchCache.make_key("search", query, num_results=num_results),
+            lambda: self._search_medical_web(query, num_results)
+        )
+    
+    def _call_exa(self, method: str, **kwargs):
+        """
+        Call an Exa client method with a hard timeout behind the circuit breaker.
+        
+        Raises:
+            CircuitOpenError: If web search is in its cool-down window
+            TimeoutError: If Exa did not answer within self.timeout
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("Web search temporarily disabled after repeated failures")
+        
+        started = time.monotonic()
+        future = self._executor.submit(getattr(self.exa, method), **kwargs)
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self.latency.record(time.monotonic() - started, outcome="timeout")
+            self.breaker.record_failure()
+            raise TimeoutError(f"Exa did not respond within {self.timeout:.1f}s")
+        except Exception:
+            self.latency.record(time.monotonic() - started, outcome="error")
+            self.breaker.record_failure()
+            raise
+        
+        latency = time.monotonic() - started
+        self.latency.record(latency, outcome="ok")
+        self.breaker.record_success(latency)
+        return result
+    
+    def stats(self) -> Dict[str, Any]:
+        """Circuit breaker state and Exa call latency histogram."""
+        return {
+            "backend": type(self.exa).__name__ if self.exa else None,
+            "timeout_seconds": self.timeout,
+            "breaker": self.breaker.stats(),
+            "latency": self.latency.stats(),
+        }
+    
+    def _cached(self, key: str, search) -> Dict[str, Any]:
+        """Serve a search from the cache; only successful responses are cached."""
+        if self.cache is None:
+            return search()
+        return self.cache.get_or_compute(key, search, cacheable=lambda result: result.get("success", False))
+    
+    def _search_medical_web(self, query: str, num_results: int) -> Dict[str, Any]:
         try:
             # Search the web for medical information
             search_query = f"{query} medical health information"
             
-            results = self.exa.search(
+            results = self._call_exa(
+                "search",
                 query=search_query,
                 num_results=num_results,
                 type="neural",  # Use neural search for better semantic understanding
@@ -154,6 +230,12 @@ class MedicalWebSearcher:
                 "results": formatted_results
             }
             
+        except (CircuitOpenError, TimeoutError) as e:
+            return {
+                "success": False,
+                "skipped": isinstance(e, CircuitOpenError),
+                "error": f"Web search unavailable: {str(e)}"
+            }
         except Exception as e:
             return {
                 "success": False,
@@ -171,13 +253,15 @@ class MedicalWebSearcher:
         except:
             return url
     
-    def search_with_content(self, query: str, num_results: int = 3) -> Dict[str, Any]:
+    def search_with_content(self, query: str, num_results: int = 3,
+                            max_characters: int = 2000) -> Dict[str, Any]:
         """
         Search and get detailed content from web results.
         
         Args:
             query: Medical search query
             num_results: Number of results with content
+            max_characters: Page text fetched per result
             
         Returns:
             Dictionary with results and content
@@ -196,6 +280,14 @@ class MedicalWebSearcher:
                 "error": "Only medical queries are supported."
             }
         
+        return self._cached(
+            WebSearchCache.make_key("contents", query, num_results=num_results,
+                                    max_characters=max_characters),
+            lambda: self._search_with_content(query, num_results, max_characters)
+        )
+    
+    def _search_with_content(self, query: str, num_results: int,
+                             max_characters: int) -> Dict[str, Any]:
         try:
             # Search with content for medical information
             search_query = f"{query} medical health information"
@@ -203,11 +295,12 @@ class MedicalWebSearcher:
             print(f"🔍 Exa: Searching for '{search_query}' with {num_results} results")
             
             # Use search_and_contents to get both results and content
-            results = self.exa.search_and_contents(
+            results = self._call_exa(
+                "search_and_contents",
                 query=search_query,
                 num_results=num_results,
                 type="neural",
-                text={"max_characters": 2000},  # Get more content
+                text={"max_characters": max_characters},
             )
             
             print(f"🔍 Exa: Got response, checking results...")
@@ -231,7 +324,7 @@ class MedicalWebSearcher:
                     "rank": idx,
                     "title": result.title,
                     "url": result.url,
-                    "content": content[:1500] if content else "",  # More content for better answers
+                    "content": content[:min(max_characters, 1500)] if content else "",
                     "source": self._extract_domain(result.url)
                 })
             
@@ -243,6 +336,14 @@ class MedicalWebSearcher:
                 "results": formatted_results
             }
             
+        except (CircuitOpenError, TimeoutError) as e:
+            # Expected while Exa is degraded; answer from RAG + MCP only
+            print(f"⚠️  Exa skipped: {str(e)}")
+            return {
+                "success": False,
+                "skipped": isinstance(e, CircuitOpenError),
+                "error": f"Web search unavailable: {str(e)}"
+            }
         except Exception as e:
             print(f"❌ Exa Error: {str(e)}")
             import traceback
@@ -1,101 +1,508 @@
-from langchain_community.document_loaders import PyPDFLoader, DirectoryLoader, JSONLoader, CSVLoader
+from langchain_community.document_loaders import JSONLoader, CSVLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.documents import Document
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import hashlib
 import json
+import multiprocessing
+import re
 import csv
 from pathlib import Path
 import os
 
 
-## Extract Data from pdf file
-def load_pdf_file(data):
-    loader = DirectoryLoader(data,
-                             glob="*.pdf",
-                             loader_cls=PyPDFLoader) 
+PDF_CACHE_DIR = Path("Data/.pdf_cache")
+# source path -> digest of the cache entry last written for it
+PDF_CACHE_SOURCES = PDF_CACHE_DIR / "sources.json"
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "25"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+
+
+## Hash a file's contents (used for extraction caches and index manifests)
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _pdf_page_count(file_path) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(str(file_path)).pages)
+
+def _extract_pdf_pages(file_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Worker: extract the text of pages [start, end) of one PDF."""
+    from pypdf import PdfReader
+    reader = PdfReader(file_path)
+    return [(page, reader.pages[page].extract_text() or "") for page in range(start, end)]
+
+def _read_pdf_cache(digest: str) -> Optional[dict]:
+    cache_file = PDF_CACHE_DIR / f"{digest}.json"
+    if not cache_file.exists():
+        return None
+    try:
+        with open(cache_file, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Warning: Ignoring unreadable PDF cache {cache_file}: {e}")
+        return None
+
+def _write_pdf_cache(digest: str, total_pages: int, pages: dict):
+    """Merge extracted pages into the file's cache entry (partial entries are fine)."""
+    try:
+        PDF_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        cache_file = PDF_CACHE_DIR / f"{digest}.json"
+        cached = _read_pdf_cache(digest)
+        if cached is not None:
+            pages = {**cached.get("pages", {}), **pages}
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump({"total_pages": total_pages, "pages": pages}, f)
+        os.replace(tmp_file, cache_file)
+    except Exception as e:
+        print(f"Warning: Could not write PDF cache: {e}")
+
+def _record_pdf_cache_source(source: str, digest: str):
+    """
+    Point a PDF's source path at its current cache entry, deleting the entries
+    of its earlier versions and of PDFs that no longer exist.
+    """
+    try:
+        try:
+            with open(PDF_CACHE_SOURCES, 'r') as f:
+                sources = json.load(f)
+        except (OSError, ValueError):
+            sources = {}
+        source = os.path.abspath(source)
+        if sources.get(source) == digest:
+            return
+        sources[source] = digest
+        for path in [path for path in sources if not os.path.exists(path)]:
+            del sources[path]
+        live = set(sources.values())
+        for cache_file in PDF_CACHE_DIR.glob("*.json"):
+            if cache_file != PDF_CACHE_SOURCES and cache_file.stem not in live:
+                cache_file.unlink(missing_ok=True)
+        tmp_file = PDF_CACHE_SOURCES.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump(sources, f)
+        os.replace(tmp_file, PDF_CACHE_SOURCES)
+    except Exception as e:
+        print(f"Warning: Could not prune PDF cache: {e}")
+
+def _pdf_page_document(source: str, page: int, total_pages: int, text: str) -> Document:
+    return Document(
+        page_content=text,
+        metadata={"source": source, "page": page, "total_pages": total_pages}
+    )
+
+def _page_runs(pages: List[int], max_length: int) -> Iterator[Tuple[int, int]]:
+    """Group sorted page numbers into [start, end) runs of at most max_length pages."""
+    start = prev = None
+    for page in pages:
+        if start is not None and page == prev + 1 and page - start < max_length:
+            prev = page
+            continue
+        if start is not None:
+            yield start, prev + 1
+        start = prev = page
+    if start is not None:
+        yield start, prev + 1
+
+## Extract Data from pdf files in parallel, streaming pages as they finish
+def iter_pdf_documents(
+    data,
+    workers: Optional[int] = None,
+    use_cache: bool = True,
+    page_range: Optional[Tuple[int, int]] = None
+) -> Iterator[Document]:
+    """
+    Yield one Document per PDF page.
+    
+    Files (and page ranges of large files, PDF_PAGES_PER_TASK pages each) are
+    parsed in a process pool and pages are yielded as soon as their range is
+    done. Extracted text is cached per page under the file hash in
+    Data/.pdf_cache, so no page of an unchanged PDF is ever parsed twice.
+    
+    Args:
+        data: A directory of PDFs or a single PDF file
+        workers: Worker processes (PDF_WORKERS; 1 parses in-process)
+        use_cache: Read and write the per-file extraction cache
+        page_range: Optional 0-based [start, end) page selection per file
+    """
+    data_path = Path(data)
+    pdf_files = [data_path] if data_path.is_file() else sorted(data_path.glob("*.pdf"))
+    workers = workers or PDF_WORKERS
+    
+    # Serve cached pages immediately and plan page-range tasks for the rest
+    tasks = []
+    pending = {}  # source -> [digest, total_pages, pages extracted so far, pages still missing]
+    for pdf_file in pdf_files:
+        source = str(pdf_file)
+        digest = file_sha256(pdf_file) if use_cache else None
+        cached = (_read_pdf_cache(digest) if use_cache else None) or {}
+        cached_pages = cached.get("pages", {})
+        
+        try:
+            total_pages = cached.get("total_pages") or _pdf_page_count(pdf_file)
+        except Exception as e:
+            print(f"Error loading {pdf_file}: {e}")
+            continue
+        
+        start, end = page_range or (0, total_pages)
+        wanted = range(max(start, 0), min(end, total_pages))
+        missing = []
+        for page in wanted:
+            if str(page) in cached_pages:
+                yield _pdf_page_document(source, page, total_pages, cached_pages[str(page)])
+            else:
+                missing.append(page)
+        if not missing:
+            continue
+        
+        pending[source] = [digest, total_pages, {}, len(missing)]
+        for run_start, run_end in _page_runs(missing, PDF_PAGES_PER_TASK):
+            tasks.append((source, run_start, run_end))
+    
+    if not tasks:
+        return
+    
+    def finish(source, pages):
+        entry = pending[source]
+        digest, total_pages, extracted = entry[0], entry[1], entry[2]
+        extracted.update({str(page): text for page, text in pages})
+        entry[3] -= len(pages)
+        if use_cache and entry[3] == 0:
+            _write_pdf_cache(digest, total_pages, extracted)
+            _record_pdf_cache_source(source, digest)
+        return [_pdf_page_document(source, page, total_pages, text) for page, text in pages]
+    
+    if workers <= 1 or len(tasks) == 1:
+        for source, start, end in tasks:
+            try:
+                pages = _extract_pdf_pages(source, start, end)
+            except Exception as e:
+                print(f"Error loading pages {start}-{end} of {source}: {e}")
+                continue
+            yield from finish(source, pages)
+        return
+    
+    # Spawned, not forked: callers include the threaded Flask app, and a fork
+    # would copy locks held by its other threads into the workers
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {executor.submit(_extract_pdf_pages, *task): task for task in tasks}
+        for future in as_completed(futures):
+            source, start, end = futures[future]
+            try:
+                pages = future.result()
+            except Exception as e:
+                print(f"Error loading pages {start}-{end} of {source}: {e}")
+                continue
+            yield from finish(source, pages)
 
-    documents=loader.load()
- 
+## Extract Data from pdf file
+def load_pdf_file(data, workers: Optional[int] = None):
+    """
+    Load PDF pages from a directory (or a single PDF) in parallel.
+    
+    Returns:
+        List of page Documents ordered by file and page number
+    """
+    documents = list(iter_pdf_documents(data, workers=workers))
+    documents.sort(key=lambda doc: (doc.metadata['source'], doc.metadata['page']))
     return documents
 
+## Stream top-level records out of a JSON array, JSONL or single-object file
+def iter_json_records(file_path, chunk_size: int = 1 << 16) -> Iterator[Tuple[Optional[int], Any]]:
+    """
+    Yield (index, record) pairs without loading the whole file.
+    
+    A top-level array yields its items; a JSON Lines file (or any sequence of
+    concatenated values) yields each value; a file holding a single non-array
+    value yields it once with index None. Memory stays bounded by the largest
+    single record plus one read buffer.
+    
+    A record that does not fit in the buffer is retried only after the
+    buffered part of it has doubled, so large records cost linear time.
+    Arrays with missing or trailing commas are rejected.
+    """
+    decoder = json.JSONDecoder()
+    whitespace = " \t\r\n"
+    
+    with open(file_path, 'r', encoding='utf-8') as f:
+        buf = ""
+        pos = 0
+        eof = False
+        
+        def fill(size: int = chunk_size):
+            """Drop consumed text and read the next block; False at EOF."""
+            nonlocal buf, pos, eof
+            if eof:
+                return False
+            block = f.read(size)
+            if not block:
+                eof = True
+                return False
+            buf = buf[pos:] + block
+            pos = 0
+            return True
+        
+        def peek():
+            """Next non-whitespace character ('' at EOF)."""
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in whitespace:
+                    pos += 1
+                if pos < len(buf) or not fill():
+                    return buf[pos] if pos < len(buf) else ""
+        
+        def decode():
+            """Decode the value at pos, reading more text until it is complete."""
+            nonlocal pos
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                    # Numbers are the only values that are not self-delimiting:
+                    # "12" or "1.5" may continue in the next block
+                    is_number = isinstance(value, (int, float)) and not isinstance(value, bool)
+                    if eof or not is_number or (end < len(buf) and buf[end] in whitespace + ",]"):
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                # Incomplete: at least double the buffered part of the value
+                # before retrying, so retries cost O(record size) in total
+                if not fill(max(chunk_size, len(buf) - pos)):
+                    value, pos = decoder.raw_decode(buf, pos)
+                    return value
+        
+        if peek() == "[":
+            pos += 1
+            if peek() == "]":
+                return
+            index = 0
+            while True:
+                if peek() == "":
+                    raise ValueError(f"Unterminated JSON array in {file_path}")
+                yield index, decode()
+                index += 1
+                char = peek()
+                if char == "]":
+                    return
+                if char == "":
+                    raise ValueError(f"Unterminated JSON array in {file_path}")
+                if char != ",":
+                    raise ValueError(f"Expected ',' or ']' after item {index - 1} in {file_path}")
+                pos += 1
+                if peek() == "]":
+                    raise ValueError(f"Trailing comma in JSON array in {file_path}")
+        else:
+            if peek() == "":
+                return
+            first = decode()
+            if peek() == "":
+                yield None, first
+                return
+            yield 0, first
+            index = 1
+            while peek() != "":
+                yield index, decode()
+                index += 1
+
+def parse_field_spec(jq_schema: str) -> Optional[Dict[str, List[str]]]:
+    """
+    Translate simple jq field selections into {output_name: key_path}.
+    
+    Supports ".[] | {question: .question, answer: .answer}", ".[].answer" and
+    ".[] | .answer" (nested paths like .info.name included). Returns None for
+    anything more complex, which is left to the jq-based JSONLoader.
+    """
+    spec = jq_schema.strip()
+    for prefix in (".[] |", ".[]|"):
+        if spec.startswith(prefix):
+            spec = spec[len(prefix):].strip()
+            break
+    else:
+        if spec.startswith(".[]."):
+            spec = spec[3:]
+        else:
+            return None
+    
+    path_pattern = r"\.[A-Za-z_][\w]*(?:\.[A-Za-z_][\w]*)*"
+    if re.fullmatch(path_pattern, spec):
+        return {spec.split(".")[-1]: spec[1:].split(".")}
+    
+    match = re.fullmatch(r"\{(.*)\}", spec)
+    if not match:
+        return None
+    fields = {}
+    for part in match.group(1).split(","):
+        field = re.fullmatch(rf"\s*([A-Za-z_]\w*)\s*(?::\s*({path_pattern}))?\s*", part)
+        if not field:
+            return None
+        name, path = field.group(1), field.group(2) or f".{field.group(1)}"
+        fields[name] = path[1:].split(".")
+    return fields
+
+def _select_fields(record: Any, fields: Dict[str, List[str]]) -> Any:
+    """Project a record onto the selected fields, skipping missing ones."""
+    if not isinstance(record, dict):
+        return record
+    selected = {}
+    for name, path in fields.items():
+        value = record
+        for key in path:
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            selected[name] = value
+    return selected
+
+def render_record(record: Any) -> str:
+    """Compact text for a JSON record: 'key: value' lines for objects."""
+    if isinstance(record, dict):
+        lines = []
+        for key, value in record.items():
+            if not isinstance(value, (dict, list)):
+                lines.append(f"{key}: {value}")
+            else:
+                lines.append(f"{key}: {json.dumps(value, separators=(',', ':'), ensure_ascii=False)}")
+        return "\n".join(lines)
+    if isinstance(record, str):
+        return record
+    return json.dumps(record, separators=(',', ':'), ensure_ascii=False)
+
+## Extract Data from JSON file (semi-structured), one Document at a time
+def iter_json_file(file_path, jq_schema=None, fields=None) -> Iterator[Document]:
+    """
+    Lazily load semi-structured JSON data.
+    
+    Records are streamed from disk (JSON array, JSON Lines or a single
+    object) and rendered as compact text, so multi-GB exports never have to
+    fit in memory.
+    
+    Args:
+        file_path: Path to JSON / JSONL file
+        jq_schema: Optional jq schema for extracting specific fields
+                   Example: ".[] | {question: .question, answer: .answer}"
+                   Simple selections like this are applied while streaming;
+                   anything else falls back to the jq-based JSONLoader.
+        fields: Optional list of (dotted) field names to keep per record
+    """
+    selection = None
+    if fields:
+        selection = {field.split(".")[-1]: field.split(".") for field in fields}
+    elif jq_schema:
+        selection = parse_field_spec(jq_schema)
+        if selection is None:
+            loader = JSONLoader(file_path=file_path, jq_schema=jq_schema)
+            yield from loader.lazy_load()
+            return
+    
+    for idx, record in iter_json_records(file_path):
+        if selection:
+            record = _select_fields(record, selection)
+        metadata = {"source": file_path, "type": "json"}
+        if idx is not None:
+            metadata["index"] = idx
+        yield Document(page_content=render_record(record), metadata=metadata)
+
 ## Extract Data from JSON file (semi-structured)
-def load_json_file(file_path, jq_schema=None):
+def load_json_file(file_path, jq_schema=None, fields=None):
     """
     Load semi-structured JSON data.
     
     Args:
-        file_path: Path to JSON file
+        file_path: Path to JSON / JSONL file
         jq_schema: Optional jq schema for extracting specific fields
                    Example: ".[] | {question: .question, answer: .answer}"
+        fields: Optional list of (dotted) field names to keep per record
     """
-    if jq_schema:
-        loader = JSONLoader(file_path=file_path, jq_schema=jq_schema)
-        documents = loader.load()
-    else:
-        # Fallback: load entire JSON and convert to text
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        
-        documents = []
-        if isinstance(data, list):
-            for idx, item in enumerate(data):
-                text = json.dumps(item, indent=2)
-                metadata = {
-                    "source": file_path,
-                    "type": "json",
-                    "index": idx
-                }
-                documents.append(Document(page_content=text, metadata=metadata))
-        else:
-            text = json.dumps(data, indent=2)
-            metadata = {"source": file_path, "type": "json"}
-            documents.append(Document(page_content=text, metadata=metadata))
-    
-    return documents
+    return list(iter_json_file(file_path, jq_schema=jq_schema, fields=fields))
 
-## Extract Data from CSV file (semi-structured)
-def load_csv_file(file_path, source_column=None):
+## Extract Data from CSV file (semi-structured), one row at a time
+def iter_csv_file(file_path, source_column=None) -> Iterator[Document]:
     """
-    Load semi-structured CSV data.
+    Lazily load semi-structured CSV data.
     
     Args:
         file_path: Path to CSV file
         source_column: Optional column name to use as source text
     """
     loader = CSVLoader(file_path=file_path, source_column=source_column)
-    documents = loader.load()
     
     # Add metadata to identify CSV source
-    for doc in documents:
+    for doc in loader.lazy_load():
         if 'source' not in doc.metadata:
             doc.metadata['source'] = file_path
         doc.metadata['type'] = 'csv'
+        yield doc
+
+## Extract Data from CSV file (semi-structured)
+def load_csv_file(file_path, source_column=None):
+    """
+    Load semi-structured CSV data.
     
-    return documents
+    Args:
+        file_path: Path to CSV file
+        source_column: Optional column name to use as source text
+    """
+    return list(iter_csv_file(file_path, source_column=source_column))
 
-## Load all supported file types from directory
-def load_mixed_data(data_dir):
+## Lazily load a single PDF, JSON or CSV file
+def iter_file(file_path) -> Iterator[Document]:
     """
-    Load documents from directory supporting multiple formats:
+    Yield the Documents of one supported file, dispatching on its extension.
+    
+    Args:
+        file_path: Path to a .pdf, .json or .csv file
+    """
+    suffix = Path(file_path).suffix.lower()
+    if suffix == '.pdf':
+        return iter_pdf_documents(str(file_path))
+    elif suffix in ('.json', '.jsonl'):
+        return iter_json_file(str(file_path))
+    elif suffix == '.csv':
+        return iter_csv_file(str(file_path))
+    raise ValueError(f"Unsupported file type: {file_path}")
+
+## Load a single PDF, JSON or CSV file
+def load_file(file_path):
+    """
+    Load one supported file, dispatching on its extension.
+    
+    Args:
+        file_path: Path to a .pdf, .json or .csv file
+    """
+    if Path(file_path).suffix.lower() == '.pdf':
+        return load_pdf_file(str(file_path))
+    return list(iter_file(file_path))
+
+## Lazily load all supported file types from directory
+def iter_mixed_data(data_dir) -> Iterator[Document]:
+    """
+    Yield documents from a directory supporting multiple formats:
     - PDF files
     - JSON files
     - CSV files
     """
     data_path = Path(data_dir)
-    all_documents = []
     
     # Load PDFs
     pdf_files = list(data_path.glob("*.pdf"))
     if pdf_files:
-        pdf_docs = load_pdf_file(data_dir)
-        all_documents.extend(pdf_docs)
+        yield from iter_pdf_documents(data_dir)
     
-    # Load JSONs
-    json_files = list(data_path.glob("*.json"))
+    # Load JSONs (arrays, single objects and JSON Lines)
+    json_files = list(data_path.glob("*.json")) + list(data_path.glob("*.jsonl"))
     for json_file in json_files:
         try:
-            json_docs = load_json_file(str(json_file))
-            all_documents.extend(json_docs)
+            yield from iter_json_file(str(json_file))
         except Exception as e:
             print(f"Error loading {json_file}: {e}")
     
@@ -103,26 +510,36 @@ def load_mixed_data(data_dir):
     csv_files = list(data_path.glob("*.csv"))
     for csv_file in csv_files:
         try:
-            csv_docs = load_csv_file(str(csv_file))
-            all_documents.extend(csv_docs)
+            yield from iter_csv_file(str(csv_file))
         except Exception as e:
             print(f"Error loading {csv_file}: {e}")
-    
-    return all_documents
- 
+
+## Load all supported file types from directory
+def load_mixed_data(data_dir):
+    """
+    Load documents from directory supporting multiple formats:
+    - PDF files
+    - JSON files
+    - CSV files
+    """
+    return list(iter_mixed_data(data_dir))
+
+## Split data into Text Chunks, one document at a time
+def iter_text_split(documents) -> Iterator[Document]:
+    """Lazily split an iterable of documents into chunks."""
+    text_splitter=RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=20)
+    for document in documents:
+        for chunk in text_splitter.split_documents([document]):
+            # Ensure all chunks have source metadata
+            if 'source' not in chunk.metadata:
+                chunk.metadata['source'] = 'unknown'
+            if 'type' not in chunk.metadata:
+                chunk.metadata['type'] = 'text'
+            yield chunk
+
 ## Split data into Text Chunks
 def text_split(all_extract_data):
-    text_splitter=RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=20)
-    text_chunks=text_splitter.split_documents(all_extract_data)
-    
-    # Ensure all chunks have source metadata
-    for chunk in text_chunks:
-        if 'source' not in chunk.metadata:
-            chunk.metadata['source'] = 'unknown'
-        if 'type' not in chunk.metadata:
-            chunk.metadata['type'] = 'text'
-    
-    return text_chunks
+    return list(iter_text_split(all_extract_data))
 
 ## download hugging face embeddings
 def download_hugging_face_embeddings(model_name='sentence-transformers/all-MiniLM-L6-v2'):
@@ -0,0 +1,397 @@
+"""
+Incremental, content-hashed indexing of the Data/ directory.
+
+A local manifest records the SHA-256 of every indexed file and the ids of the
+chunks it produced. Chunk ids are derived from the chunk's source and text, so
+re-running the indexer is idempotent: unchanged files are skipped, changed
+files only embed and upsert the chunks that are new, and vectors for chunks
+(or whole files) that disappeared are deleted. Reindex time scales with the
+diff instead of the corpus.
+
+There is one manifest per backend, index and namespace, and each manifest
+records which of them it describes. After switching VECTOR_BACKEND (or
+pointing at another index) the new target is therefore indexed in full
+instead of every file counting as unchanged.
+"""
+
+import hashlib
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from src.helper import file_sha256, iter_file, iter_text_split
+
+
+SUPPORTED_SUFFIXES = ('.pdf', '.json', '.jsonl', '.csv')
+MANIFEST_DIR = Path("Data")
+
+# Pipeline sizing (override via environment)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", str(32 * (os.cpu_count() or 1))))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
+UPSERT_WORKERS = int(os.getenv("UPSERT_WORKERS", "4"))
+UPSERT_MAX_RETRIES = int(os.getenv("UPSERT_MAX_RETRIES", "5"))
+DELETE_BATCH_SIZE = 1000
+
+
+def chunk_id(chunk: Document) -> str:
+    """Deterministic vector id for a chunk: hash of its source and text."""
+    source = chunk.metadata.get('source', 'unknown')
+    return hashlib.sha256(f"{source}\0{chunk.page_content}".encode('utf-8')).hexdigest()[:32]
+
+
+def clean_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only metadata values Pinecone accepts (scalars and string lists)."""
+    cleaned = {}
+    for key, value in metadata.items():
+        if isinstance(value, (str, int, float, bool)):
+            cleaned[key] = value
+        elif isinstance(value, list) and all(isinstance(v, str) for v in value):
+            cleaned[key] = value
+        elif value is not None:
+            cleaned[key] = str(value)
+    return cleaned
+
+
+def list_data_files(data_dir) -> List[Path]:
+    """Supported files directly under data_dir, skipping hidden bookkeeping files."""
+    return sorted(
+        path for path in Path(data_dir).iterdir()
+        if path.is_file()
+        and path.suffix.lower() in SUPPORTED_SUFFIXES
+        and not path.name.startswith('.')
+    )
+
+
+def index_target(index, index_name: str, namespace: str) -> Dict[str, str]:
+    """Backend, index and namespace a manifest describes."""
+    # Imported here: vector_store is only needed to tell the backends apart
+    from src.vector_store import LocalVectorStore
+    if isinstance(index, LocalVectorStore):
+        return {'backend': 'local', 'index': str(index.directory.resolve()), 'namespace': namespace}
+    return {'backend': 'pinecone', 'index': index_name, 'namespace': namespace}
+
+
+def manifest_path(target: Dict[str, str]) -> Path:
+    """Manifest file for a target, e.g. Data/.index_manifest.pinecone.medicalbot.default.json."""
+    def safe(value: str) -> str:
+        return re.sub(r'[^A-Za-z0-9_-]+', '_', value).strip('_')
+    index = Path(target['index']).name if target['backend'] == 'local' else target['index']
+    return MANIFEST_DIR / f".index_manifest.{target['backend']}.{safe(index)}.{safe(target['namespace'])}.json"
+
+
+class IndexManifest:
+    """File and chunk hashes of everything currently in one vector index namespace."""
+
+    def __init__(self, path: Path, target: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            path: Manifest file
+            target: Backend/index/namespace the manifest describes; a stored
+                    manifest for a different target is ignored
+        """
+        self.path = Path(path)
+        self.target = target
+        self.files: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if target is not None and data.get('target') != target:
+                print(f"Manifest {self.path} describes {data.get('target')}, not {target}; "
+                      f"indexing everything")
+            else:
+                self.files = data.get('files', {})
+
+    @classmethod
+    def for_index(cls, index, index_name: str = 'medicalbot',
+                  namespace: str = 'default') -> "IndexManifest":
+        target = index_target(index, index_name, namespace)
+        return cls(manifest_path(target), target)
+
+    def save(self):
+        """Write the manifest atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': 2, 'target': self.target, 'files': self.files}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        self.files = {}
+
+
+def with_retry(operation: Callable[[], Any], max_retries: int = UPSERT_MAX_RETRIES,
+               base_delay: float = 0.5, description: str = "request"):
+    """Call operation, retrying with exponential backoff and jitter."""
+    for attempt in range(max_retries + 1):
+        try:
+            return operation()
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = base_delay * (2 ** attempt) * (0.5 + random.random())
+            print(f"Warning: {description} failed ({e}); retrying in {delay:.1f}s "
+                  f"[{attempt + 1}/{max_retries}]")
+            time.sleep(delay)
+
+
+class IndexingPipeline:
+    """
+    Embed and upsert chunks in explicit stages.
+
+    The calling thread embeds chunks in large batches (EMBED_BATCH_SIZE, sized
+    to the CPU count) and feeds fixed-size upsert batches into a bounded queue.
+    UPSERT_WORKERS threads drain the queue concurrently, retrying failed
+    upserts with backoff. Progress and throughput are printed periodically.
+
+    Usage:
+        with IndexingPipeline(index, embeddings) as pipeline:
+            pipeline.process([(chunk_id, chunk), ...])
+    """
+
+    def __init__(
+        self,
+        index,
+        embeddings,
+        namespace: str = 'default',
+        embed_batch_size: int = EMBED_BATCH_SIZE,
+        upsert_batch_size: int = UPSERT_BATCH_SIZE,
+        upsert_workers: int = UPSERT_WORKERS,
+        max_retries: int = UPSERT_MAX_RETRIES,
+        queue_size: int = 16,
+        progress_interval: float = 5.0,
+        progress: Optional[Callable[[int, int], None]] = None
+    ):
+        self.index = index
+        self.embeddings = embeddings
+        self.namespace = namespace
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.upsert_batch_size = max(1, upsert_batch_size)
+        self.upsert_workers = max(1, upsert_workers)
+        self.max_retries = max_retries
+        self.progress_interval = progress_interval
+        self.progress = progress  # called with (embedded, upserted) counts
+
+        # Bounded so embedding cannot run arbitrarily far ahead of uploads
+        self._queue: "queue.Queue[Optional[List[Dict[str, Any]]]]" = queue.Queue(maxsize=queue_size)
+        self._workers: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._errors: List[Exception] = []
+
+        self.embedded = 0
+        self.upserted = 0
+        self._started_at = None
+        self._last_report = 0.0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self):
+        """Start the upsert worker threads."""
+        self._started_at = time.monotonic()
+        for i in range(self.upsert_workers):
+            worker = threading.Thread(target=self._upsert_worker, name=f"upsert-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def close(self):
+        """Stop the workers after the queue drains and print final throughput."""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+        self._report(final=True)
+
+    def process(self, items: Iterable[Tuple[str, Document]]):
+        """
+        Embed and upsert (id, chunk) pairs; returns once all are stored.
+
+        Raises:
+            RuntimeError: If any upsert batch still failed after retries
+        """
+        batch: List[Tuple[str, Document]] = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= self.embed_batch_size:
+                self._embed_and_enqueue(batch)
+                batch = []
+        if batch:
+            self._embed_and_enqueue(batch)
+
+        self._queue.join()
+        with self._lock:
+            errors, self._errors = self._errors, []
+        if errors:
+            raise RuntimeError(f"{len(errors)} upsert batch(es) failed: {errors[0]}")
+
+    def _embed_and_enqueue(self, batch: List[Tuple[str, Document]]):
+        vectors = self.embeddings.embed_documents([chunk.page_content for _, chunk in batch])
+        records = [
+            {
+                "id": vector_id,
+                "values": vector,
+                "metadata": clean_metadata({**chunk.metadata, "text": chunk.page_content}),
+            }
+            for (vector_id, chunk), vector in zip(batch, vectors)
+        ]
+        with self._lock:
+            self.embedded += len(records)
+        for start in range(0, len(records), self.upsert_batch_size):
+            self._queue.put(records[start:start + self.upsert_batch_size])
+        self._report()
+
+    def _upsert_worker(self):
+        while True:
+            records = self._queue.get()
+            try:
+                if records is None:
+                    return
+                with_retry(
+                    lambda: self.index.upsert(vectors=records, namespace=self.namespace),
+                    max_retries=self.max_retries,
+                    description=f"upsert of {len(records)} vectors"
+                )
+                with self._lock:
+                    self.upserted += len(records)
+                if self.progress:
+                    self.progress(self.embedded, self.upserted)
+            except Exception as e:
+                with self._lock:
+                    self._errors.append(e)
+            finally:
+                self._queue.task_done()
+
+    def _report(self, final: bool = False):
+        now = time.monotonic()
+        if not final and now - self._last_report < self.progress_interval:
+            return
+        self._last_report = now
+        elapsed = max(now - (self._started_at or now), 1e-9)
+        with self._lock:
+            embedded, upserted = self.embedded, self.upserted
+        label = "Indexing done" if final else "Progress"
+        print(f"{label}: {embedded} chunks embedded, {upserted} upserted "
+              f"({upserted / elapsed:.1f} chunks/sec)")
+
+
+def _delete_ids(index, ids: List[str], namespace: str):
+    for start in range(0, len(ids), DELETE_BATCH_SIZE):
+        batch = ids[start:start + DELETE_BATCH_SIZE]
+        with_retry(lambda: index.delete(ids=batch, namespace=namespace),
+                   description=f"delete of {len(batch)} vectors")
+
+
+def build_index(
+    index,
+    embeddings,
+    data_dir: str = 'Data/',
+    namespace: str = 'default',
+    index_name: str = 'medicalbot',
+    manifest: Optional[IndexManifest] = None,
+    rebuild: bool = False,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> Dict[str, int]:
+    """
+    Bring the vector index in line with data_dir.
+
+    Args:
+        index: Pinecone Index or LocalVectorStore
+        embeddings: Embeddings model
+        data_dir: Directory with PDF, JSON and CSV files
+        namespace: Vector namespace
+        index_name: Pinecone index name (part of the manifest key)
+        manifest: Manifest to update (defaults to the one for this index and namespace)
+        rebuild: Delete every vector in the namespace and index from scratch
+        progress: Called with (chunks embedded, chunks upserted) as batches land
+
+    Returns:
+        Counts of scanned/changed/removed files and added/deleted chunks
+    """
+    manifest = manifest or IndexManifest.for_index(index, index_name, namespace)
+    stats = {
+        "files_scanned": 0,
+        "files_changed": 0,
+        "files_removed": 0,
+        "chunks_added": 0,
+        "chunks_deleted": 0,
+    }
+
+    if rebuild:
+        print(f"Deleting all vectors in namespace '{namespace}'...")
+        try:
+            index.delete(delete_all=True, namespace=namespace)
+        except Exception as e:
+            # Pinecone raises if the namespace does not exist yet
+            print(f"Warning: Could not clear namespace '{namespace}': {e}")
+        manifest.clear()
+        manifest.save()
+
+    current_files = list_data_files(data_dir)
+    current_keys = {str(path) for path in current_files}
+
+    # Files that were indexed before but are gone now
+    for key in [key for key in manifest.files if key not in current_keys]:
+        old_ids = manifest.files[key].get('chunk_ids', [])
+        print(f"Removing {len(old_ids)} chunks of deleted file {key}")
+        _delete_ids(index, old_ids, namespace)
+        del manifest.files[key]
+        manifest.save()
+        stats["files_removed"] += 1
+        stats["chunks_deleted"] += len(old_ids)
+
+    with IndexingPipeline(index, embeddings, namespace=namespace, progress=progress) as pipeline:
+        for path in current_files:
+            key = str(path)
+            stats["files_scanned"] += 1
+            digest = file_sha256(path)
+            entry = manifest.files.get(key)
+            if entry and entry.get('sha256') == digest:
+                continue
+
+            old_ids = set(entry.get('chunk_ids', [])) if entry else set()
+            seen_ids: Dict[str, None] = {}  # insertion-ordered set
+            added = []
+
+            def new_chunks():
+                # Stream load → split → id; only chunk ids are kept in memory.
+                # Identical chunks within the file are deduplicated.
+                for chunk in iter_text_split(iter_file(path)):
+                    vector_id = chunk_id(chunk)
+                    if vector_id in seen_ids:
+                        continue
+                    seen_ids[vector_id] = None
+                    if vector_id not in old_ids:
+                        added.append(vector_id)
+                        yield vector_id, chunk
+
+            print(f"Indexing {key}...")
+            try:
+                pipeline.process(new_chunks())
+                removed = sorted(old_ids - seen_ids.keys())
+                _delete_ids(index, removed, namespace)
+            except Exception as e:
+                # Leave the manifest entry untouched so the next run retries this file
+                print(f"Error indexing {path}: {e}")
+                continue
+
+            print(f"Indexed {key}: {len(added)} new chunks, {len(removed)} removed, "
+                  f"{len(seen_ids) - len(added)} unchanged")
+            manifest.files[key] = {'sha256': digest, 'chunk_ids': list(seen_ids)}
+            manifest.save()
+            stats["files_changed"] += 1
+            stats["chunks_added"] += len(added)
+            stats["chunks_deleted"] += len(removed)
+
+    return stats
@@ -0,0 +1,222 @@
+"""
+Background job queue for chat-triggered dataset ingestion.
+
+"ingest dataset X" used to parse the file inside the HTTP request, tying up a
+worker for as long as a large CSV or PDF took. Jobs now run on a small thread
+pool: submit() returns a job id at once and the job's progress (records
+parsed, chunks embedded) can be polled from /ingest/jobs/<id>. A job can
+optionally finish by running the incremental vector-index update that
+otherwise needs a manual `python store_index.py`.
+
+Job records live in a SQLite table (INGEST_JOBS_DB) rather than in the
+process that runs the job, so with several gunicorn workers a status poll can
+land on any of them.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, List, Optional
+
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_JOBS_DB = os.getenv("INGEST_JOBS_DB", "Data/.ingest_jobs.db")
+# Minimum seconds between progress writes of one job
+PROGRESS_SAVE_INTERVAL = 0.5
+
+
+@dataclass
+class IngestionJob:
+    """State of one ingestion job."""
+    job_id: str
+    file_path: str
+    format_type: str
+    update_index: bool
+    status: str = "queued"  # queued, ingesting, indexing, succeeded, failed
+    records_parsed: int = 0
+    chunks_embedded: int = 0
+    chunks_upserted: int = 0
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    index_stats: Optional[Dict[str, int]] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        end = self.finished_at or time.time()
+        data["elapsed_seconds"] = round(end - self.started_at, 3) if self.started_at else 0.0
+        return data
+
+
+class SQLiteJobStore:
+    """Job records shared by every worker process."""
+
+    def __init__(self, db_path: str = INGEST_JOBS_DB):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ingest_jobs ("
+                " job_id TEXT PRIMARY KEY,"
+                " status TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " job TEXT NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers run alongside a writer."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def save(self, job: IngestionJob):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ingest_jobs (job_id, status, created_at, job) VALUES (?, ?, ?, ?)",
+                (job.job_id, job.status, job.created_at, json.dumps(asdict(job)))
+            )
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        row = self._connect().execute(
+            "SELECT job FROM ingest_jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return IngestionJob(**json.loads(row[0])) if row else None
+
+    def list(self) -> List[IngestionJob]:
+        return [IngestionJob(**json.loads(job)) for (job,) in self._connect().execute(
+            "SELECT job FROM ingest_jobs ORDER BY created_at"
+        )]
+
+    def trim(self, max_jobs: int):
+        """Forget the oldest finished jobs beyond max_jobs."""
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM ingest_jobs WHERE job_id IN ("
+                " SELECT job_id FROM ingest_jobs WHERE status IN ('succeeded', 'failed')"
+                " ORDER BY created_at LIMIT MAX(0, (SELECT COUNT(*) FROM ingest_jobs) - ?))",
+                (max_jobs,)
+            )
+
+
+class IngestionJobQueue:
+    """Runs ingestion jobs on a thread pool and tracks their progress."""
+
+    def __init__(
+        self,
+        ingest: Callable[..., Dict[str, Any]],
+        index_updater: Optional[Callable[..., Dict[str, int]]] = None,
+        max_workers: int = INGEST_WORKERS,
+        max_jobs: int = 200,
+        store: Optional[SQLiteJobStore] = None
+    ):
+        """
+        Args:
+            ingest: ingest(file_path, format_type, progress=callback) returning
+                    the MCP client's result dict; callback(records_parsed)
+            index_updater: index_updater(progress=callback) running the
+                           incremental vector-index update;
+                           callback(chunks_embedded, chunks_upserted)
+            max_workers: Concurrent jobs
+            max_jobs: Finished jobs kept for status queries
+            store: Where job records are kept (SQLiteJobStore at INGEST_JOBS_DB by default)
+        """
+        self.ingest = ingest
+        self.index_updater = index_updater
+        self.max_jobs = max_jobs
+        self.store = store or SQLiteJobStore()
+
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="ingest")
+        # One index update at a time: they all diff Data/ against the same manifest
+        self._index_lock = threading.Lock()
+
+    def submit(self, file_path: str, format_type: str = "auto",
+               update_index: bool = False) -> IngestionJob:
+        """Queue a dataset for ingestion and return its job immediately."""
+        job = IngestionJob(
+            job_id=uuid.uuid4().hex[:12],
+            file_path=file_path,
+            format_type=format_type,
+            update_index=update_index and self.index_updater is not None
+        )
+        self.store.save(job)
+        self.store.trim(self.max_jobs)
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self.store.get(job_id)
+
+    def list(self) -> List[IngestionJob]:
+        return self.store.list()
+
+    def _run(self, job: IngestionJob):
+        job.status = "ingesting"
+        job.started_at = time.time()
+        self.store.save(job)
+        last_saved = [time.monotonic()]
+
+        def save_progress():
+            now = time.monotonic()
+            if now - last_saved[0] >= PROGRESS_SAVE_INTERVAL:
+                last_saved[0] = now
+                self.store.save(job)
+
+        try:
+            def on_records(count: int):
+                job.records_parsed = count
+                save_progress()
+
+            result = self.ingest(job.file_path, job.format_type, progress=on_records)
+            job.result = result
+            if not result.get("success"):
+                job.error = result.get("error", "Ingestion failed")
+                job.status = "failed"
+                return
+            job.records_parsed = result.get("metadata", {}).get("record_count", job.records_parsed)
+
+            if job.update_index:
+                job.status = "indexing"
+                self.store.save(job)
+
+                def on_chunks(embedded: int, upserted: int):
+                    job.chunks_embedded = embedded
+                    job.chunks_upserted = upserted
+                    save_progress()
+
+                with self._index_lock:
+                    job.index_stats = self.index_updater(progress=on_chunks)
+
+            job.status = "succeeded"
+        except Exception as e:
+            traceback.print_exc()
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            self.store.save(job)
+
+
+# Global queue instance
+_job_queue = None
+
+def get_ingestion_queue(
+    ingest: Callable[..., Dict[str, Any]],
+    index_updater: Optional[Callable[..., Dict[str, int]]] = None
+) -> IngestionJobQueue:
+    """Get or create the process-wide ingestion job queue."""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = IngestionJobQueue(ingest, index_updater=index_updater)
+    return _job_queue
@@ -0,0 +1,119 @@
+"""
+Process-wide registry of OpenAI chat model clients.
+
+Builds one ChatOpenAI per (model, temperature, max_tokens) configuration and
+shares a single pooled, keep-alive HTTP client between all of them, so the
+Flask handlers, the prompt builders and the evaluation scripts reuse open
+connections to the OpenAI endpoint instead of doing a TLS handshake per
+request.
+
+Environment overrides:
+    OPENAI_MODEL        Chat model name (default: gpt-4o-mini)
+    OPENAI_TEMPERATURE  Sampling temperature (default: 0.4)
+    OPENAI_MAX_TOKENS   Completion token limit for callers that don't pass one
+    OPENAI_MAX_CONNECTIONS / OPENAI_KEEPALIVE_CONNECTIONS / OPENAI_TIMEOUT
+"""
+
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+
+DEFAULT_MODEL = "gpt-4o-mini"
+DEFAULT_TEMPERATURE = 0.4
+DEFAULT_MAX_TOKENS = 1000
+
+
+_lock = threading.Lock()
+_http_client = None
+_http_async_client = None
+_llms: Dict[Tuple[str, float, int], ChatOpenAI] = {}
+
+
+def _connection_limits() -> httpx.Limits:
+    """Connection pool limits shared by the sync and async HTTP clients."""
+    return httpx.Limits(
+        max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "50")),
+        max_keepalive_connections=int(os.getenv("OPENAI_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "120")),
+    )
+
+
+def _request_timeout() -> httpx.Timeout:
+    """Request timeout with a short connect phase."""
+    return httpx.Timeout(float(os.getenv("OPENAI_TIMEOUT", "60")), connect=10.0)
+
+
+def get_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """Get or create the pooled HTTP clients used for all OpenAI calls."""
+    global _http_client, _http_async_client
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(limits=_connection_limits(), timeout=_request_timeout())
+            _http_async_client = httpx.AsyncClient(limits=_connection_limits(), timeout=_request_timeout())
+    return _http_client, _http_async_client
+
+
+def resolve_llm_config(
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None
+) -> Tuple[str, float, int]:
+    """
+    Resolve the effective model configuration.
+
+    OPENAI_MODEL / OPENAI_TEMPERATURE take precedence over the caller's
+    values, which in turn take precedence over the defaults. max_tokens is
+    sized per caller (answers, chains, evaluation), so OPENAI_MAX_TOKENS only
+    fills in when the caller passes none.
+    """
+    model = os.getenv("OPENAI_MODEL") or model or DEFAULT_MODEL
+
+    env_temperature = os.getenv("OPENAI_TEMPERATURE")
+    if env_temperature:
+        temperature = float(env_temperature)
+    elif temperature is None:
+        temperature = DEFAULT_TEMPERATURE
+
+    if max_tokens is None:
+        max_tokens = int(os.getenv("OPENAI_MAX_TOKENS") or DEFAULT_MAX_TOKENS)
+
+    return model, float(temperature), int(max_tokens)
+
+
+def get_llm(
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None
+) -> ChatOpenAI:
+    """
+    Get the shared ChatOpenAI client for a configuration.
+
+    Args:
+        model: Chat model name
+        temperature: Sampling temperature
+        max_tokens: Maximum completion tokens
+
+    Returns:
+        A ChatOpenAI instance reused across calls with the same configuration
+    """
+    key = resolve_llm_config(model, temperature, max_tokens)
+    llm = _llms.get(key)
+    if llm is not None:
+        return llm
+
+    http_client, http_async_client = get_http_clients()
+    with _lock:
+        if key not in _llms:
+            model, temperature, max_tokens = key
+            _llms[key] = ChatOpenAI(
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                http_client=http_client,
+                http_async_client=http_async_client,
+            )
+        return _llms[key]
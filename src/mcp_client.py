@@ -6,7 +6,7 @@ to ingest third-party datasets during chat interactions.
 """
 
 import json
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, Optional, Tuple
 from pathlib import Path
 
 from src.mcp_server import ingest_third_party_dataset, MCP_AVAILABLE
@@ -19,31 +19,46 @@ class MCPDatasetClient:
         """Initialize MCP client."""
         self.mcp_available = MCP_AVAILABLE
     
-    def ingest_dataset(self, file_path: str, format_type: str = "auto") -> Dict[str, Any]:
+    def resolve_dataset_path(self, file_path: str) -> Optional[Path]:
+        """
+        Resolve a dataset path relative to Data/, the project root, or as given.
+        
+        Returns:
+            The existing file's path, or None if it cannot be found
+        """
+        # Resolve file path - check if it's relative to Data/ or absolute
+        file_path_obj = Path(file_path)
+        
+        # If not absolute, try Data/ directory first
+        if not file_path_obj.is_absolute():
+            project_root = Path(__file__).parent.parent
+            data_path = project_root / "Data" / file_path_obj
+            if data_path.exists():
+                file_path_obj = data_path
+            elif (project_root / file_path_obj).exists():
+                file_path_obj = project_root / file_path_obj
+        
+        return file_path_obj if file_path_obj.exists() else None
+    
+    def ingest_dataset(self, file_path: str, format_type: str = "auto",
+                       page_range: Optional[Tuple[int, int]] = None,
+                       progress: Optional[Callable[[int], None]] = None) -> Dict[str, Any]:
         """
         Ingest a dataset file.
         
         Args:
             file_path: Path to the dataset file (relative to project root or absolute)
             format_type: Format type ('json', 'csv', 'pdf', 'auto')
+            page_range: PDF only; 0-based [start, end) pages to ingest
+            progress: Called with the number of records parsed so far
         
         Returns:
             Dictionary with ingestion results
         """
         try:
-            # Resolve file path - check if it's relative to Data/ or absolute
-            file_path_obj = Path(file_path)
+            file_path_obj = self.resolve_dataset_path(file_path)
             
-            # If not absolute, try Data/ directory first
-            if not file_path_obj.is_absolute():
-                project_root = Path(__file__).parent.parent
-                data_path = project_root / "Data" / file_path_obj
-                if data_path.exists():
-                    file_path_obj = data_path
-                elif (project_root / file_path_obj).exists():
-                    file_path_obj = project_root / file_path_obj
-            
-            if not file_path_obj.exists():
+            if file_path_obj is None:
                 return {
                     "success": False,
                     "error": f"File not found: {file_path}. Please provide a valid file path."
@@ -51,7 +66,8 @@ class MCPDatasetClient:
             
             # Use persistent server instance for ingestion
             server = get_mcp_server_instance()
-            metadata = server.ingest_dataset(str(file_path_obj), format_type)
+            metadata = server.ingest_dataset(str(file_path_obj), format_type, page_range=page_range,
+                                             progress=progress)
             
             return {
                 "success": True,
@@ -62,7 +78,7 @@ class MCPDatasetClient:
                     "record_count": metadata.record_count,
                     "ingestion_date": metadata.ingestion_date
                 },
-                "documents": len(server.documents)
+                "documents": server.document_count()
             }
             
         except FileNotFoundError as e:
@@ -81,6 +97,69 @@ class MCPDatasetClient:
                 "error": f"Error during ingestion: {str(e)}"
             }
     
+    def evict_dataset(self, name_or_path: str) -> Dict[str, Any]:
+        """
+        Remove an ingested dataset and its documents from MCP search.
+        
+        Args:
+            name_or_path: Dataset name, file name or source path
+        
+        Returns:
+            Dictionary with eviction results
+        """
+        try:
+            server = get_mcp_server_instance()
+            if not server.evict_dataset(name_or_path):
+                return {
+                    "success": False,
+                    "error": f"Dataset not found: {name_or_path}"
+                }
+            return {
+                "success": True,
+                "evicted": name_or_path,
+                "documents": server.document_count()
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Error evicting dataset: {str(e)}"
+            }
+    
+    def reingest_dataset(self, name_or_path: str) -> Dict[str, Any]:
+        """
+        Re-parse an ingested dataset from its source file.
+        
+        Args:
+            name_or_path: Dataset name, file name or source path
+        
+        Returns:
+            Dictionary with ingestion results
+        """
+        try:
+            server = get_mcp_server_instance()
+            metadata = server.reingest_dataset(name_or_path)
+            return {
+                "success": True,
+                "metadata": {
+                    "name": metadata.name,
+                    "source_path": metadata.source_path,
+                    "format": metadata.format,
+                    "record_count": metadata.record_count,
+                    "ingestion_date": metadata.ingestion_date
+                },
+                "documents": server.document_count()
+            }
+        except ValueError as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Error during re-ingestion: {str(e)}"
+            }
+    
     def list_datasets(self) -> Dict[str, Any]:
         """
         List all ingested datasets.
@@ -128,11 +207,14 @@ class MCPDatasetClient:
             
             # Format results
             formatted_results = []
-            for doc in results:
+            for doc_id, score in results:
+                doc = server.get_document(doc_id)
+                if doc is None:
+                    continue
                 formatted_results.append({
                     "content": doc.page_content[:500],  # First 500 chars
                     "source": doc.metadata.get('source', 'unknown'),
-                    "relevance": doc.metadata.get('relevance_score', 0)
+                    "relevance": score
                 })
             
             return {
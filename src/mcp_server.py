@@ -6,10 +6,13 @@ medical datasets into the RAG system.
 """
 
 import json
+import os
 import asyncio
-from typing import List, Dict, Any, Optional
+import threading
+from contextlib import contextmanager
+from typing import Callable, List, Dict, Any, Optional, Tuple
 from pathlib import Path
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 from langchain_core.documents import Document
 
 try:
@@ -20,7 +23,22 @@ try:
 except ImportError:
     MCP_AVAILABLE = False
 
-from src.helper import load_json_file, load_csv_file, load_mixed_data
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # Windows: fall back to in-process locking only
+    FCNTL_AVAILABLE = False
+
+from src.helper import file_sha256, iter_json_file, iter_csv_file, load_json_file, load_csv_file, load_mixed_data
+from src.search_index import InvertedIndex, SEARCH_INDEX_PATH
+from src.document_store import DocumentStore, DOCUMENT_STORE_PATH
+from src.metadata_store import MetadataStore, METADATA_PATH, dataset_key
+from src.semantic_cache import bump_index_version
+
+
+# Held exclusively by writers for a whole ingest/evict/clear, shared by
+# readers catching up, so metadata, documents and index move together
+MCP_LOCK_PATH = Path("Data/.mcp.lock")
 
 
 @dataclass
@@ -32,6 +50,9 @@ class DatasetMetadata:
     record_count: int
     ingestion_date: str
     schema: Optional[Dict[str, Any]] = None
+    content_hash: Optional[str] = None  # SHA-256 of the source file
+    doc_ids: Optional[List[int]] = None  # [start, end) range in the document store
+    page_range: Optional[List[int]] = None  # PDF only: 0-based [start, end) pages ingested
 
 
 class MedicalDatasetMCPServer:
@@ -39,72 +60,209 @@ class MedicalDatasetMCPServer:
     
     # Class-level storage for persistence within a process
     _shared_datasets: List[DatasetMetadata] = []
-    _shared_documents: List[Document] = []
+    _shared_documents: DocumentStore = None
+    _shared_index: InvertedIndex = None
+    _metadata_store: MetadataStore = None
+    _metadata_version = None
+    _generation = None  # On-disk state the shared objects reflect
+    # Serializes writers (with MCP_LOCK_PATH across processes); searches
+    # read published snapshots without locking
+    _ingest_lock = threading.Lock()
     
     def __init__(self, data_dir: str = "Data/"):
         self.data_dir = Path(data_dir)
-        self.metadata_file = Path("Data/.mcp_metadata.json")
+        self.metadata_file = METADATA_PATH
+        self.index_file = SEARCH_INDEX_PATH
         
         # Use class-level storage for in-memory persistence
         if not hasattr(self.__class__, '_initialized'):
             self.__class__._initialized = True
             self.__class__._shared_datasets = []
-            self.__class__._shared_documents = []
-            # Load from disk if exists
-            self._load_metadata_from_disk()
+            self.__class__._shared_documents = DocumentStore(DOCUMENT_STORE_PATH)
+            self.__class__._shared_index = InvertedIndex()
+            self.__class__._metadata_store = MetadataStore(self.metadata_file)
+            # Load from disk if exists (a rebuilt index is written back)
+            with self._ingest_lock, self._file_lock(exclusive=True):
+                self._load_metadata_from_disk()
+                self._load_index_from_disk()
+                self.__class__._generation = self._disk_generation()
         
         # Instance references point to class-level storage
         self.ingested_datasets = self.__class__._shared_datasets
         self.documents = self.__class__._shared_documents
+        self.search_index = self.__class__._shared_index
+        self.metadata_store = self.__class__._metadata_store
     
     def _load_metadata_from_disk(self):
-        """Load dataset metadata from disk."""
-        if self.metadata_file.exists():
+        """Load dataset metadata (snapshot + journal) from disk."""
+        store = self.__class__._metadata_store
+        try:
+            datasets = [
+                DatasetMetadata(**{key: item.get(key) for key in DatasetMetadata.__dataclass_fields__})
+                for item in store.load()
+            ]
+            self.__class__._shared_datasets[:] = datasets
+            self.__class__._metadata_version = store.version()
+        except Exception as e:
+            print(f"Warning: Could not load metadata from disk: {e}")
+    
+    @contextmanager
+    def _file_lock(self, exclusive: bool, blocking: bool = True):
+        """Cross-process MCP lock; yields False if non-blocking and busy."""
+        if not FCNTL_AVAILABLE:
+            yield True
+            return
+        MCP_LOCK_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(MCP_LOCK_PATH, 'a') as lock_file:
+            operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+            try:
+                fcntl.flock(lock_file, operation if blocking else operation | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
             try:
-                import json
-                from datetime import datetime
-                with open(self.metadata_file, 'r') as f:
-                    data = json.load(f)
-                    for item in data:
-                        metadata = DatasetMetadata(
-                            name=item['name'],
-                            source_path=item['source_path'],
-                            format=item['format'],
-                            record_count=item['record_count'],
-                            ingestion_date=item['ingestion_date'],
-                            schema=item.get('schema')
-                        )
-                        self.__class__._shared_datasets.append(metadata)
-            except Exception as e:
-                print(f"Warning: Could not load metadata from disk: {e}")
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
     
-    def _save_metadata_to_disk(self):
-        """Save dataset metadata to disk."""
+    @contextmanager
+    def _writer_lock(self):
+        """Exclusive write access, caught up with other processes' writes."""
+        with self._ingest_lock, self._file_lock(exclusive=True):
+            self._refresh_locked()
+            try:
+                yield
+            finally:
+                # Nobody else can write while we hold the lock
+                self.__class__._generation = self._disk_generation()
+    
+    def _disk_generation(self):
+        """Changes whenever any process writes metadata, documents or the index."""
+        documents = self.__class__._shared_documents
+        parts = [self.__class__._metadata_store.version()]
+        for path in (documents.path, documents.index_path, documents.tombstone_path,
+                     self.index_file, InvertedIndex.log_path(self.index_file)):
+            try:
+                stat = os.stat(path)
+                parts.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                parts.append(None)
+        return tuple(parts)
+    
+    def _refresh(self):
+        """
+        Pick up datasets, documents and index changes another process made.
+        
+        Skipped while a writer holds the lock: the last complete generation
+        keeps being served rather than blocking searches for a whole ingest.
+        """
+        if self._disk_generation() == self.__class__._generation:
+            return
+        if not self._ingest_lock.acquire(blocking=False):
+            return
         try:
-            import json
-            self.metadata_file.parent.mkdir(parents=True, exist_ok=True)
-            data = []
-            for metadata in self.__class__._shared_datasets:
-                data.append({
-                    'name': metadata.name,
-                    'source_path': metadata.source_path,
-                    'format': metadata.format,
-                    'record_count': metadata.record_count,
-                    'ingestion_date': metadata.ingestion_date,
-                    'schema': metadata.schema
-                })
-            with open(self.metadata_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            with self._file_lock(exclusive=False, blocking=False) as locked:
+                if locked:
+                    self._refresh_locked()
+        finally:
+            self._ingest_lock.release()
+    
+    def _refresh_locked(self):
+        generation = self._disk_generation()
+        if generation == self.__class__._generation:
+            return
+        # Documents before the index, so no posting references an unknown id
+        self.documents.refresh()
+        self.search_index.refresh(self.index_file)
+        if self.metadata_store.version() != self.__class__._metadata_version:
+            self._load_metadata_from_disk()
+        self.__class__._generation = generation
+    
+    def _record_metadata(self, metadata: DatasetMetadata):
+        """Journal one dataset's metadata (O(1), atomic, safe across processes)."""
+        try:
+            self.metadata_store.put(asdict(metadata))
+            self.__class__._metadata_version = self.metadata_store.version()
         except Exception as e:
             print(f"Warning: Could not save metadata to disk: {e}")
+    
+    def _load_index_from_disk(self):
+        """Load the search index, rebuilding it from the document store if stale."""
+        documents = self.__class__._shared_documents
+        try:
+            if self.index_file.exists():
+                index = InvertedIndex.load(self.index_file)
+                if len(index) == documents.live_count:
+                    self.__class__._shared_index = index
+                    return
+            if documents.live_count:
+                print(f"Rebuilding MCP search index over {documents.live_count} documents...")
+                index = self.__class__._shared_index
+                for doc_id, doc in documents.iter_live():
+                    index.add(doc_id, doc.page_content, doc.metadata.get('source', ''))
+                index.commit()
+                index.save(self.index_file)
+        except Exception as e:
+            print(f"Warning: Could not load search index from disk: {e}")
+    
+    def _save_index_to_disk(self):
+        """Append the latest index changes to its on-disk delta log."""
+        try:
+            self.search_index.persist(self.index_file)
+        except Exception as e:
+            print(f"Warning: Could not save search index to disk: {e}")
+        
+    def _reset_index_on_disk(self):
+        """Replace the on-disk index (snapshot and log) with the in-memory one."""
+        try:
+            self.search_index.save(self.index_file)
+        except Exception as e:
+            print(f"Warning: Could not save search index to disk: {e}")
         
-    def ingest_dataset(self, file_path: str, format_type: Optional[str] = None) -> DatasetMetadata:
+    def _find_dataset(self, name_or_path: str) -> Optional[DatasetMetadata]:
+        """Find an ingested dataset by source path or name (the first PDF range)."""
+        datasets = self._find_datasets(name_or_path)
+        return datasets[0] if datasets else None
+    
+    def _find_datasets(self, name_or_path: str) -> List[DatasetMetadata]:
+        """Every ingested dataset (one per PDF page range) of a source path or name."""
+        matches = [metadata for metadata in self.ingested_datasets
+                   if metadata.source_path == name_or_path]
+        if not matches:
+            matches = [metadata for metadata in self.ingested_datasets
+                       if metadata.name == name_or_path or Path(metadata.source_path).name == name_or_path]
+        return matches
+    
+    def _drop_documents(self, metadata: DatasetMetadata):
+        """Tombstone a dataset's documents and remove them from the search index."""
+        if not metadata.doc_ids:
+            return
+        start, end = metadata.doc_ids
+        doc_ids = [doc_id for doc_id in range(start, end) if not self.documents.is_deleted(doc_id)]
+        for doc_id in doc_ids:
+            self.search_index.remove(doc_id, self.documents[doc_id].page_content)
+        self.search_index.commit()
+        self.documents.delete(doc_ids)
+    
+    def ingest_dataset(self, file_path: str, format_type: Optional[str] = None,
+                       force: bool = False,
+                       page_range: Optional[Tuple[int, int]] = None,
+                       progress: Optional[Callable[[int], None]] = None) -> DatasetMetadata:
         """
         Ingest a dataset file.
         
+        Ingestion is idempotent: a file whose content hash matches an already
+        ingested dataset is skipped, and a changed file replaces the documents
+        of its previous version instead of adding a second copy. PDF page
+        ranges are separate datasets: re-ingesting a range replaces only that
+        range, while ingesting the whole file replaces all of its ranges.
+        
         Args:
             file_path: Path to the dataset file
             format_type: Optional format hint ('json', 'csv', 'pdf', 'auto')
+            force: Re-parse the file even if its content is unchanged
+            page_range: PDF only; 0-based [start, end) pages to ingest
+            progress: Called with the number of records parsed so far
         
         Returns:
             DatasetMetadata object
@@ -118,37 +276,136 @@ class MedicalDatasetMCPServer:
         if format_type is None or format_type == 'auto':
             format_type = file_path_obj.suffix[1:].lower()
         
-        documents = []
-        
-        if format_type == 'json':
-            documents = load_json_file(str(file_path_obj))
-        elif format_type == 'csv':
-            documents = load_csv_file(str(file_path_obj))
-        elif format_type == 'pdf':
-            from src.helper import load_pdf_file
-            documents = load_pdf_file(str(file_path_obj.parent))
-        else:
+        page_range = list(page_range) if page_range and format_type == 'pdf' else None
+        content_hash = file_sha256(file_path_obj)
+        if format_type not in ('json', 'csv', 'pdf'):
             raise ValueError(f"Unsupported format: {format_type}")
         
-        # Store documents
-        self.documents.extend(documents)
-        
-        # Create metadata
-        from datetime import datetime
-        metadata = DatasetMetadata(
-            name=file_path_obj.stem,
-            source_path=str(file_path_obj),
-            format=format_type,
-            record_count=len(documents),
-            ingestion_date=datetime.now().isoformat()
-        )
+        # Hold the writer lock from the dedupe check to the metadata record so
+        # a concurrent ingest of the same file (in any process) is seen
+        with self._writer_lock():
+            if not force:
+                for existing in self.ingested_datasets:
+                    if (existing.content_hash == content_hash and existing.format == format_type
+                            and existing.page_range == page_range):
+                        print(f"Dataset {file_path} is unchanged; skipping ingestion")
+                        return existing
+            
+            if format_type == 'json':
+                documents = iter_json_file(str(file_path_obj))
+            elif format_type == 'csv':
+                documents = iter_csv_file(str(file_path_obj))
+            else:
+                # Only the requested file (and pages); pages stream in as parsed
+                # and are cached per page, so re-ingesting a range is cheap
+                from src.helper import iter_pdf_documents
+                documents = iter_pdf_documents(
+                    str(file_path_obj),
+                    workers=int(os.getenv("MCP_PDF_WORKERS", "1")),
+                    page_range=tuple(page_range) if page_range else None
+                )
+            
+            # Stream documents straight into the store and the search index
+            # (no intermediate list); a document's id is its position, and the
+            # ids are contiguous because no other writer runs meanwhile. New
+            # ids only become visible to search when the index snapshot is
+            # committed.
+            first_id = len(self.documents)
+            count = 0
+            try:
+                for doc in documents:
+                    doc_id = self.documents.append(doc)
+                    self.search_index.add(doc_id, doc.page_content, doc.metadata.get('source', ''))
+                    count += 1
+                    if progress and count % 100 == 0:
+                        progress(count)
+                self.documents.flush()
+            except BaseException:
+                # A parse error part-way through leaves nothing of this file behind
+                self.documents.rollback()
+                self.search_index.rollback()
+                raise
+            self.search_index.commit()
+            end_id = first_id + count
+            
+            # Create metadata
+            from datetime import datetime
+            metadata = DatasetMetadata(
+                name=file_path_obj.stem,
+                source_path=str(file_path_obj),
+                format=format_type,
+                record_count=end_id - first_id,
+                ingestion_date=datetime.now().isoformat(),
+                content_hash=content_hash,
+                doc_ids=[first_id, end_id],
+                page_range=page_range
+            )
+            
+            # A changed (or forced) file replaces its previous version in place:
+            # the same page range, or every range when the whole file is ingested
+            replaced = [existing for existing in self.ingested_datasets
+                        if existing.source_path == metadata.source_path
+                        and (page_range is None or existing.page_range == page_range)]
+            for existing in replaced:
+                self._drop_documents(existing)
+                if dataset_key(asdict(existing)) != dataset_key(asdict(metadata)):
+                    self.metadata_store.delete(dataset_key(asdict(existing)))
+            if replaced:
+                self.ingested_datasets[self.ingested_datasets.index(replaced[0])] = metadata
+                for existing in replaced[1:]:
+                    self.ingested_datasets.remove(existing)
+            else:
+                self.ingested_datasets.append(metadata)
+            
+            # Save metadata and index to disk for persistence across processes
+            self._record_metadata(metadata)
+            self._save_index_to_disk()
+            # Cached answers may be missing (or citing) this dataset
+            bump_index_version()
         
-        self.ingested_datasets.append(metadata)
+        return metadata
+    
+    def evict_dataset(self, name_or_path: str) -> bool:
+        """
+        Remove an ingested dataset (all of its PDF page ranges) and its documents.
         
-        # Save metadata to disk for persistence across processes
-        self._save_metadata_to_disk()
+        Args:
+            name_or_path: Dataset name, file name or source path
         
-        return metadata
+        Returns:
+            True if a dataset was evicted
+        """
+        with self._writer_lock():
+            datasets = self._find_datasets(name_or_path)
+            if not datasets:
+                return False
+            for metadata in datasets:
+                self._drop_documents(metadata)
+                self.ingested_datasets.remove(metadata)
+                self.metadata_store.delete(dataset_key(asdict(metadata)))
+            self.__class__._metadata_version = self.metadata_store.version()
+            self._save_index_to_disk()
+            bump_index_version()
+        return True
+    
+    def reingest_dataset(self, name_or_path: str) -> DatasetMetadata:
+        """
+        Re-parse an ingested dataset from its source file, replacing its
+        documents (every ingested PDF page range; the last one is returned).
+        """
+        self._refresh()
+        datasets = self._find_datasets(name_or_path)
+        if not datasets:
+            raise ValueError(f"Dataset not ingested: {name_or_path}")
+        for metadata in datasets:
+            result = self.ingest_dataset(metadata.source_path, metadata.format, force=True,
+                                         page_range=metadata.page_range)
+        return result
+    
+    def document_count(self) -> int:
+        """Number of searchable (non-evicted) documents."""
+        self._refresh()
+        return self.documents.live_count
     
     def ingest_from_url(self, url: str, format_type: str = 'json') -> DatasetMetadata:
         """
@@ -171,6 +428,7 @@ class MedicalDatasetMCPServer:
     
     def get_ingested_datasets(self) -> List[Dict[str, Any]]:
         """Get list of all ingested datasets."""
+        self._refresh()
         return [
             {
                 "name": ds.name,
@@ -183,55 +441,48 @@ class MedicalDatasetMCPServer:
         ]
     
     def get_documents(self) -> List[Document]:
-        """Get all ingested documents."""
-        return self.documents
+        """Get all ingested (non-evicted) documents."""
+        self._refresh()
+        return [doc for _, doc in self.documents.iter_live()]
+    
+    def get_document(self, doc_id: int) -> Optional[Document]:
+        """Get an ingested document by id (None if it no longer exists)."""
+        documents = self.documents
+        if not 0 <= doc_id < len(documents) or documents.is_deleted(doc_id):
+            return None
+        return documents[doc_id]
     
-    def search_documents(self, query: str, dataset_name: str = None) -> List[Document]:
+    def search_documents(self, query: str, dataset_name: str = None,
+                         top_k: int = 10) -> List[Tuple[int, float]]:
         """
         Search ingested documents for relevant content.
         
+        Safe to call from many threads at once: scoring reads an immutable
+        index snapshot and never touches the shared Document objects.
+        
         Args:
             query: Search query (e.g., "hypertension symptoms")
             dataset_name: Optional specific dataset to search in
+            top_k: Maximum number of results
             
         Returns:
-            List of relevant documents/chunks matching query
+            (doc_id, BM25 score) pairs, best first; see get_document()
         """
-        if not self.documents:
-            return []
-        
-        # Simple keyword search in documents
-        results = []
-        query_lower = query.lower()
-        query_words = set(query_lower.split())
-        
-        for doc in self.documents:
-            content_lower = doc.page_content.lower()
-            
-            # Check if dataset matches (if specified)
-            if dataset_name:
-                doc_dataset = doc.metadata.get('source', '').lower()
-                if dataset_name.lower() not in doc_dataset:
-                    continue
-            
-            # Count matching words
-            matching_words = sum(1 for word in query_words if word in content_lower)
-            
-            # Include if has matching words
-            if matching_words > 0:
-                # Add relevance score to metadata
-                doc.metadata['relevance_score'] = matching_words / len(query_words)
-                results.append(doc)
-        
-        # Sort by relevance
-        results.sort(key=lambda x: x.metadata.get('relevance_score', 0), reverse=True)
-        
-        return results[:10]  # Return top 10 results
+        self._refresh()
+        # BM25 over the inverted index: only documents sharing a term are scored
+        return self.search_index.search(query, top_k=top_k, source_filter=dataset_name)
     
     def clear_documents(self):
         """Clear all ingested documents."""
-        self.documents.clear()
-        self.ingested_datasets.clear()
+        with self._writer_lock():
+            # Unpublish the index first so no search returns a dropped id
+            self.search_index.clear()
+            self._reset_index_on_disk()
+            self.documents.clear()
+            self.ingested_datasets.clear()
+            self.metadata_store.clear()
+            self.__class__._metadata_version = self.metadata_store.version()
+            bump_index_version()
 
 
 # MCP Server Implementation (if MCP SDK is available)
@@ -271,13 +522,16 @@ if MCP_AVAILABLE:
         """Tool to ingest a new dataset."""
         file_path = arguments.get("file_path")
         format_type = arguments.get("format_type", "auto")
+        page_range = None
+        if arguments.get("page_start") is not None or arguments.get("page_end") is not None:
+            page_range = (int(arguments.get("page_start") or 0), int(arguments.get("page_end") or 10 ** 9))
         
         if not file_path:
             return json.dumps({"error": "file_path is required"})
         
         server = MedicalDatasetMCPServer()
         try:
-            metadata = server.ingest_dataset(file_path, format_type)
+            metadata = server.ingest_dataset(file_path, format_type, page_range=page_range)
             return json.dumps({
                 "status": "success",
                 "dataset": {
@@ -313,6 +567,14 @@ if MCP_AVAILABLE:
                             "type": "string",
                             "enum": ["json", "csv", "pdf", "auto"],
                             "description": "Format type (auto-detect if not specified)"
+                        },
+                        "page_start": {
+                            "type": "integer",
+                            "description": "PDF only: first page to ingest (0-based)"
+                        },
+                        "page_end": {
+                            "type": "integer",
+                            "description": "PDF only: page to stop before (exclusive)"
                         }
                     },
                     "required": ["file_path"]
@@ -326,19 +588,21 @@ if MCP_AVAILABLE:
 
 
 # Standalone function for non-MCP usage
-def ingest_third_party_dataset(file_path: str, format_type: Optional[str] = None) -> Dict[str, Any]:
+def ingest_third_party_dataset(file_path: str, format_type: Optional[str] = None,
+                               page_range: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
     """
     Standalone function to ingest a third-party dataset.
     
     Args:
         file_path: Path to dataset file
         format_type: Optional format hint
+        page_range: PDF only; 0-based [start, end) pages to ingest
     
     Returns:
         Dictionary with ingestion results
     """
     server = MedicalDatasetMCPServer()
-    metadata = server.ingest_dataset(file_path, format_type)
+    metadata = server.ingest_dataset(file_path, format_type, page_range=page_range)
     
     return {
         "success": True,
@@ -349,7 +613,7 @@ def ingest_third_party_dataset(file_path: str, format_type: Optional[str] = None
             "record_count": metadata.record_count,
             "ingestion_date": metadata.ingestion_date
         },
-        "documents": len(server.documents)
+        "documents": server.document_count()
     }
 
 
@@ -0,0 +1,166 @@
+"""
+Medical query classification with precompiled keyword matchers.
+
+The keyword lists used to decide whether a query is medical (and whether it
+is clearly about something else, such as a location) are compiled once at
+import into single regular expressions. The alternation is built from a trie
+of the terms, so matching cost grows with the query length rather than with
+the size of the vocabulary. Terms match at the start of a word ("symptom"
+matches "symptoms", "ear" does not match "heart").
+
+MEDICAL_VOCABULARY_FILE can point to extra terms: a JSON object with any of
+the keys "medical", "non_medical", "location" and "what_is_exclusions" (lists
+of terms), or a plain text file with one medical term per line.
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+
+MEDICAL_KEYWORDS = [
+    # General medical terms
+    "disease", "symptom", "treatment", "medication", "drug",
+    "condition", "illness", "health", "medical", "diagnosis",
+    "doctor", "hospital", "surgery", "pain", "fever",
+    "diabetes", "heart", "cancer", "pneumonia", "virus",
+    "infection", "vaccine", "therapy", "cure", "medicine",
+    "patient", "clinical", "healthcare", "disorder", "syndrome",
+    "hypertension", "asthma", "arthritis", "depression",
+    "anxiety", "nutrition", "vitamin", "supplement", "exercise",
+    "wellness", "epidemic", "pandemic",
+    # Common symptoms and conditions
+    "diarrhea", "diarrhoea", "nausea", "vomiting", "headache",
+    "cough", "sneeze", "rash", "itch", "swelling", "bleeding",
+    "dizziness", "fatigue", "weakness", "numbness", "tingling",
+    "shortness of breath", "chest pain", "abdominal pain",
+    "stomach ache", "back pain", "joint pain", "muscle pain",
+    # Common diseases and conditions
+    "flu", "cold", "allergy", "bronchitis",
+    "tuberculosis", "malaria", "dengue",
+    "hepatitis", "kidney", "liver", "lung", "brain",
+    "stroke", "heart attack",
+    "obesity", "anemia", "osteoporosis", "migraine",
+    "epilepsy", "parkinson", "alzheimer", "dementia",
+    # Body parts and systems
+    "blood", "bone", "muscle", "nerve", "skin", "eye",
+    "ear", "nose", "throat", "teeth", "gum", "tongue",
+    "stomach", "intestine", "colon", "bladder",
+    "pancreas", "thyroid", "adrenal", "pituitary",
+    # Medical procedures and tests
+    "x-ray", "mri", "ct scan", "ultrasound", "biopsy",
+    "operation", "procedure", "test", "scan",
+    # Medications and treatments
+    "antibiotic", "antiviral", "antifungal", "antidepressant",
+    "painkiller", "analgesic", "anti-inflammatory", "steroid",
+    "chemotherapy", "radiation", "physiotherapy", "rehabilitation",
+]
+
+# "what is X" questions are assumed medical unless they mention one of these
+WHAT_IS_EXCLUSIONS = [
+    "weather", "time", "date", "color", "food",
+    "restaurant", "movie", "song", "book", "game",
+    "sport", "team", "player", "city", "country",
+]
+
+LOCATION_KEYWORDS = [
+    "new york city", "newyork", "capital of", "location of",
+    "where is", "geography", "geographic",
+]
+
+NON_MEDICAL_KEYWORDS = [
+    "recipe", "cook", "how to make", "programming",
+    "python code", "sport", "game", "movie", "weather",
+]
+
+LOCATION_PATTERN = re.compile(
+    r"where\s+(is|are)\s+"
+    r"|what\s+(is|are)\s+the\s+(capital|location)\s+of"
+)
+WHAT_IS_PATTERN = re.compile(r"what\s+is\s+(\w+)")
+
+
+def _trie_pattern(node: Dict[str, dict]) -> str:
+    """Regex alternation for a character trie ('' marks the end of a term)."""
+    ends = '' in node
+    branches = [re.escape(char) + _trie_pattern(child)
+                for char, child in sorted(node.items()) if char != '']
+    if not branches:
+        return ''
+    body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    return f'(?:{body})?' if ends else body
+
+
+class KeywordMatcher:
+    """Finds any of a set of terms, each matched at the start of a word."""
+
+    def __init__(self, terms: Iterable[str]):
+        self.terms = sorted({" ".join(term.lower().split()) for term in terms if term.strip()})
+        trie: Dict[str, dict] = {}
+        for term in self.terms:
+            node = trie
+            for char in term:
+                node = node.setdefault(char, {})
+            node[''] = {}
+        self._pattern = (
+            re.compile(r'(?<![a-z0-9])' + _trie_pattern(trie)) if self.terms else None
+        )
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def search(self, text: str) -> Optional[str]:
+        """First matching term in text (case- and whitespace-insensitive), or None."""
+        if self._pattern is None:
+            return None
+        match = self._pattern.search(" ".join(text.lower().split()))
+        return match.group(0) if match else None
+
+    def matches(self, text: str) -> bool:
+        return self.search(text) is not None
+
+
+def _load_vocabulary_file(path: Optional[str]) -> Dict[str, List[str]]:
+    """Extra terms from MEDICAL_VOCABULARY_FILE (JSON or one term per line)."""
+    if not path:
+        return {}
+    try:
+        content = Path(path).read_text(encoding='utf-8')
+        if path.endswith('.json'):
+            data = json.loads(content)
+            return data if isinstance(data, dict) else {"medical": list(data)}
+        return {"medical": [line.strip() for line in content.splitlines()
+                            if line.strip() and not line.startswith('#')]}
+    except Exception as e:
+        print(f"Warning: Could not load medical vocabulary {path}: {e}")
+        return {}
+
+
+_extra = _load_vocabulary_file(os.getenv("MEDICAL_VOCABULARY_FILE"))
+
+medical_matcher = KeywordMatcher(MEDICAL_KEYWORDS + _extra.get("medical", []))
+what_is_exclusion_matcher = KeywordMatcher(WHAT_IS_EXCLUSIONS + _extra.get("what_is_exclusions", []))
+location_matcher = KeywordMatcher(LOCATION_KEYWORDS + _extra.get("location", []))
+non_medical_matcher = KeywordMatcher(NON_MEDICAL_KEYWORDS + _extra.get("non_medical", []))
+
+
+def is_medical_query(query: str) -> bool:
+    """True if the query mentions a medical term (or is a generic "what is X")."""
+    if medical_matcher.matches(query):
+        return True
+    # "what is X" questions are often about a medical term; be permissive
+    # unless X is clearly something else
+    query_lower = query.lower()
+    return bool(WHAT_IS_PATTERN.search(query_lower)) and not what_is_exclusion_matcher.matches(query_lower)
+
+
+def is_location_query(query: str) -> bool:
+    """True for geographic questions ("where is ...", "capital of ...")."""
+    return bool(LOCATION_PATTERN.search(query.lower())) or location_matcher.matches(query)
+
+
+def is_non_medical_topic(query: str) -> bool:
+    """True if the query mentions a clearly non-medical topic (recipes, sports, ...)."""
+    return non_medical_matcher.matches(query)
@@ -0,0 +1,160 @@
+"""
+Crash-safe, multi-process persistence for MCP dataset metadata.
+
+Every change is appended as one JSON line to a journal next to the snapshot
+(Data/.mcp_metadata.json), so an update costs O(1) regardless of how many
+datasets exist. Readers load the snapshot and replay the journal. Once the
+journal grows past a threshold it is compacted into a new snapshot, written to
+a temporary file and swapped in with os.replace. An fcntl lock file
+serializes writers across processes (shared locks for readers).
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # Windows: fall back to in-process locking only
+    FCNTL_AVAILABLE = False
+
+
+METADATA_PATH = Path("Data/.mcp_metadata.json")
+
+
+def dataset_key(dataset: Dict[str, Any]) -> str:
+    """Datasets are keyed by source path, plus the page range for a PDF range."""
+    page_range = dataset.get('page_range')
+    if page_range:
+        return f"{dataset['source_path']}#pages={page_range[0]}-{page_range[1]}"
+    return dataset['source_path']
+
+
+class MetadataStore:
+    """Snapshot + append-only journal of dataset metadata keyed by dataset_key()."""
+
+    def __init__(self, path: Path = METADATA_PATH, compact_after: int = 256):
+        """
+        Args:
+            path: Snapshot file; the journal and lock file are kept next to it
+            compact_after: Journal entries that trigger a compaction
+        """
+        self.path = Path(path)
+        self.journal_path = self.path.with_suffix('.journal')
+        self.lock_path = self.path.with_suffix('.lock')
+        self.compact_after = compact_after
+
+        self._lock = threading.Lock()
+        self._journal_entries: Optional[int] = None
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        """Hold the in-process lock and the cross-process file lock."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            if not FCNTL_AVAILABLE:
+                yield
+                return
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # === Reads ===
+    def version(self):
+        """Changes whenever any process writes; cheap to poll."""
+        parts = []
+        for path in (self.path, self.journal_path):
+            try:
+                stat = path.stat()
+                parts.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                parts.append(None)
+        return tuple(parts)
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Current datasets (snapshot with the journal replayed), in ingestion order."""
+        with self._locked(exclusive=False):
+            return list(self._read_state().values())
+
+    def _read_state(self) -> "OrderedDict[str, Dict[str, Any]]":
+        state: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                for item in json.load(f):
+                    state[dataset_key(item)] = item
+
+        entries = 0
+        if self.journal_path.exists():
+            with open(self.journal_path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn final line from a crash mid-append
+                        continue
+                    entries += 1
+                    self._apply(state, entry)
+        self._journal_entries = entries
+        return state
+
+    @staticmethod
+    def _apply(state: "OrderedDict[str, Dict[str, Any]]", entry: Dict[str, Any]):
+        op = entry.get('op')
+        if op == 'put':
+            state[dataset_key(entry['dataset'])] = entry['dataset']
+        elif op == 'delete':
+            # Older journals recorded the source path only
+            state.pop(entry.get('key', entry.get('source_path')), None)
+        elif op == 'clear':
+            state.clear()
+
+    # === Writes ===
+    def put(self, dataset: Dict[str, Any]):
+        """Insert or replace the dataset with the same dataset_key()."""
+        self._append({'op': 'put', 'dataset': dataset})
+
+    def delete(self, key: str):
+        self._append({'op': 'delete', 'key': key})
+
+    def clear(self):
+        self._append({'op': 'clear'})
+
+    def _append(self, entry: Dict[str, Any]):
+        line = json.dumps(entry, separators=(',', ':')) + "\n"
+        with self._locked(exclusive=True):
+            with open(self.journal_path, 'a') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            if self._journal_entries is None:
+                self._read_state()
+            else:
+                self._journal_entries += 1
+            if self._journal_entries >= self.compact_after:
+                self._compact_locked()
+
+    def compact(self):
+        """Fold the journal into a new snapshot."""
+        with self._locked(exclusive=True):
+            self._compact_locked()
+
+    def _compact_locked(self):
+        state = self._read_state()
+        tmp_path = self.path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(list(state.values()), f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        # Readers hold the shared lock, so nobody sees the snapshot without its journal
+        with open(self.journal_path, 'w'):
+            pass
+        self._journal_entries = 0
@@ -1,5 +1,4 @@
 # src/prompt.py
-from langchain_openai import ChatOpenAI
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains import create_retrieval_chain
 from langchain.memory import ConversationBufferWindowMemory
@@ -11,10 +10,12 @@ from langchain_core.documents import Document
 from typing import List
 import os
 
+from src.llm import get_llm
+
 
 def build_rag_chain(retriever):
     """Build RAG chain without memory (for single-turn queries)."""
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.4, max_tokens=500)
+    llm = get_llm(max_tokens=500)
 
     system_prompt = """You are a MEDICAL chatbot.
     Use ONLY the provided medical context to answer.
@@ -48,7 +49,7 @@ def build_rag_chain(retriever):
 
 def build_conversational_rag_chain(retriever):
     """Build conversational RAG chain with memory for multi-turn interactions."""
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.4, max_tokens=1000)
+    llm = get_llm(max_tokens=1000)
 
     memory = ConversationBufferWindowMemory(
         k=5,  # Keep last 5 interactions
@@ -0,0 +1,275 @@
+"""
+Concurrent retrieval stage for the /ask handler.
+
+Dispatches the RAG (Pinecone), MCP (local datasets) and Exa web searches at
+the same time and collects whatever finished before its deadline, so request
+latency tracks the slowest source instead of the sum of all of them.
+
+With ADAPTIVE_WEB_SEARCH enabled (the default) the local sources get a short
+head start (WEB_SEARCH_GRACE_SECONDS). If they answer within it, a
+RetrievalPlanner decides from their scores whether to skip the Exa search or
+send a smaller one, so confident local answers cost no web call at all. If
+they are slower, the full web search starts speculatively and its result is
+dropped or trimmed once the plan is known. Every deadline counts from the
+start of the stage; ADAPTIVE_WEB_SEARCH=false always queries all three.
+"""
+
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+
+DEFAULT_SOURCE_TIMEOUT = float(os.getenv("RETRIEVAL_TIMEOUT_SECONDS", "8"))
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "16"))
+ADAPTIVE_WEB_SEARCH = os.getenv("ADAPTIVE_WEB_SEARCH", "true").lower() in ("1", "true", "yes")
+WEB_SEARCH_GRACE_SECONDS = float(os.getenv("WEB_SEARCH_GRACE_SECONDS", "1.0"))
+
+
+# Global executor instance (shared by all requests in the process)
+_executor = None
+
+def get_retrieval_executor() -> ThreadPoolExecutor:
+    """Get or create the shared retrieval thread pool."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=RETRIEVAL_WORKERS,
+            thread_name_prefix="retrieval"
+        )
+    return _executor
+
+
+class PendingRetrieval:
+    """
+    Retrieval tasks running concurrently, collected in stages.
+
+    Every source's deadline counts from when the stage started, including
+    sources submitted later, so staging never extends the overall stage.
+    """
+
+    def __init__(
+        self,
+        tasks: Dict[str, Callable[[], Any]],
+        timeouts: Optional[Dict[str, float]] = None,
+        default_timeout: float = DEFAULT_SOURCE_TIMEOUT
+    ):
+        """
+        Args:
+            tasks: Mapping of source name to a zero-argument callable
+            timeouts: Optional per-source deadline in seconds
+            default_timeout: Deadline for sources without an explicit timeout
+        """
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        executor = get_retrieval_executor()
+        self.started = time.monotonic()
+        self.futures = {name: executor.submit(task) for name, task in tasks.items()}
+
+    def submit(self, name: str, task: Callable[[], Any]):
+        """Start another source; its deadline still counts from the stage start."""
+        self.futures[name] = get_retrieval_executor().submit(task)
+
+    def wait(self, names: List[str], timeout: float) -> bool:
+        """Wait up to timeout seconds for the named sources; True if all finished."""
+        _, not_done = wait([self.futures[name] for name in names], timeout=timeout)
+        return not not_done
+
+    def collect(self, names: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Wait for the named sources (all by default).
+
+        Returns:
+            Mapping of source name to its result. Sources that failed or missed
+            their deadline map to None; the caller merges whatever is available.
+        """
+        results = {}
+        for name in names if names is not None else list(self.futures):
+            future = self.futures[name]
+            timeout = self.timeouts.get(name, self.default_timeout)
+            remaining = max(0.0, self.started + timeout - time.monotonic())
+            try:
+                results[name] = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                # The worker keeps running in the background; we just stop waiting
+                future.cancel()
+                print(f"⏱️  Retrieval source '{name}' missed its {timeout}s deadline")
+                results[name] = None
+            except Exception as e:
+                print(f"❌ Retrieval source '{name}' failed: {e}")
+                traceback.print_exc()
+                results[name] = None
+
+        elapsed = time.monotonic() - self.started
+        print(f"🔍 DEBUG: Retrieval fan-out finished in {elapsed:.2f}s "
+              f"({', '.join(name for name, result in results.items() if result is not None) or 'no sources'})")
+        return results
+
+    def discard(self, name: str):
+        """Stop waiting for a source whose result is no longer needed."""
+        self.futures[name].cancel()
+
+
+def fan_out(
+    tasks: Dict[str, Callable[[], Any]],
+    timeouts: Optional[Dict[str, float]] = None,
+    default_timeout: float = DEFAULT_SOURCE_TIMEOUT
+) -> Dict[str, Any]:
+    """
+    Run retrieval tasks concurrently with a per-source deadline.
+
+    Args:
+        tasks: Mapping of source name to a zero-argument callable
+        timeouts: Optional per-source deadline in seconds
+        default_timeout: Deadline for sources without an explicit timeout
+
+    Returns:
+        Mapping of source name to its result. Sources that failed or missed
+        their deadline map to None; the caller merges whatever is available.
+    """
+    return PendingRetrieval(tasks, timeouts, default_timeout).collect()
+
+
+@dataclass
+class WebSearchPlan:
+    """How much web search a query needs given what local retrieval found."""
+    action: str  # "skip", "reduced" or "full"
+    num_results: int
+    max_characters: int
+    rag_score: Optional[float]
+    mcp_score: Optional[float]
+    confident_hits: int
+
+    @property
+    def skip(self) -> bool:
+        return self.action == "skip"
+
+    def apply(self, web_results: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Web results as this plan uses them: a skip placeholder, or the results
+        cut down to the plan's size (a speculative search ran at full size).
+
+        Returns a new dict (results may be shared with the web cache).
+        """
+        if self.skip:
+            return {"success": True, "found": False, "skipped": True,
+                    "message": "Local sources were sufficient"}
+        if not web_results or not web_results.get("found"):
+            return web_results
+        results = [
+            dict(result, content=(result.get("content") or "")[:self.max_characters])
+            for result in web_results.get("results", [])[:self.num_results]
+        ]
+        return dict(web_results, results=results, results_count=len(results))
+
+
+class RetrievalPlanner:
+    """
+    Decides how much of the Exa web search to use from local retrieval confidence.
+
+    Pinecone scores are cosine similarities (0-1); MCP relevance is a BM25
+    score, so the two sources have separate thresholds. The web search is
+    skipped when at least `skip_min_hits` local results clear the skip
+    thresholds, reduced when the best local result clears the reduce
+    thresholds, and used in full otherwise.
+    """
+
+    def __init__(
+        self,
+        rag_skip_score: float = 0.75,
+        rag_reduce_score: float = 0.6,
+        mcp_skip_score: float = 12.0,
+        mcp_reduce_score: float = 6.0,
+        skip_min_hits: int = 2,
+        full_results: int = 5,
+        full_max_characters: int = 2000,
+        reduced_results: int = 2,
+        reduced_max_characters: int = 1000
+    ):
+        self.rag_skip_score = rag_skip_score
+        self.rag_reduce_score = rag_reduce_score
+        self.mcp_skip_score = mcp_skip_score
+        self.mcp_reduce_score = mcp_reduce_score
+        self.skip_min_hits = skip_min_hits
+        self.full_results = full_results
+        self.full_max_characters = full_max_characters
+        self.reduced_results = reduced_results
+        self.reduced_max_characters = reduced_max_characters
+
+        self._lock = threading.Lock()
+        self._counts = {"skip": 0, "reduced": 0, "full": 0}
+
+    def plan(self, rag_docs: Optional[List[Any]], mcp_results: Optional[Dict[str, Any]]) -> WebSearchPlan:
+        """
+        Args:
+            rag_docs: Documents from DirectPineconeRetriever (score in metadata)
+            mcp_results: Result dict of MCPClient.search_mcp_documents
+        """
+        rag_scores = [doc.metadata.get("score") for doc in rag_docs or []]
+        rag_scores = [score for score in rag_scores if score is not None]
+        mcp_scores = [result.get("relevance", 0) for result in (mcp_results or {}).get("results", [])]
+
+        rag_score = max(rag_scores) if rag_scores else None
+        mcp_score = max(mcp_scores) if mcp_scores else None
+        confident_hits = (sum(score >= self.rag_skip_score for score in rag_scores)
+                          + sum(score >= self.mcp_skip_score for score in mcp_scores))
+
+        if confident_hits >= self.skip_min_hits:
+            plan = WebSearchPlan("skip", 0, 0, rag_score, mcp_score, confident_hits)
+        elif ((rag_score is not None and rag_score >= self.rag_reduce_score)
+              or (mcp_score is not None and mcp_score >= self.mcp_reduce_score)):
+            plan = WebSearchPlan("reduced", self.reduced_results, self.reduced_max_characters,
+                                 rag_score, mcp_score, confident_hits)
+        else:
+            plan = WebSearchPlan("full", self.full_results, self.full_max_characters,
+                                 rag_score, mcp_score, confident_hits)
+
+        with self._lock:
+            self._counts[plan.action] += 1
+        return plan
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+        planned = sum(counts.values())
+        return {
+            "adaptive": ADAPTIVE_WEB_SEARCH,
+            "plans": counts,
+            "skip_rate": counts["skip"] / planned if planned else 0.0,
+            "thresholds": {
+                "rag_skip_score": self.rag_skip_score,
+                "rag_reduce_score": self.rag_reduce_score,
+                "mcp_skip_score": self.mcp_skip_score,
+                "mcp_reduce_score": self.mcp_reduce_score,
+                "skip_min_hits": self.skip_min_hits,
+            },
+        }
+
+
+# Global planner instance
+_planner = None
+
+def get_retrieval_planner() -> RetrievalPlanner:
+    """
+    Get or create the web-search planner, configured from the environment
+    (WEB_SKIP_RAG_SCORE, WEB_REDUCE_RAG_SCORE, WEB_SKIP_MCP_SCORE,
+    WEB_REDUCE_MCP_SCORE, WEB_SKIP_MIN_HITS, WEB_FULL_RESULTS,
+    WEB_FULL_MAX_CHARACTERS, WEB_REDUCED_RESULTS, WEB_REDUCED_MAX_CHARACTERS).
+    """
+    global _planner
+    if _planner is None:
+        _planner = RetrievalPlanner(
+            rag_skip_score=float(os.getenv("WEB_SKIP_RAG_SCORE", "0.75")),
+            rag_reduce_score=float(os.getenv("WEB_REDUCE_RAG_SCORE", "0.6")),
+            mcp_skip_score=float(os.getenv("WEB_SKIP_MCP_SCORE", "12")),
+            mcp_reduce_score=float(os.getenv("WEB_REDUCE_MCP_SCORE", "6")),
+            skip_min_hits=int(os.getenv("WEB_SKIP_MIN_HITS", "2")),
+            full_results=int(os.getenv("WEB_FULL_RESULTS", "5")),
+            full_max_characters=int(os.getenv("WEB_FULL_MAX_CHARACTERS", "2000")),
+            reduced_results=int(os.getenv("WEB_REDUCED_RESULTS", "2")),
+            reduced_max_characters=int(os.getenv("WEB_REDUCED_MAX_CHARACTERS", "1000"))
+        )
+    return _planner
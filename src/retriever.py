@@ -0,0 +1,110 @@
+"""
+Retriever that queries the vector index directly.
+
+Works with either vector backend from src.vector_store (a Pinecone Index or
+a LocalVectorStore), since both expose the same query() interface.
+
+Every returned document carries its similarity score in metadata['score'] (and
+its namespace in metadata['namespace']). Queries accept a Pinecone metadata
+filter (e.g. {"record_type": "clinical_diagnosis"}) and a per-query k; with
+several namespaces configured they are queried in parallel and merged by score.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+# Global executor for multi-namespace queries. Kept separate from the
+# retrieval fan-out pool, which the retriever itself runs on.
+_executor = None
+
+def get_namespace_executor() -> ThreadPoolExecutor:
+    """Get or create the thread pool for parallel namespace queries."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("RETRIEVER_NAMESPACE_WORKERS", "8")),
+            thread_name_prefix="namespace-query"
+        )
+    return _executor
+
+
+class DirectPineconeRetriever(BaseRetriever):
+    index: any
+    embeddings: any
+    k: int = 3
+    namespaces: List[str] = ['default']
+    filter: Optional[Dict[str, Any]] = None  # Default metadata filter
+
+    def _query_namespace(
+        self, query_vector: List[float], namespace: str, k: int,
+        filter: Optional[Dict[str, Any]]
+    ) -> List[Tuple[Document, float]]:
+        results = self.index.query(
+            vector=query_vector,
+            top_k=k,
+            namespace=namespace,
+            include_metadata=True,
+            filter=filter
+        )
+
+        # Convert to LangChain documents, keeping the similarity score
+        scored = []
+        for match in results['matches']:
+            metadata = dict(match.get('metadata') or {})
+            score = match.get('score')
+            metadata['score'] = score
+            metadata['namespace'] = namespace
+            metadata.setdefault('id', match.get('id'))
+            content = metadata.get('text', '')
+            scored.append((Document(page_content=content, metadata=metadata), score))
+        return scored
+
+    def search_with_scores(
+        self,
+        query: str,
+        k: Optional[int] = None,
+        filter: Optional[Dict[str, Any]] = None,
+        namespaces: Optional[List[str]] = None
+    ) -> List[Tuple[Document, float]]:
+        """
+        Top-k documents with their similarity scores, best first.
+
+        Args:
+            query: Search text
+            k: Results to return (defaults to self.k)
+            filter: Pinecone metadata filter (defaults to self.filter)
+            namespaces: Namespaces to search (defaults to self.namespaces)
+        """
+        k = k or self.k
+        filter = self.filter if filter is None else filter
+        namespaces = namespaces or self.namespaces
+
+        # Get query embedding once for all namespaces
+        query_vector = self.embeddings.embed_query(query)
+
+        if len(namespaces) == 1:
+            scored = self._query_namespace(query_vector, namespaces[0], k, filter)
+        else:
+            executor = get_namespace_executor()
+            futures = [executor.submit(self._query_namespace, query_vector, namespace, k, filter)
+                       for namespace in namespaces]
+            scored = [item for future in futures for item in future.result()]
+            scored.sort(key=lambda item: item[1] if item[1] is not None else float('-inf'),
+                        reverse=True)
+
+        return scored[:k]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun = None,
+        k: Optional[int] = None, filter: Optional[Dict[str, Any]] = None,
+        namespaces: Optional[List[str]] = None
+    ) -> List[Document]:
+        """Get documents relevant to a query using direct Pinecone query."""
+        return [doc for doc, _ in self.search_with_scores(query, k=k, filter=filter,
+                                                          namespaces=namespaces)]
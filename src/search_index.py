@@ -0,0 +1,354 @@
+"""
+Inverted index with BM25 ranking for MCP dataset search.
+
+Each ingested document gets an integer id (its position in the MCP document
+list). The index maps every token to a posting list of {doc_id: term
+frequency}, so a query only touches the documents that contain one of its
+terms instead of scanning the whole corpus. Stopwords are dropped at index
+and query time, and terms that occur in most documents are skipped when the
+query has rarer ones, so natural-language questions don't walk huge posting
+lists.
+
+On disk the index is a snapshot (Data/.mcp_search_index.json) plus an
+append-only delta log with one line per commit, so an ingest writes only the
+documents it added. The log is folded into a new snapshot once it outgrows
+it. Other processes catch up with refresh(). Writers across processes must
+be serialized by the caller (the MCP server holds a file lock).
+
+Readers never take a lock: queries run against an immutable IndexSnapshot,
+and writers stage documents and then publish a new snapshot with a single
+reference swap (copy-on-write of the posting lists they touched).
+"""
+
+import heapq
+import json
+import math
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+SEARCH_INDEX_PATH = Path("Data/.mcp_search_index.json")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been
+before being below between both but by can could did do does doing down during
+each few for from further had has have having he her here hers herself him
+himself his how i if in into is it its itself just me more most my myself no
+nor not now of off on once only or other our ours ourselves out over own same
+she should so some such than that the their theirs them themselves then there
+these they this those through to too under until up very was we were what when
+where which while who whom why will with would you your yours yourself
+yourselves
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric tokens, without stopwords."""
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """Published, read-only state of an InvertedIndex."""
+    postings: Dict[str, Dict[int, int]] = field(default_factory=dict)
+    doc_lengths: Dict[int, int] = field(default_factory=dict)
+    doc_sources: Dict[int, str] = field(default_factory=dict)
+    total_length: int = 0
+
+
+class InvertedIndex:
+    """Token → posting list index scored with Okapi BM25."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, max_df_ratio: float = 0.5):
+        """
+        Args:
+            k1: Term frequency saturation
+            b: Document length normalization
+            max_df_ratio: Query terms found in more than this share of the
+                          documents are skipped when the query has rarer terms
+        """
+        self.k1 = k1
+        self.b = b
+        self.max_df_ratio = max_df_ratio
+
+        self._write_lock = threading.Lock()
+        self._snapshot = IndexSnapshot()
+        # Documents added since the last commit(): doc_id -> (term counts, length, source)
+        self._pending: Dict[int, Tuple[Dict[str, int], int, str]] = {}
+        # Documents removed since the last commit(): doc_id -> their terms
+        self._pending_removals: Dict[int, set] = {}
+        # Committed changes not yet in the delta log: (additions, removals)
+        self._unlogged: List[Tuple[Dict[int, tuple], Dict[int, set]]] = []
+        # Position in the on-disk log this snapshot reflects: (inode, bytes)
+        self._log_state: Optional[Tuple[int, int]] = None
+
+    def __len__(self) -> int:
+        return len(self._snapshot.doc_lengths)
+
+    @property
+    def snapshot(self) -> IndexSnapshot:
+        return self._snapshot
+
+    def add(self, doc_id: int, text: str, source: str = ""):
+        """Stage one document; it becomes searchable after commit()."""
+        tokens = tokenize(text)
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+
+        with self._write_lock:
+            self._pending[doc_id] = (counts, len(tokens), source)
+
+    def remove(self, doc_id: int, text: str):
+        """Stage the removal of an indexed document (text is needed to find its postings)."""
+        with self._write_lock:
+            self._pending.pop(doc_id, None)
+            self._pending_removals[doc_id] = set(tokenize(text))
+
+    def commit(self):
+        """Publish staged additions and removals as a new snapshot."""
+        with self._write_lock:
+            if not self._pending and not self._pending_removals:
+                return
+            additions, removals = self._pending, self._pending_removals
+            self._pending = {}
+            self._pending_removals = {}
+            self._publish(additions, removals)
+            self._unlogged.append((additions, removals))
+
+    def rollback(self):
+        """Discard staged changes that have not been committed."""
+        with self._write_lock:
+            self._pending = {}
+            self._pending_removals = {}
+
+    def _publish(self, additions: Dict[int, Tuple[Dict[str, int], int, str]],
+                 removals: Dict[int, set]):
+        """Apply changes copy-on-write and swap in the new snapshot (write lock held)."""
+        current = self._snapshot
+        postings = dict(current.postings)
+        doc_lengths = dict(current.doc_lengths)
+        doc_sources = dict(current.doc_sources)
+        total_length = current.total_length
+        copied = set()
+
+        for doc_id, terms in removals.items():
+            if doc_id not in doc_lengths:
+                continue
+            for token in terms:
+                if token not in postings:
+                    continue
+                if token not in copied:
+                    postings[token] = dict(postings[token])
+                    copied.add(token)
+                postings[token].pop(doc_id, None)
+                if not postings[token]:
+                    del postings[token]
+                    copied.discard(token)
+            total_length -= doc_lengths.pop(doc_id)
+            doc_sources.pop(doc_id, None)
+
+        for doc_id, (counts, length, source) in additions.items():
+            for token, tf in counts.items():
+                # Copy a posting list once before changing it; the old
+                # snapshot may still be read by in-flight queries
+                if token not in copied:
+                    postings[token] = dict(postings.get(token, {}))
+                    copied.add(token)
+                postings[token][doc_id] = tf
+            doc_lengths[doc_id] = length
+            doc_sources[doc_id] = source
+            total_length += length
+
+        self._snapshot = IndexSnapshot(postings, doc_lengths, doc_sources, total_length)
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        source_filter: Optional[str] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Rank documents against a query.
+
+        Args:
+            query: Free-text query
+            top_k: Number of results
+            source_filter: Only keep documents whose source contains this
+                           string (case-insensitive)
+
+        Returns:
+            (doc_id, score) pairs, best first
+        """
+        snapshot = self._snapshot
+        terms = set(tokenize(query))
+        n_docs = len(snapshot.doc_lengths)
+        if not terms or not n_docs:
+            return []
+
+        postings = [snapshot.postings[term] for term in terms if snapshot.postings.get(term)]
+        max_df = self.max_df_ratio * n_docs
+        if any(len(posting) <= max_df for posting in postings):
+            # Very common terms barely change the ranking (low idf) but cost
+            # a pass over most of the corpus
+            postings = [posting for posting in postings if len(posting) <= max_df]
+
+        avg_length = snapshot.total_length / n_docs or 1.0
+        scores: Dict[int, float] = {}
+        for posting in postings:
+            df = len(posting)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * snapshot.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        if source_filter:
+            needle = source_filter.lower()
+            scores = {
+                doc_id: score for doc_id, score in scores.items()
+                if needle in snapshot.doc_sources.get(doc_id, "").lower()
+            }
+
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def clear(self):
+        """Drop every document (call save() to clear the files too)."""
+        with self._write_lock:
+            self._pending = {}
+            self._pending_removals = {}
+            self._unlogged = []
+            self._snapshot = IndexSnapshot()
+
+    # === Persistence ===
+    @staticmethod
+    def log_path(path: Path) -> Path:
+        return Path(path).with_suffix('.log')
+
+    def save(self, path: Path = SEARCH_INDEX_PATH):
+        """Write the published snapshot atomically and start an empty delta log."""
+        path = Path(path)
+        with self._write_lock:
+            snapshot = self._snapshot
+            data = {
+                "version": 2,
+                "k1": self.k1,
+                "b": self.b,
+                "postings": {
+                    token: [[doc_id, tf] for doc_id, tf in posting.items()]
+                    for token, posting in snapshot.postings.items()
+                },
+                "doc_lengths": [[doc_id, length] for doc_id, length in snapshot.doc_lengths.items()],
+                "doc_sources": [[doc_id, source] for doc_id, source in snapshot.doc_sources.items()],
+            }
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+            # A fresh log file (new inode) tells other processes to reload
+            log_path = self.log_path(path)
+            tmp_log = log_path.with_suffix('.log.tmp')
+            open(tmp_log, 'wb').close()
+            os.replace(tmp_log, log_path)
+            self._log_state = (os.stat(log_path).st_ino, 0)
+            self._unlogged = []
+
+    def persist(self, path: Path = SEARCH_INDEX_PATH):
+        """
+        Append committed changes to the delta log, compacting into a new
+        snapshot once the log is larger than the snapshot.
+        """
+        path = Path(path)
+        log_path = self.log_path(path)
+        with self._write_lock:
+            if self._log_state is None or not path.exists() or not log_path.exists():
+                compact = True
+            else:
+                if self._unlogged:
+                    lines = [
+                        json.dumps({
+                            "add": [[doc_id, length, source, counts]
+                                    for doc_id, (counts, length, source) in additions.items()],
+                            "remove": [[doc_id, sorted(terms)] for doc_id, terms in removals.items()],
+                        }, separators=(',', ':')) + "\n"
+                        for additions, removals in self._unlogged
+                    ]
+                    with open(log_path, 'a') as f:
+                        f.write("".join(lines))
+                        f.flush()
+                        os.fsync(f.fileno())
+                    self._unlogged = []
+                stat = os.stat(log_path)
+                self._log_state = (stat.st_ino, stat.st_size)
+                compact = stat.st_size > path.stat().st_size
+        if compact:
+            self.save(path)
+
+    @classmethod
+    def load(cls, path: Path = SEARCH_INDEX_PATH) -> "InvertedIndex":
+        """Load an index written by save() and replay its delta log."""
+        with open(path, 'r') as f:
+            data = json.load(f)
+        index = cls(k1=data.get("k1", 1.5), b=data.get("b", 0.75))
+        doc_lengths = {doc_id: length for doc_id, length in data["doc_lengths"]}
+        index._snapshot = IndexSnapshot(
+            postings={
+                token: {doc_id: tf for doc_id, tf in posting}
+                for token, posting in data["postings"].items()
+                # Version 1 indexed stopwords too
+                if data.get("version", 1) >= 2 or token not in STOPWORDS
+            },
+            doc_lengths=doc_lengths,
+            doc_sources={doc_id: source for doc_id, source in data["doc_sources"]},
+            total_length=sum(doc_lengths.values())
+        )
+        log_path = cls.log_path(path)
+        if log_path.exists():
+            index._log_state = (os.stat(log_path).st_ino, 0)
+            index._replay_log(log_path)
+        return index
+
+    def refresh(self, path: Path = SEARCH_INDEX_PATH):
+        """
+        Catch up with changes other processes wrote to the log, reloading
+        the snapshot if the log was compacted since this index was loaded.
+        """
+        log_path = self.log_path(path)
+        try:
+            stat = os.stat(log_path)
+        except OSError:
+            return
+        if self._log_state is None or stat.st_ino != self._log_state[0] or stat.st_size < self._log_state[1]:
+            loaded = InvertedIndex.load(path)
+            with self._write_lock:
+                self._snapshot = loaded._snapshot
+                self._log_state = loaded._log_state
+                self._unlogged = []
+        elif stat.st_size > self._log_state[1]:
+            with self._write_lock:
+                self._replay_log(log_path)
+
+    def _replay_log(self, log_path: Path):
+        """Apply log lines past the current position (a torn last line is left for later)."""
+        inode, offset = self._log_state
+        with open(log_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                offset += len(line)
+                self._publish(
+                    {doc_id: (counts, length, source) for doc_id, length, source, counts in entry["add"]},
+                    {doc_id: set(terms) for doc_id, terms in entry["remove"]}
+                )
+        self._log_state = (inode, offset)
@@ -0,0 +1,204 @@
+"""
+Semantic answer cache for the /ask handler.
+
+Near-identical questions ("symptoms of diabetes", "diabetes symptoms?") are
+answered from a local vector index of previous answers instead of paying for
+Pinecone, Exa and a full LLM generation again. Queries are embedded with the
+same MiniLM model used for retrieval and matched by cosine similarity.
+
+Entries expire after a TTL, the index is bounded (least recently used entry
+is replaced when full), and the whole cache is dropped whenever
+store_index.py reindexes the knowledge base or an MCP dataset is ingested,
+evicted or cleared (see bump_index_version()). The version file is stat'ed at
+most every INDEX_VERSION_CHECK_SECONDS and only read when it changed.
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+INDEX_VERSION_FILE = Path("Data/.index_version")
+INDEX_VERSION_CHECK_SECONDS = float(os.getenv("INDEX_VERSION_CHECK_SECONDS", "2"))
+
+
+def bump_index_version():
+    """Record that the vector index changed; cached answers become stale."""
+    INDEX_VERSION_FILE.parent.mkdir(parents=True, exist_ok=True)
+    INDEX_VERSION_FILE.write_text(str(time.time()))
+
+
+def _index_version_stat():
+    try:
+        stat = INDEX_VERSION_FILE.stat()
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _read_index_version() -> Optional[str]:
+    try:
+        return INDEX_VERSION_FILE.read_text().strip()
+    except OSError:
+        return None
+
+
+class SemanticAnswerCache:
+    """Similarity-keyed cache of final /ask payloads."""
+
+    def __init__(
+        self,
+        embeddings,
+        threshold: float = 0.92,
+        ttl: float = 3600,
+        max_entries: int = 1000,
+        version_check_interval: float = INDEX_VERSION_CHECK_SECONDS
+    ):
+        """
+        Args:
+            embeddings: LangChain embeddings used to embed queries
+            threshold: Minimum cosine similarity for a cache hit
+            ttl: Seconds a cached answer stays valid
+            max_entries: Maximum number of cached answers
+            version_check_interval: Seconds between checks of the index version file
+        """
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version_check_interval = version_check_interval
+
+        self._lock = threading.Lock()
+        self._vectors = None  # (max_entries, dim) float32, rows L2-normalized
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._created = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._payloads = [None] * max_entries
+        self._index_version_stat = _index_version_stat()
+        self._index_version = _read_index_version()
+        self._version_checked = time.monotonic()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _embed(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(query.strip()), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_index_version(self):
+        """Drop everything if the knowledge base was reindexed since we last looked."""
+        now = time.monotonic()
+        if now - self._version_checked < self.version_check_interval:
+            return
+        self._version_checked = now
+        stat = _index_version_stat()
+        if stat == self._index_version_stat:
+            return
+        self._index_version_stat = stat
+        version = _read_index_version()
+        if version != self._index_version:
+            self._index_version = version
+            self._clear()
+
+    def _clear(self):
+        self._valid[:] = False
+        self._payloads = [None] * self.max_entries
+        self.invalidations += 1
+
+    def lookup(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Find a cached answer for a semantically equivalent query.
+
+        Returns:
+            The cached payload, or None on a miss
+        """
+        vector = self._embed(query)
+        now = time.time()
+
+        with self._lock:
+            self._check_index_version()
+
+            if self._vectors is None or not self._valid.any():
+                self.misses += 1
+                return None
+
+            # Expire stale entries, then score all live ones in one matmul
+            self._valid &= (now - self._created) < self.ttl
+            similarities = self._vectors @ vector
+            similarities[~self._valid] = -1.0
+
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._last_used[best] = now
+            return self._payloads[best]
+
+    def store(self, query: str, payload: Dict[str, Any]):
+        """Cache the final payload for a query."""
+        vector = self._embed(query)
+        now = time.time()
+
+        with self._lock:
+            self._check_index_version()
+
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+
+            free = np.flatnonzero(~self._valid)
+            if free.size:
+                slot = int(free[0])
+            else:
+                slot = int(np.argmin(self._last_used))
+
+            self._vectors[slot] = vector
+            self._valid[slot] = True
+            self._created[slot] = now
+            self._last_used[slot] = now
+            self._payloads[slot] = payload
+
+    def invalidate(self):
+        """Drop every cached answer."""
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": int(self._valid.sum()),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+# Global cache instance
+_answer_cache = None
+
+def get_answer_cache(embeddings) -> Optional[SemanticAnswerCache]:
+    """Get or create the answer cache; None when SEMANTIC_CACHE_ENABLED=false."""
+    global _answer_cache
+    if os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    if _answer_cache is None:
+        _answer_cache = SemanticAnswerCache(
+            embeddings,
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+            ttl=float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600")),
+            max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+        )
+    return _answer_cache
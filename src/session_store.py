@@ -0,0 +1,396 @@
+"""
+Bounded session store for conversational RAG chains.
+
+Keeps at most SESSION_MAX_CHAINS chains in process, evicting the least
+recently used one when full and any chain idle for longer than
+SESSION_IDLE_TTL_SECONDS. Chat history can be persisted to a pluggable
+backend so an evicted session (or one served by another gunicorn worker)
+is rebuilt with its conversation memory intact:
+
+    SESSION_BACKEND=memory   history lives only as long as the cached chain
+    SESSION_BACKEND=sqlite   history is shared through SESSION_DB_PATH
+
+Each chain's memory is a write-through history: every turn the chain records
+is appended to the backend immediately (only the new messages), and both the
+in-process and the stored history are capped to the memory window the chain
+actually reads.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+from pydantic import Field
+
+
+class WriteThroughChatHistory(InMemoryChatMessageHistory):
+    """
+    In-memory chat history that reports every change to its callbacks.
+
+    on_append receives only the messages of the new turn; on_clear is called
+    when the history is emptied. With max_messages set, older messages are
+    dropped once the history grows past it.
+    """
+
+    on_append: Optional[Callable[[List[BaseMessage]], None]] = Field(default=None, exclude=True)
+    on_clear: Optional[Callable[[], None]] = Field(default=None, exclude=True)
+    max_messages: Optional[int] = None
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.add_messages([message])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        # One write per turn (human + AI message), not one per message
+        messages = list(messages)
+        self.messages.extend(messages)
+        if self.max_messages is not None and len(self.messages) > self.max_messages:
+            del self.messages[:-self.max_messages]
+        if self.on_append is not None:
+            self.on_append(messages)
+
+    def clear(self) -> None:
+        self.messages = []
+        if self.on_clear is not None:
+            self.on_clear()
+
+
+class MemoryHistoryBackend:
+    """In-process backend: nothing outlives the cached chain."""
+
+    shared = False
+
+    def load(self, session_id: str) -> Optional[Tuple[List[Dict[str, Any]], int]]:
+        return None
+
+    def version(self, session_id: str) -> int:
+        return 0
+
+    def append(self, session_id: str, messages: List[Dict[str, Any]],
+               keep: Optional[int] = None) -> int:
+        return 0
+
+    def save(self, session_id: str, messages: List[Dict[str, Any]]) -> int:
+        return 0
+
+    def delete(self, session_id: str):
+        pass
+
+    def purge_idle(self, idle_ttl: float) -> int:
+        return 0
+
+
+class SQLiteHistoryBackend:
+    """
+    SQLite backend so several worker processes share conversation memory.
+
+    One row per message, so a turn costs an insert of its own messages
+    rather than rewriting the whole conversation.
+    """
+
+    shared = True
+
+    def __init__(self, db_path: str = "Data/.sessions.db"):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            # Earlier layout kept the whole history as one JSON blob per session
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(chat_sessions)")]
+            if "messages" in columns:
+                conn.execute("DROP TABLE chat_sessions")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_sessions ("
+                " session_id TEXT PRIMARY KEY,"
+                " version INTEGER NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_messages ("
+                " session_id TEXT NOT NULL,"
+                " seq INTEGER NOT NULL,"
+                " message TEXT NOT NULL,"
+                " PRIMARY KEY (session_id, seq))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers run alongside a writer."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, session_id: str) -> Optional[Tuple[List[Dict[str, Any]], int]]:
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT version FROM chat_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        messages = [
+            json.loads(message) for (message,) in conn.execute(
+                "SELECT message FROM chat_messages WHERE session_id = ? ORDER BY seq",
+                (session_id,)
+            )
+        ]
+        return messages, row[0]
+
+    def version(self, session_id: str) -> int:
+        row = self._connect().execute(
+            "SELECT version FROM chat_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _bump(self, conn: sqlite3.Connection, session_id: str) -> int:
+        conn.execute(
+            "INSERT INTO chat_sessions (session_id, version, updated_at) VALUES (?, 1, ?)"
+            " ON CONFLICT(session_id) DO UPDATE SET"
+            " version = chat_sessions.version + 1,"
+            " updated_at = excluded.updated_at",
+            (session_id, time.time())
+        )
+        return conn.execute(
+            "SELECT version FROM chat_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()[0]
+
+    def append(self, session_id: str, messages: List[Dict[str, Any]],
+               keep: Optional[int] = None) -> int:
+        """Add messages to a session, keeping only its last `keep` messages."""
+        with self._connect() as conn:
+            version = self._bump(conn, session_id)
+            last = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM chat_messages WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()[0]
+            conn.executemany(
+                "INSERT INTO chat_messages (session_id, seq, message) VALUES (?, ?, ?)",
+                [(session_id, last + i, json.dumps(message))
+                 for i, message in enumerate(messages, 1)]
+            )
+            if keep is not None:
+                conn.execute(
+                    "DELETE FROM chat_messages WHERE session_id = ? AND seq <= ?",
+                    (session_id, last + len(messages) - keep)
+                )
+        return version
+
+    def save(self, session_id: str, messages: List[Dict[str, Any]]) -> int:
+        """Replace a session's whole history."""
+        with self._connect() as conn:
+            version = self._bump(conn, session_id)
+            conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+            conn.executemany(
+                "INSERT INTO chat_messages (session_id, seq, message) VALUES (?, ?, ?)",
+                [(session_id, i, json.dumps(message)) for i, message in enumerate(messages, 1)]
+            )
+        return version
+
+    def delete(self, session_id: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
+
+    def purge_idle(self, idle_ttl: float) -> int:
+        cutoff = time.time() - idle_ttl
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM chat_messages WHERE session_id IN"
+                " (SELECT session_id FROM chat_sessions WHERE updated_at < ?)", (cutoff,)
+            )
+            cursor = conn.execute("DELETE FROM chat_sessions WHERE updated_at < ?", (cutoff,))
+        return cursor.rowcount
+
+
+class SessionStore:
+    """LRU + idle-TTL cache of per-session conversational chains."""
+
+    def __init__(
+        self,
+        chain_factory: Callable[[], Any],
+        max_sessions: int = 500,
+        idle_ttl: float = 1800,
+        backend=None
+    ):
+        """
+        Args:
+            chain_factory: Builds a new conversational chain
+            max_sessions: Maximum number of chains kept in process
+            idle_ttl: Seconds of inactivity after which a session is evicted
+            backend: History backend (defaults to MemoryHistoryBackend)
+        """
+        self.chain_factory = chain_factory
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.backend = backend or MemoryHistoryBackend()
+
+        self._lock = threading.Lock()
+        # session_id -> [chain, last_access, history_version]
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self._last_purge = time.monotonic()
+
+        self.hits = 0
+        self.misses = 0
+        self.lru_evictions = 0
+        self.ttl_evictions = 0
+
+    def get(self, session_id: str):
+        """Get the chain for a session, creating (and restoring) it if needed."""
+        now = time.monotonic()
+        with self._lock:
+            purge_due = self._evict_idle(now)
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                self.hits += 1
+                entry[1] = now
+                self._entries.move_to_end(session_id)
+                chain, version = entry[0], entry[2]
+            else:
+                self.misses += 1
+
+        # Backend I/O and chain construction happen outside the lock so one
+        # slow session does not hold up the others
+        if purge_due:
+            self.backend.purge_idle(self.idle_ttl)
+
+        if entry is not None:
+            if self.backend.shared and self.backend.version(session_id) != version:
+                # Another worker advanced this conversation
+                version = self._restore_history(session_id, chain)
+                with self._lock:
+                    entry[2] = version
+            return chain
+
+        chain = self.chain_factory()
+        # A window memory only ever reads its last k turns
+        window = getattr(chain.memory, "k", None)
+        keep = 2 * window if window else None
+        chain.memory.chat_memory = WriteThroughChatHistory(
+            on_append=lambda messages: self._append(session_id, messages, keep),
+            on_clear=lambda: self._persist(session_id, []),
+            max_messages=keep
+        )
+        version = self._restore_history(session_id, chain)
+
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                # Another request for this session built its chain first
+                entry[1] = now
+                self._entries.move_to_end(session_id)
+                return entry[0]
+            self._entries[session_id] = [chain, now, version]
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+                self.lru_evictions += 1
+        return chain
+
+    def save(self, session_id: str):
+        """Persist the session's chat history now (turns are saved automatically)."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+        if entry is not None:
+            self._persist(session_id, entry[0].memory.chat_memory.messages)
+
+    def _append(self, session_id: str, messages: List[BaseMessage], keep: Optional[int]):
+        """Append a turn to the backend, keeping only the last `keep` messages."""
+        self._remember_version(
+            session_id, self.backend.append(session_id, messages_to_dict(messages), keep)
+        )
+
+    def _persist(self, session_id: str, messages: List[BaseMessage]):
+        """Replace a session's stored history and remember its version."""
+        self._remember_version(session_id, self.backend.save(session_id, messages_to_dict(messages)))
+
+    def _remember_version(self, session_id: str, version: int):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                entry[2] = version
+
+    def discard(self, session_id: str):
+        """Drop a session from the cache and the backend."""
+        with self._lock:
+            self._entries.pop(session_id, None)
+        self.backend.delete(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache size and eviction metrics."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__,
+                "size": len(self._entries),
+                "max_sessions": self.max_sessions,
+                "idle_ttl_seconds": self.idle_ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "lru_evictions": self.lru_evictions,
+                "ttl_evictions": self.ttl_evictions,
+            }
+
+    def _evict_idle(self, now: float) -> bool:
+        """
+        Evict idle sessions; the OrderedDict is kept in access order.
+
+        Returns True when the shared backend is due for its own sweep, which
+        the caller runs after releasing the lock.
+        """
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if now - entry[1] < self.idle_ttl:
+                break
+            self._entries.popitem(last=False)
+            self.ttl_evictions += 1
+
+        # Sweep the shared backend at most once per TTL window
+        if now - self._last_purge >= self.idle_ttl:
+            self._last_purge = now
+            return True
+        return False
+
+    def _restore_history(self, session_id: str, chain) -> int:
+        """Load persisted chat history into the chain's memory."""
+        stored = self.backend.load(session_id)
+        if stored is None:
+            return 0
+        messages, version = stored
+        history = chain.memory.chat_memory
+        if history.max_messages is not None:
+            messages = messages[-history.max_messages:]
+        # Assign directly: going through add_messages would write them back
+        history.messages = messages_from_dict(messages)
+        return version
+
+
+def create_history_backend(name: Optional[str] = None):
+    """Create the history backend selected by SESSION_BACKEND."""
+    name = (name or os.getenv("SESSION_BACKEND", "memory")).lower()
+    if name == "sqlite":
+        return SQLiteHistoryBackend(os.getenv("SESSION_DB_PATH", "Data/.sessions.db"))
+    if name == "memory":
+        return MemoryHistoryBackend()
+    raise ValueError(f"Unsupported session backend: {name}")
+
+
+# Global store instance
+_session_store = None
+
+def get_session_store(chain_factory: Callable[[], Any]) -> SessionStore:
+    """Get or create the process-wide session store."""
+    global _session_store
+    if _session_store is None:
+        _session_store = SessionStore(
+            chain_factory,
+            max_sessions=int(os.getenv("SESSION_MAX_CHAINS", "500")),
+            idle_ttl=float(os.getenv("SESSION_IDLE_TTL_SECONDS", "1800")),
+            backend=create_history_backend()
+        )
+    return _session_store
@@ -0,0 +1,514 @@
+"""
+Vector index backends for retrieval and indexing.
+
+VECTOR_BACKEND selects where vectors live:
+    pinecone (default)  Pinecone serverless index over the network
+    local               LocalVectorStore on disk, queries never leave the box
+
+LocalVectorStore keeps the 384-dim MiniLM vectors as a memory-mapped float32
+matrix with a JSONL metadata sidecar and answers top-k queries with a single
+matrix multiply. For large corpora an HNSW index (hnswlib) can be enabled;
+appended rows are added to it incrementally. After a delete or replace the
+index is rebuilt on a background thread (exact search answers meanwhile) and
+saved under the metadata file's inode, so other processes can tell whether a
+saved index matches the rows they loaded.
+It mirrors the subset of the Pinecone Index API the project uses (query,
+upsert, delete, describe_index_stats), so callers work with either backend.
+Metadata filters follow Pinecone's syntax for the operators the project
+needs: {"field": value}, $eq, $ne, $in, $nin, $and and $or.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # Windows: fall back to in-process locking only
+    FCNTL_AVAILABLE = False
+
+
+def matches_filter(metadata: Dict[str, Any], filter: Optional[Dict[str, Any]]) -> bool:
+    """Whether metadata satisfies a Pinecone-style metadata filter."""
+    if not filter:
+        return True
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, operand in condition.items():
+                if op == "$eq":
+                    ok = value == operand
+                elif op == "$ne":
+                    ok = value != operand
+                elif op == "$in":
+                    ok = value in operand
+                elif op == "$nin":
+                    ok = value not in operand
+                else:
+                    raise ValueError(f"Unsupported filter operator: {op}")
+                if not ok:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class LocalVectorStore:
+    """Pinecone-compatible vector index backed by local files."""
+
+    VECTORS_FILE = "vectors.f32"
+    METADATA_FILE = "metadata.jsonl"
+    ANN_FILE = "hnsw.{inode}.bin"  # Keyed by the metadata file it was built for
+    LOCK_FILE = ".lock"
+
+    def __init__(
+        self,
+        directory: str = "Data/.vector_store",
+        dimension: int = 384,
+        ann: bool = False,
+        ann_min_vectors: int = 50000
+    ):
+        """
+        Args:
+            directory: Directory holding the matrix and metadata sidecar
+            dimension: Embedding dimension (MiniLM-L6-v2 → 384)
+            ann: Use an HNSW index when hnswlib is installed
+            ann_min_vectors: Below this size exact search is used anyway
+        """
+        self.directory = Path(directory)
+        self.dimension = dimension
+        self.use_ann = ann and HNSWLIB_AVAILABLE
+        self.ann_min_vectors = ann_min_vectors
+
+        self._lock = threading.RLock()
+        self._loaded_version = None  # (inode, size) of the metadata file
+        self._loaded_offset = 0  # Bytes of the metadata file parsed into _rows
+        self._write_locked = False
+        self._vectors = np.zeros((0, dimension), dtype=np.float32)
+        self._rows: List[Dict[str, Any]] = []  # {"id", "namespace", "metadata"}
+        self._row_index: Dict[Tuple[str, str], int] = {}  # (namespace, id) -> row
+        self._namespace_ids: Dict[str, int] = {}
+        self._namespace_codes = np.zeros(0, dtype=np.int32)  # Per row; grown geometrically
+        self._ann = None
+        self._ann_building = False
+
+        if ann and not HNSWLIB_AVAILABLE:
+            print("⚠️  hnswlib not available. Using exact search. Install with: pip install hnswlib")
+
+        self._reload_if_changed()
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.directory / self.VECTORS_FILE
+
+    @property
+    def _metadata_path(self) -> Path:
+        return self.directory / self.METADATA_FILE
+
+    # === Loading ===
+    def _stat_metadata(self):
+        try:
+            return os.stat(self._metadata_path)
+        except OSError:
+            return None
+
+    def _reload_if_changed(self):
+        """
+        Pick up rows written by this or another process (store_index.py).
+
+        Writers only append to the files, except for deletes and id
+        replacements, which swap in new files with os.replace. An append is
+        picked up by reading just the new metadata lines and adding their
+        vectors to the HNSW index; a swapped file (new inode) or one that
+        shrank is loaded from scratch.
+        """
+        stat = self._stat_metadata()
+        version = (stat.st_ino, stat.st_size) if stat else None
+        if version == self._loaded_version:
+            return
+        with self._lock:
+            stat = self._stat_metadata()
+            version = (stat.st_ino, stat.st_size) if stat else None
+            if version == self._loaded_version:
+                return
+            if (stat is None or self._loaded_version is None
+                    or stat.st_ino != self._loaded_version[0] or stat.st_size < self._loaded_offset):
+                self._rows = []
+                self._row_index = {}
+                self._namespace_ids = {}
+                self._namespace_codes = np.zeros(0, dtype=np.int32)
+                self._loaded_offset = 0
+                self._ann = None
+            self._read_new_rows(stat.st_ino if stat else None)
+            self._loaded_version = version
+
+    def _read_new_rows(self, inode: Optional[int]):
+        """Append metadata rows past _loaded_offset and remap the vector matrix."""
+        first_new = len(self._rows)
+        if self._metadata_path.exists():
+            with open(self._metadata_path, 'rb') as f:
+                f.seek(self._loaded_offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # Half-written last line from a concurrent appender
+                        break
+                    if line.strip():
+                        try:
+                            self._rows.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            break
+                    self._loaded_offset += len(line)
+
+        rows = self._rows
+        if len(rows) > len(self._namespace_codes):
+            codes = np.zeros(max(len(rows), 2 * len(self._namespace_codes)), dtype=np.int32)
+            codes[:first_new] = self._namespace_codes[:first_new]
+            self._namespace_codes = codes
+        codes, namespace_ids, row_index = self._namespace_codes, self._namespace_ids, self._row_index
+        for i in range(first_new, len(rows)):
+            row = rows[i]
+            codes[i] = namespace_ids.setdefault(row["namespace"], len(namespace_ids))
+            row_index[(row["namespace"], row["id"])] = i
+
+        if rows:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r',
+                                      shape=(len(rows), self.dimension))
+        else:
+            self._vectors = np.zeros((0, self.dimension), dtype=np.float32)
+
+        if not self.use_ann or len(rows) < self.ann_min_vectors:
+            self._ann = None
+        elif self._ann is None:
+            self._ann = self._load_ann(inode)
+            if self._ann is None:
+                self._start_ann_build(inode)
+        elif len(rows) > first_new:
+            self._add_to_ann(self._ann, first_new)
+
+    def _add_to_ann(self, index, start: int):
+        """Add rows from start onwards to the HNSW index, growing it geometrically."""
+        if len(self._rows) > index.get_max_elements():
+            index.resize_index(max(len(self._rows), index.get_max_elements() * 2))
+        index.add_items(np.asarray(self._vectors[start:]), np.arange(start, len(self._rows)))
+
+    def _ann_path(self, inode: Optional[int]) -> Path:
+        return self.directory / self.ANN_FILE.format(inode=inode)
+
+    def _load_ann(self, inode: Optional[int]):
+        """
+        Load the HNSW index saved for these rows and add any appended since.
+
+        Returns None when no index was saved for the current metadata file.
+        """
+        ann_path = self._ann_path(inode)
+        if not ann_path.exists():
+            return None
+        index = hnswlib.Index(space='ip', dim=self.dimension)
+        index.load_index(str(ann_path), max_elements=len(self._rows))
+        if index.get_current_count() > len(self._rows):
+            return None
+        if index.get_current_count() < len(self._rows):
+            self._add_to_ann(index, index.get_current_count())
+        index.set_ef(int(os.getenv("LOCAL_VECTOR_EF", "64")))
+        return index
+
+    def _start_ann_build(self, inode: Optional[int]):
+        """Build the HNSW index off the query path; exact search serves meanwhile."""
+        if self._ann_building:
+            return
+        self._ann_building = True
+        threading.Thread(target=self._build_ann, args=(inode, len(self._rows), self._vectors),
+                         name="hnsw-build", daemon=True).start()
+
+    def _build_ann(self, inode: Optional[int], count: int, vectors: np.ndarray):
+        try:
+            print(f"Building HNSW index over {count} vectors in the background...")
+            index = hnswlib.Index(space='ip', dim=self.dimension)
+            index.init_index(max_elements=count, ef_construction=200, M=16)
+            index.add_items(np.asarray(vectors[:count]), np.arange(count))
+            with self._lock:
+                if self._loaded_version is None or self._loaded_version[0] != inode:
+                    # Rewritten meanwhile; these row numbers no longer apply
+                    return
+                # Rows appended while we were building
+                self._add_to_ann(index, count)
+                index.set_ef(int(os.getenv("LOCAL_VECTOR_EF", "64")))
+                self._ann = index
+                with self._write_lock():
+                    stat = self._stat_metadata()
+                    if stat is not None and stat.st_ino == inode:
+                        self._save_ann(index, inode)
+        except Exception as e:
+            print(f"Warning: Could not build HNSW index: {e}")
+        finally:
+            with self._lock:
+                self._ann_building = False
+                # A rewrite during the build left the current rows without an index
+                if (self.use_ann and self._ann is None and self._loaded_version is not None
+                        and len(self._rows) >= self.ann_min_vectors):
+                    self._start_ann_build(self._loaded_version[0])
+
+    def _save_ann(self, index, inode: Optional[int]):
+        """Publish the index for this metadata file and drop ones for older files."""
+        ann_path = self._ann_path(inode)
+        tmp_path = ann_path.with_suffix(".tmp")
+        index.save_index(str(tmp_path))
+        os.replace(tmp_path, ann_path)
+        self._remove_stale_ann(inode)
+
+    def _remove_stale_ann(self, inode: Optional[int]):
+        current = self._ann_path(inode).name
+        for path in self.directory.glob("hnsw*.bin"):
+            if path.name != current:
+                path.unlink(missing_ok=True)
+
+    # === Queries ===
+    def query(
+        self,
+        vector: List[float],
+        top_k: int = 3,
+        namespace: Optional[str] = None,
+        include_metadata: bool = True,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Top-k cosine similarity search, shaped like a Pinecone response."""
+        return self.query_batch([vector], top_k=top_k, namespace=namespace,
+                                include_metadata=include_metadata, filter=filter)[0]
+
+    def query_batch(
+        self,
+        vectors: List[List[float]],
+        top_k: int = 3,
+        namespace: Optional[str] = None,
+        include_metadata: bool = True,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Top-k search for several query vectors with one matrix multiply."""
+        self._reload_if_changed()
+        rows, matrix, ann = self._rows, self._vectors, self._ann
+
+        queries = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        if not rows:
+            return [{"matches": [], "namespace": namespace or ""} for _ in queries]
+        count = matrix.shape[0]
+
+        def keep(row: Dict[str, Any]) -> bool:
+            return ((namespace is None or row["namespace"] == namespace)
+                    and matches_filter(row["metadata"], filter))
+
+        if ann is not None:
+            # Over-fetch so namespace/metadata filtering still leaves top_k results
+            k = min(count, top_k * (16 if filter else 4))
+            labels, distances = ann.knn_query(queries, k=k)
+            candidates = [(labels[i], 1.0 - distances[i]) for i in range(len(queries))]
+        else:
+            scores = queries @ matrix.T  # (queries, rows)
+            if namespace is not None or filter:
+                if namespace is None:
+                    mask = np.ones(count, dtype=bool)
+                elif namespace in self._namespace_ids:
+                    mask = self._namespace_codes[:count] == self._namespace_ids[namespace]
+                else:
+                    mask = np.zeros(count, dtype=bool)
+                if filter:
+                    # Metadata filters need the rows themselves
+                    for i in np.flatnonzero(mask):
+                        mask[i] = matches_filter(rows[i]["metadata"], filter)
+                scores[:, ~mask] = -np.inf
+            k = min(count, top_k)
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            candidates = []
+            for i in range(len(queries)):
+                order = top[i][np.argsort(-scores[i, top[i]])]
+                candidates.append((order, scores[i, order]))
+
+        results = []
+        for labels, scores in candidates:
+            matches = []
+            for label, score in zip(labels, scores):
+                row = rows[int(label)]
+                if not np.isfinite(score) or not keep(row):
+                    continue
+                match = {"id": row["id"], "score": float(score)}
+                if include_metadata:
+                    match["metadata"] = row["metadata"]
+                matches.append(match)
+                if len(matches) == top_k:
+                    break
+            results.append({"matches": matches, "namespace": namespace or ""})
+        return results
+
+    def describe_index_stats(self) -> Dict[str, Any]:
+        """Vector counts per namespace."""
+        self._reload_if_changed()
+        with self._lock:
+            count = len(self._rows)
+            counts = np.bincount(self._namespace_codes[:count], minlength=len(self._namespace_ids))
+            namespaces = {name: {"vector_count": int(counts[code])}
+                          for name, code in self._namespace_ids.items() if counts[code]}
+        return {
+            "dimension": self.dimension,
+            "total_vector_count": count,
+            "namespaces": namespaces,
+        }
+
+    # === Writes ===
+    def upsert(self, vectors: Iterable[Any], namespace: str = "default", **kwargs) -> Dict[str, int]:
+        """
+        Insert or replace vectors.
+
+        Args:
+            vectors: Dicts with "id", "values" and optional "metadata"
+                     (or (id, values, metadata) tuples, as Pinecone accepts)
+            namespace: Namespace to write to
+        """
+        new_rows, new_vectors = [], []
+        for item in vectors:
+            if isinstance(item, dict):
+                vector_id, values, metadata = item["id"], item["values"], item.get("metadata", {})
+            else:
+                vector_id, values, metadata = (list(item) + [{}])[:3]
+            new_rows.append({"id": str(vector_id), "namespace": namespace, "metadata": metadata or {}})
+            new_vectors.append(values)
+        if not new_rows:
+            return {"upserted_count": 0}
+        latest = {row["id"]: i for i, row in enumerate(new_rows)}
+        if len(latest) < len(new_rows):
+            # Repeated id in one batch: the last one wins, as in Pinecone
+            new_rows = [new_rows[i] for i in sorted(latest.values())]
+            new_vectors = [new_vectors[i] for i in sorted(latest.values())]
+
+        matrix = np.asarray(new_vectors, dtype=np.float32).reshape(-1, self.dimension)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+
+        with self._lock, self._write_lock():
+            self._reload_from_disk_locked()
+            replaced = {self._row_index[key] for key in
+                        ((row["namespace"], row["id"]) for row in new_rows)
+                        if key in self._row_index}
+            if replaced:
+                # Replacing existing ids: rewrite without the old rows
+                keep = [i for i in range(len(self._rows)) if i not in replaced]
+                self._rewrite_locked(keep, new_rows, matrix)
+            else:
+                self._append_locked(new_rows, matrix)
+        return {"upserted_count": len(new_rows)}
+
+    def delete(self, ids: Optional[List[str]] = None, namespace: str = "default",
+               delete_all: bool = False, **kwargs):
+        """Delete vectors by id (or every vector in the namespace)."""
+        ids = set(str(i) for i in ids or [])
+        with self._lock, self._write_lock():
+            self._reload_from_disk_locked()
+            if delete_all:
+                keep = [i for i, row in enumerate(self._rows) if row["namespace"] != namespace]
+            else:
+                removed = {self._row_index[(namespace, i)] for i in ids
+                           if (namespace, i) in self._row_index}
+                keep = [i for i in range(len(self._rows)) if i not in removed] if removed else None
+            if keep is not None and len(keep) != len(self._rows):
+                self._rewrite_locked(keep, [], np.zeros((0, self.dimension), dtype=np.float32))
+        return {}
+
+    @contextmanager
+    def _write_lock(self):
+        """
+        Serialize writers across processes (appends must stay row-aligned).
+        Callers hold self._lock; re-entering from the same thread is a no-op.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if not FCNTL_AVAILABLE or self._write_locked:
+            yield
+            return
+        with open(self.directory / self.LOCK_FILE, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._write_locked = True
+            try:
+                yield
+            finally:
+                self._write_locked = False
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reload_from_disk_locked(self):
+        """Make sure writes start from the latest on-disk state."""
+        self._reload_if_changed()
+
+    def _append_locked(self, rows: List[Dict[str, Any]], matrix: np.ndarray):
+        # Trim a torn tail left by a crashed writer so rows and vectors stay aligned
+        if self._metadata_path.exists() and self._metadata_path.stat().st_size > self._loaded_offset:
+            os.truncate(self._metadata_path, self._loaded_offset)
+        with open(self._vectors_path, 'ab') as f:
+            f.truncate(len(self._rows) * self.dimension * 4)
+            f.write(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+        with open(self._metadata_path, 'a') as f:
+            f.write("".join(json.dumps(row) + "\n" for row in rows))
+        self._reload_if_changed()
+
+    def _rewrite_locked(self, keep: List[int], rows: List[Dict[str, Any]], matrix: np.ndarray):
+        """Atomically rewrite the store with the kept rows plus new ones."""
+        kept_vectors = np.asarray(self._vectors[keep]) if keep else np.zeros((0, self.dimension), dtype=np.float32)
+        all_vectors = np.concatenate([kept_vectors, matrix]).astype(np.float32)
+        all_rows = [self._rows[i] for i in keep] + rows
+
+        tmp_vectors = self._vectors_path.with_suffix(".tmp")
+        tmp_metadata = self._metadata_path.with_suffix(".tmp")
+        with open(tmp_vectors, 'wb') as f:
+            f.write(all_vectors.tobytes())
+        with open(tmp_metadata, 'w') as f:
+            for row in all_rows:
+                f.write(json.dumps(row) + "\n")
+        # Vectors first: the metadata file is what readers use to detect changes
+        os.replace(tmp_vectors, self._vectors_path)
+        os.replace(tmp_metadata, self._metadata_path)
+        # Row numbers changed: saved HNSW indexes are for the old file; readers
+        # keep answering (exactly) while a new one is built in the background
+        self._remove_stale_ann(os.stat(self._metadata_path).st_ino)
+        self._reload_if_changed()
+
+
+def get_vector_backend() -> str:
+    """Configured vector backend name ('pinecone' or 'local')."""
+    return os.getenv("VECTOR_BACKEND", "pinecone").lower()
+
+
+def get_vector_index(index_name: str = "medicalbot", dimension: int = 384):
+    """
+    Open the configured vector index.
+
+    Returns:
+        A Pinecone Index or a LocalVectorStore; both support query/upsert/delete
+    """
+    backend = get_vector_backend()
+    if backend == "local":
+        return LocalVectorStore(
+            directory=os.getenv("LOCAL_VECTOR_DIR", "Data/.vector_store"),
+            dimension=dimension,
+            ann=os.getenv("LOCAL_VECTOR_ANN", "false").lower() in ("1", "true", "yes")
+        )
+    if backend == "pinecone":
+        from pinecone import Pinecone
+        return Pinecone(api_key=os.environ.get('PINECONE_API_KEY')).Index(index_name)
+    raise ValueError(f"Unsupported vector backend: {backend}")
@@ -0,0 +1,188 @@
+"""
+TTL cache with request coalescing for Exa web search results.
+
+Exa is the slowest and most rate-limited dependency of /ask, and the same
+question is often asked by several users within minutes. Results are cached
+by normalized query and request parameters for WEB_CACHE_TTL_SECONDS, the
+cache is bounded (least recently used entry is evicted), and it can be saved
+to WEB_CACHE_PATH between restarts. Concurrent identical lookups are
+coalesced: one caller runs the search while the others wait for its result
+(singleflight).
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+
+class _InFlight:
+    """A search some thread is running right now."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class WebSearchCache:
+    """Size-bounded TTL cache of web search results with singleflight."""
+
+    def __init__(
+        self,
+        ttl: float = 900,
+        max_entries: int = 500,
+        cache_path: Optional[str] = None
+    ):
+        """
+        Args:
+            ttl: Seconds a cached result stays valid
+            max_entries: Maximum number of cached results
+            cache_path: Optional JSON file for persistence between restarts
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache_path = Path(cache_path) if cache_path else None
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (created_at, value)
+        self._inflight: Dict[str, _InFlight] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        if self.cache_path and self.cache_path.exists():
+            self._load()
+
+    @staticmethod
+    def make_key(kind: str, query: str, **params) -> str:
+        """Cache key for a search of the given kind and parameters."""
+        parts = [kind] + [f"{name}={params[name]}" for name in sorted(params)]
+        return "|".join(parts) + "|" + normalize_query(query)
+
+    def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Any],
+        cacheable: Callable[[Any], bool] = lambda value: True
+    ) -> Any:
+        """
+        Return the cached value for key, or compute it exactly once.
+
+        Args:
+            key: Cache key (see make_key)
+            compute: Runs the actual search on a miss
+            cacheable: Whether a computed value may be cached (e.g. not errors)
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[1]
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _InFlight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = compute()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                if call.error is None and cacheable(call.value):
+                    self._entries[key] = (time.time(), call.value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            call.done.set()
+
+    def invalidate(self):
+        """Drop every cached result."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/coalescing counters and occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "in_flight": len(self._inflight),
+                "persistent": self.cache_path is not None,
+            }
+
+    def persist(self):
+        """Write unexpired entries to cache_path (no-op without one)."""
+        if not self.cache_path:
+            return
+        now = time.time()
+        with self._lock:
+            entries = [[key, created, value] for key, (created, value) in self._entries.items()
+                       if now - created < self.ttl]
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_path.with_suffix(".tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            print(f"Warning: Could not save web search cache: {e}")
+
+    def _load(self):
+        """Load entries persisted by persist(), skipping expired ones."""
+        try:
+            now = time.time()
+            with open(self.cache_path, 'r') as f:
+                for key, created, value in json.load(f):
+                    if now - created < self.ttl:
+                        self._entries[key] = (created, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        except Exception as e:
+            print(f"Warning: Could not load web search cache: {e}")
+
+
+def load_web_search_cache() -> Optional[WebSearchCache]:
+    """
+    Create the web search cache from the environment.
+
+    WEB_CACHE_ENABLED=false disables it; WEB_CACHE_TTL_SECONDS and
+    WEB_CACHE_MAX_ENTRIES size it and WEB_CACHE_PATH enables persistence.
+    """
+    if os.getenv("WEB_CACHE_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    return WebSearchCache(
+        ttl=float(os.getenv("WEB_CACHE_TTL_SECONDS", "900")),
+        max_entries=int(os.getenv("WEB_CACHE_MAX_ENTRIES", "500")),
+        cache_path=os.getenv("WEB_CACHE_PATH") or None
+    )
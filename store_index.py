@@ -1,54 +1,70 @@
-from src.helper import load_pdf_file, load_mixed_data, text_split, download_hugging_face_embeddings
 from pinecone import Pinecone, ServerlessSpec
 from dotenv import load_dotenv
-from langchain_pinecone import PineconeVectorStore
+from src.semantic_cache import bump_index_version
+from src.embedding_cache import load_cached_embeddings
+from src.vector_store import get_vector_backend, get_vector_index
+from src.indexing import build_index
+import argparse
 import os
 
 
-load_dotenv()
-
-PINECONE_API_KEY = os.environ.get('PINECONE_API_KEY')
-if not PINECONE_API_KEY:
-    raise ValueError('PINECONE_API_KEY is not set. Please configure it in your environment or .env file.')
-
-os.environ['PINECONE_API_KEY'] = PINECONE_API_KEY
-
-# Load source documents from multiple formats (PDF, JSON, CSV)
-print("Loading documents from Data/ directory...")
-extracted_data = load_mixed_data(data_dir='Data/')
-print(f"Loaded {len(extracted_data)} documents")
-
-# Split into chunks
-print("Splitting documents into chunks...")
-text_chunks = text_split(extracted_data)
-print(f"Created {len(text_chunks)} text chunks")
-
-# Download embeddings
-print("Downloading embeddings model...")
-embeddings = download_hugging_face_embeddings()
-
-pc = Pinecone(api_key=PINECONE_API_KEY)
-index_name = 'medicalbot'
-
-# Create the index only if it does not already exist
-existing_indexes = {index.name for index in pc.list_indexes().indexes}
-if index_name not in existing_indexes:
-    print(f"Creating Pinecone index: {index_name}")
-    pc.create_index(
-        name=index_name,
-        dimension=384,  # MiniLM-L6-v2 → 384 dims
-        metric='cosine',
-        spec=ServerlessSpec(cloud='aws', region='us-east-1'),
-    )
-else:
-    print(f"Index {index_name} already exists")
-
-# Embed each chunk and upsert the embeddings into the Pinecone index
-print("Uploading embeddings to Pinecone...")
-PineconeVectorStore.from_documents(
-    text_chunks,
-    embeddings,
-    index_name=index_name,
-    namespace='default',
-)
-print("Indexing complete!")
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description='Incrementally index Data/ into the vector store')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Delete all vectors in the namespace and reindex everything '
+                             '(also removes duplicates left by older, non-incremental runs)')
+    args = parser.parse_args()
+
+    VECTOR_BACKEND = get_vector_backend()
+
+    PINECONE_API_KEY = os.environ.get('PINECONE_API_KEY')
+    if VECTOR_BACKEND == 'pinecone':
+        if not PINECONE_API_KEY:
+            raise ValueError('PINECONE_API_KEY is not set. Please configure it in your environment or .env file.')
+
+        os.environ['PINECONE_API_KEY'] = PINECONE_API_KEY
+
+    # Download embeddings
+    print("Downloading embeddings model...")
+    embeddings = load_cached_embeddings()
+
+    index_name = 'medicalbot'
+
+    if VECTOR_BACKEND == 'pinecone':
+        pc = Pinecone(api_key=PINECONE_API_KEY)
+
+        # Create the index only if it does not already exist
+        existing_indexes = {index.name for index in pc.list_indexes().indexes}
+        if index_name not in existing_indexes:
+            print(f"Creating Pinecone index: {index_name}")
+            pc.create_index(
+                name=index_name,
+                dimension=384,  # MiniLM-L6-v2 → 384 dims
+                metric='cosine',
+                spec=ServerlessSpec(cloud='aws', region='us-east-1'),
+            )
+        else:
+            print(f"Index {index_name} already exists")
+
+    index = get_vector_index(index_name)
+
+    # Embed and upsert only new or changed chunks; delete vectors of removed ones
+    print("Indexing documents from Data/ directory...")
+    stats = build_index(index, embeddings, data_dir='Data/', namespace='default',
+                        index_name=index_name, rebuild=args.rebuild)
+    print(f"Scanned {stats['files_scanned']} files: {stats['files_changed']} changed, "
+          f"{stats['files_removed']} removed, {stats['chunks_added']} chunks added, "
+          f"{stats['chunks_deleted']} chunks deleted")
+
+    if stats['chunks_added'] or stats['chunks_deleted'] or args.rebuild:
+        # Cached /ask answers were built from the old index
+        bump_index_version()
+    embeddings.persist()
+    print("Indexing complete!")
+
+
+# Guard required: PDF extraction uses a process pool, which re-imports this module
+if __name__ == '__main__':
+    main()